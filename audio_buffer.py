@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class AudioBuffer:
+    """
+    @class AudioBuffer
+    @description Fixed-capacity float32 arena used to accumulate streaming audio.
+    Appends copy the new samples into preallocated memory (amortised O(1) per sample) and
+    view() hands out a zero-copy contiguous view for inference. When the write position hits
+    the end of the arena the live samples are moved back to the front, which only happens
+    once per capacity worth of audio. If the buffered audio would exceed the capacity the
+    oldest samples are dropped.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        @function __init__
+        @param capacity: Maximum number of samples held by the buffer
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._start = 0
+        self._end = 0
+
+        self.max_window = 0
+        self.dropped_samples = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def append(self, samples: np.ndarray):
+        """
+        @function append
+        @description Copies samples to the end of the buffer, converting them to float32.
+        @param samples: 1-D audio array
+        """
+        n = len(samples)
+        if n == 0:
+            return
+
+        if n >= self.capacity:
+            # Only the newest capacity samples can be kept
+            self.dropped_samples += len(self) + n - self.capacity
+            self._data[:] = samples[-self.capacity:]
+            self._start = 0
+            self._end = self.capacity
+        else:
+            overflow = len(self) + n - self.capacity
+            if overflow > 0:
+                self.dropped_samples += overflow
+                self._start += overflow
+            if self._end + n > self.capacity:
+                self._compact()
+            self._data[self._end:self._end + n] = samples
+            self._end += n
+
+        self.max_window = max(self.max_window, len(self))
+
+    def _compact(self):
+        size = len(self)
+        self._data[:size] = self._data[self._start:self._end]
+        self._start = 0
+        self._end = size
+
+    def view(self) -> np.ndarray:
+        """
+        @function view
+        @description Zero-copy float32 view of the buffered audio. The view is only valid
+        until the next append, consume or clear call.
+        """
+        return self._data[self._start:self._end]
+
+    def consume(self, n: int):
+        """
+        @function consume
+        @description Drops the n oldest samples from the buffer.
+        @param n: Number of samples to drop
+        """
+        self._start = min(self._start + max(n, 0), self._end)
+        if self._start == self._end:
+            self.clear()
+
+    def clear(self):
+        """
+        @function clear
+        @description Empties the buffer without releasing its memory.
+        """
+        self._start = 0
+        self._end = 0
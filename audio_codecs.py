@@ -0,0 +1,171 @@
+import numpy as np
+
+_CODECS = {}
+
+
+def register_codec(*names: str):
+    """
+    @function register_codec
+    @description Class decorator registering an audio decoder under one or more encoding
+    names, as passed by clients in the `encoding` query parameter.
+    @param names: Encoding names handled by the decorated class
+    """
+
+    def decorator(cls):
+        for name in names:
+            _CODECS[name.lower()] = cls
+        return cls
+
+    return decorator
+
+
+def available_codecs() -> list[str]:
+    """
+    @function available_codecs
+    @description Names of all registered encodings.
+    """
+    return sorted(_CODECS)
+
+
+def get_decoder(encoding: str, sample_rate: int, channels: int = 1):
+    """
+    @function get_decoder
+    @description Creates a decoder for one stream. Decoders may keep state between messages,
+    so each connection needs its own instance.
+    @param encoding: Encoding name, e.g. linear16, mulaw, alaw or opus
+    @param sample_rate: Sampling rate of the stream
+    @param channels: Number of interleaved channels, downmixed to mono
+    """
+    try:
+        cls = _CODECS[encoding.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported encoding {encoding!r}, expected one of {available_codecs()}"
+        ) from None
+    return cls(sample_rate, channels)
+
+
+class AudioDecoder:
+    """
+    @class AudioDecoder
+    @description Base class of the codec registry: turns the payload of one client message
+    into mono float32 samples in [-1, 1] at the stream sampling rate.
+    """
+
+    def __init__(self, sample_rate: int, channels: int = 1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        raise NotImplementedError
+
+    def _downmix(self, samples: np.ndarray) -> np.ndarray:
+        if self.channels > 1:
+            usable = len(samples) - len(samples) % self.channels
+            samples = samples[:usable].reshape(-1, self.channels).mean(axis=1)
+        return samples.astype(np.float32, copy=False)
+
+
+@register_codec("linear16", "pcm", "s16le")
+class Linear16Decoder(AudioDecoder):
+    """
+    @class Linear16Decoder
+    @description 16-bit little-endian PCM. An odd trailing byte is kept for the next message.
+    """
+
+    def __init__(self, sample_rate: int, channels: int = 1):
+        super().__init__(sample_rate, channels)
+        self._remainder = b""
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        if self._remainder:
+            payload = self._remainder + payload
+        usable = len(payload) - len(payload) % 2
+        self._remainder = payload[usable:]
+        samples = np.frombuffer(payload, dtype="<i2", count=usable // 2)
+        return self._downmix(samples.astype(np.float32) / 32768.0)
+
+
+def _mulaw_table() -> np.ndarray:
+    # G.711 mu-law expansion of every possible byte
+    codes = ~np.arange(256, dtype=np.uint8)
+    exponent = (codes >> 4) & 0x07
+    mantissa = (codes & 0x0F).astype(np.int32)
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    pcm = np.where(codes & 0x80, -magnitude, magnitude)
+    return (pcm / 32768.0).astype(np.float32)
+
+
+def _alaw_table() -> np.ndarray:
+    # G.711 A-law expansion of every possible byte
+    codes = np.arange(256, dtype=np.uint8) ^ 0x55
+    exponent = ((codes >> 4) & 0x07).astype(np.int32)
+    mantissa = (codes & 0x0F).astype(np.int32)
+    magnitude = np.where(
+        exponent == 0,
+        (mantissa << 4) + 8,
+        ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0),
+    )
+    pcm = np.where(codes & 0x80, magnitude, -magnitude)
+    return (pcm / 32768.0).astype(np.float32)
+
+
+MULAW_TABLE = _mulaw_table()
+ALAW_TABLE = _alaw_table()
+
+
+@register_codec("mulaw", "ulaw", "pcmu")
+class MulawDecoder(AudioDecoder):
+    """
+    @class MulawDecoder
+    @description G.711 mu-law, decoded with a 256 entry lookup table.
+    """
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        return self._downmix(MULAW_TABLE[np.frombuffer(payload, dtype=np.uint8)])
+
+
+@register_codec("alaw", "pcma")
+class AlawDecoder(AudioDecoder):
+    """
+    @class AlawDecoder
+    @description G.711 A-law, decoded with a 256 entry lookup table.
+    """
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        return self._downmix(ALAW_TABLE[np.frombuffer(payload, dtype=np.uint8)])
+
+
+@register_codec("opus")
+class OpusDecoder(AudioDecoder):
+    """
+    @class OpusDecoder
+    @description Opus packets, one packet per message, decoded locally with libopus through
+    the optional opuslib package (pip install opuslib). Opus decodes natively at 8, 12, 16,
+    24 or 48 kHz.
+    """
+
+    SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+    # Longest Opus packet is 120 ms
+    MAX_FRAME_MS = 120
+
+    def __init__(self, sample_rate: int, channels: int = 1):
+        super().__init__(sample_rate, channels)
+        if sample_rate not in self.SAMPLE_RATES:
+            raise ValueError(
+                f"Opus streams must use one of {self.SAMPLE_RATES} Hz, got {sample_rate}"
+            )
+        try:
+            import opuslib
+        except Exception as e:
+            # opuslib raises a plain Exception when libopus itself is missing
+            raise ImportError(
+                "Opus decoding requires opuslib and libopus: pip install opuslib"
+            ) from e
+        self._decoder = opuslib.Decoder(sample_rate, channels)
+        self._max_frame = sample_rate * self.MAX_FRAME_MS // 1000
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        pcm = self._decoder.decode(payload, self._max_frame)
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        return self._downmix(samples)
@@ -0,0 +1,128 @@
+import asyncio
+from collections import deque
+
+import numpy as np
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "close")
+
+
+class QueueOverflow(Exception):
+    """Raised by AudioQueue.put when the queue is full and its policy is "close"."""
+
+
+class AudioQueue:
+    """
+    @class AudioQueue
+    @description Bounded queue between the receiver and the processing loop of a session.
+    It holds decoded audio arrays and control messages (EOF, end of connection) and is bounded
+    by the duration of the queued audio, so a slow decoder can not make memory grow without
+    limit. When the bound is exceeded the overflow policy decides what happens:
+
+    - drop_oldest: the oldest queued chunks are dropped
+    - coalesce: the queued audio is merged into a single chunk so the processing loop catches
+      up in one pass; audio beyond the bound is dropped from the oldest end
+    - close: QueueOverflow is raised so the caller can close the connection
+
+    Control messages are never dropped and do not count towards the bound.
+    """
+
+    def __init__(self, max_samples: int, policy: str = "drop_oldest"):
+        """
+        @function __init__
+        @param max_samples: Maximum number of queued audio samples
+        @param policy: One of OVERFLOW_POLICIES
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"policy must be one of {OVERFLOW_POLICIES}, got {policy!r}")
+        self.max_samples = max_samples
+        self.policy = policy
+
+        self._items = deque()
+        self._samples = 0
+        self._not_empty = asyncio.Event()
+
+        self.dropped_samples = 0
+        self.dropped_chunks = 0
+        self.overflows = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def queued_samples(self) -> int:
+        """
+        @function queued_samples
+        @description Number of audio samples waiting to be processed.
+        """
+        return self._samples
+
+    def put(self, audio: np.ndarray):
+        """
+        @function put
+        @description Queues a chunk of audio, applying the overflow policy if the bound is
+        exceeded.
+        @param audio: Decoded float32 audio
+        """
+        if len(audio) == 0:
+            return
+        overflow = self._samples + len(audio) > self.max_samples
+        if overflow:
+            self.overflows += 1
+            if self.policy == "close":
+                raise QueueOverflow(
+                    f"{self._samples + len(audio)} samples queued, limit {self.max_samples}"
+                )
+
+        self._items.append(audio)
+        self._samples += len(audio)
+        if overflow and self.policy == "coalesce":
+            self._coalesce()
+        self._enforce_bound()
+        self._not_empty.set()
+
+    def put_control(self, message):
+        """
+        @function put_control
+        @description Queues a control message after the audio already queued.
+        @param message: "EOF" or None
+        """
+        self._items.append(message)
+        self._not_empty.set()
+
+    async def get(self):
+        """
+        @function get
+        @description Waits for and returns the next audio chunk or control message.
+        """
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._items.popleft()
+        if isinstance(item, np.ndarray):
+            self._samples -= len(item)
+        return item
+
+    def _coalesce(self):
+        chunks = [item for item in self._items if isinstance(item, np.ndarray)]
+        if len(chunks) < 2 or len(chunks) != len(self._items):
+            return
+        self._items.clear()
+        self._items.append(np.concatenate(chunks))
+
+    def _enforce_bound(self):
+        while (
+            self._samples > self.max_samples
+            and self._items
+            and isinstance(self._items[0], np.ndarray)
+        ):
+            excess = self._samples - self.max_samples
+            oldest = self._items[0]
+            if len(oldest) <= excess or self.policy == "drop_oldest":
+                self._items.popleft()
+                self.dropped_chunks += 1
+                dropped = len(oldest)
+            else:
+                self._items[0] = oldest[excess:]
+                dropped = excess
+            self._samples -= dropped
+            self.dropped_samples += dropped
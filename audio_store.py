@@ -0,0 +1,157 @@
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+
+from logger import logger
+
+SAMPLE_RATE = 16000
+# Where decoded audio tracks are spooled, defaults to the system temporary directory
+AUDIO_STORE_DIR_ENV = "AUDIO_STORE_DIR"
+
+
+def ffmpeg_pcm_command(media_path: str, output: str, sample_rate: int = SAMPLE_RATE) -> list:
+    """
+    @function ffmpeg_pcm_command
+    @description ffmpeg command decoding the audio track of a file to raw 16-bit mono PCM.
+    @param media_path: Video or audio file
+    @param output: Output file, "-" for stdout
+    @param sample_rate: Sample rate to resample to
+    """
+    return [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", media_path,
+        "-vn",
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate),
+        "-ac", "1",
+        "-y",
+        output,
+    ]
+
+
+class AudioStore:
+    """
+    @class AudioStore
+    @description Recording of any length kept as int16 samples in a memory-mapped file, half
+    the size of float32 and paged in by the OS only where it is read. Slicing returns float32
+    windows scaled like whisper.audio.load_audio, so a store can be passed where an audio
+    array is sliced (e.g. long_form.transcribe_chunked) and memory is bounded by the windows
+    in use rather than by the length of the recording.
+    """
+
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE, delete: bool = False):
+        """
+        @function __init__
+        @param path: File of raw int16 mono samples
+        @param sample_rate: Sample rate of the samples
+        @param delete: Remove the file on close(), for stores owning a spooled file
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.delete = delete
+        if os.path.getsize(path) >= 2:
+            self.samples = np.memmap(path, dtype=np.int16, mode="r")
+        else:
+            # mmap cannot map an empty file
+            self.samples = np.zeros(0, dtype=np.int16)
+
+    @classmethod
+    def from_media(cls, media_path: str, sample_rate: int = SAMPLE_RATE) -> "AudioStore":
+        """
+        @function from_media
+        @description Decodes the audio track of a video with ffmpeg straight into a spool
+        file in AUDIO_STORE_DIR (default: the temporary directory), which is removed on
+        close().
+        @param media_path: Video or audio file
+        @param sample_rate: Sample rate to resample to
+        @raise RuntimeError: If ffmpeg fails to decode the file
+        """
+        directory = os.environ.get(AUDIO_STORE_DIR_ENV) or None
+        fd, path = tempfile.mkstemp(suffix=".s16le", dir=directory)
+        os.close(fd)
+        try:
+            result = subprocess.run(
+                ffmpeg_pcm_command(media_path, path, sample_rate), capture_output=True
+            )
+            if result.returncode != 0:
+                message = result.stderr.decode(errors="replace").strip()
+                raise RuntimeError(f"Failed to extract audio from video: {message}")
+            store = cls(path, sample_rate, delete=True)
+        except BaseException:
+            os.remove(path)
+            raise
+        logger.info(f"Decoded {store.duration:.2f}s of audio from {media_path} to {path}")
+        return store
+
+    @classmethod
+    def from_array(
+        cls, audio: np.ndarray, path: str, sample_rate: int = SAMPLE_RATE
+    ) -> "AudioStore":
+        """
+        @function from_array
+        @description Writes float32 audio to a store file, e.g. audio decoded in memory.
+        @param audio: float32 audio in [-1, 1]
+        @param path: File to write the int16 samples to
+        @param sample_rate: Sample rate of the audio
+        """
+        samples = np.clip(np.round(np.asarray(audio) * 32768.0), -32768, 32767)
+        samples.astype(np.int16).tofile(path)
+        return cls(path, sample_rate)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    @property
+    def duration(self) -> float:
+        """
+        @function duration
+        @description Length of the recording in seconds.
+        """
+        return len(self.samples) / self.sample_rate
+
+    def __getitem__(self, index: slice) -> np.ndarray:
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError("AudioStore only supports contiguous slices")
+        return self.window(*index.indices(len(self.samples))[:2])
+
+    def window(self, start: int, end: int) -> np.ndarray:
+        """
+        @function window
+        @description Reads samples [start, end) as float32.
+        @param start: First sample
+        @param end: Sample after the last one
+        @return: float32 audio in [-1, 1), a new array
+        """
+        return np.multiply(self.samples[start:end], 1 / 32768.0, dtype=np.float32)
+
+    def iter_windows(self, seconds: float):
+        """
+        @function iter_windows
+        @description Reads the recording window after window.
+        @param seconds: Length of a window, the last one can be shorter
+        @return: Iterator of (start sample, float32 window)
+        """
+        step = int(seconds * self.sample_rate)
+        for start in range(0, len(self.samples), step):
+            yield start, self.window(start, start + step)
+
+    def close(self):
+        """
+        @function close
+        @description Unmaps the samples, and removes the file if the store owns it.
+        """
+        # The mapping goes with the last reference to it, windows are copies
+        self.samples = np.zeros(0, dtype=np.int16)
+        if self.delete and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self) -> "AudioStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,509 @@
+import gc
+import os
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from local_agreement import words_from_output
+from logger import logger
+from model_registry import MODEL_REGISTRY, estimate_model_bytes
+from precision import autocast_for, autocast_forward, quantize_int8, resolve_dtype
+from snapshots import find_snapshot, load_whisper_model
+from speculative import resolve_assisted_model
+from utils import build_pipe, get_device, torch_dtype_from_str
+
+# Engines are imported when a model is loaded, so choosing one on the command line is cheap
+if TYPE_CHECKING:
+    import torch
+
+# Where the ctranslate2 backend keeps the weights it converts from huggingface models
+CT2_CACHE_DIR = os.environ.get(
+    "CT2_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "whisper-hindi2hinglish", "ctranslate2"),
+)
+# Calls the ctranslate2 backend runs at the same time, match it to --inference-workers
+CT2_NUM_WORKERS = int(os.environ.get("CT2_NUM_WORKERS", "1"))
+
+_BACKENDS = {}
+
+
+def register_backend(name: str):
+    """
+    @function register_backend
+    @description Class decorator registering an InferenceBackend under the name used by
+    --backend.
+    @param name: Backend name
+    """
+
+    def decorator(cls):
+        cls.name = name
+        _BACKENDS[name] = cls
+        return cls
+
+    return decorator
+
+
+def available_backends() -> list[str]:
+    """
+    @function available_backends
+    @description Names of the registered backends.
+    """
+    return sorted(_BACKENDS)
+
+
+def get_backend_class(name: str) -> type:
+    """
+    @function get_backend_class
+    @description Returns the backend class registered under name.
+    @param name: Backend name
+    """
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown backend '{name}', expected one of: {', '.join(available_backends())}"
+        ) from None
+
+
+def load_backend(
+    name: str,
+    model_id: str,
+    device: str,
+    torch_dtype=None,
+    refresh: bool = False,
+):
+    """
+    @function load_backend
+    @description Returns an inference backend for model_id from the process-wide model
+    registry, loading it only if no copy is cached. Give it back with
+    MODEL_REGISTRY.release(backend) when done.
+    @param name: Backend name, see available_backends()
+    @param model_id: Model to load
+    @param device: Device to run the model on, falls back to CPU without CUDA
+    @param torch_dtype: Data type for model computation, as a torch dtype or its name as
+    given to --dtype; defaults to the device's default
+    @param refresh: Load fresh weights even if the model is cached
+    """
+    cls = get_backend_class(name)
+    if resolve_assisted_model(model_id)[1] is not None and not cls.supports_assistant:
+        raise ValueError(
+            f"{model_id} uses speculative decoding, which needs the transformers backend"
+        )
+    device = get_device(device)
+    if torch_dtype is None or isinstance(torch_dtype, str):
+        torch_dtype = torch_dtype_from_str(torch_dtype, device)
+    # Adjust dtype for the device if needed
+    torch_dtype = cls.registry_dtype(resolve_dtype(torch_dtype, device), device)
+    return MODEL_REGISTRY.acquire(model_id, name, device, torch_dtype, cls, refresh=refresh)
+
+
+def preload_backend(
+    name: str,
+    model_id: str,
+    device: str,
+    torch_dtype=None,
+    refresh: bool = False,
+):
+    """
+    @function preload_backend
+    @description Loads a backend into the model registry of a process that is about to fork
+    workers. The workers inherit the loaded model and share its pages copy-on-write, so
+    load_backend() returns it without loading anything. Only CPU models can be preloaded,
+    CUDA does not survive a fork.
+    @param name: Backend name, see available_backends()
+    @param model_id: Model to load
+    @param device: Device to run the model on
+    @param torch_dtype: Data type for model computation, as for load_backend()
+    @param refresh: Replace the preloaded model with fresh weights, e.g. after a deploy
+    @return: Whether the model was preloaded
+    """
+    device = get_device(device)
+    if device != "cpu":
+        logger.warning("Preloading needs a CPU model, each worker loads its own copy on %s", device)
+        return False
+
+    import torch
+
+    # Threads started by the parent do not exist in forked children, a single-threaded parent
+    # leaves nothing behind in them
+    torch.set_num_threads(1)
+    backend = load_backend(name, model_id, device, torch_dtype, refresh=refresh)
+    # Released but cached, so the workers own their leases
+    MODEL_REGISTRY.release(backend)
+    # Objects moved out of the collected generations are not written to by the garbage
+    # collector of the workers, which would copy the pages holding them
+    gc.collect()
+    gc.freeze()
+    return True
+
+
+def chunks_from_words(words: list[dict]) -> list[dict]:
+    """
+    @function chunks_from_words
+    @description Converts {"text", "start", "end"} words to the "chunks" of a transformers
+    pipeline output decoded with return_timestamps="word".
+    @param words: Words with times in seconds
+    """
+    return [{"text": w["text"], "timestamp": (w["start"], w["end"])} for w in words]
+
+
+def segments_from_words(
+    words: list[dict], max_gap: float = 1.0, max_duration: float = 30.0
+) -> list[dict]:
+    """
+    @function segments_from_words
+    @description Groups a flat list of words into whisper-style segments, splitting at pauses
+    and at max_duration.
+    @param words: Words with times in seconds
+    @param max_gap: Pause starting a new segment, in seconds
+    @param max_duration: Longest segment, in seconds
+    """
+    segments = []
+    for word in words:
+        current = segments[-1] if segments else None
+        if (
+            current is None
+            or word["start"] - current["end"] > max_gap
+            or word["end"] - current["start"] > max_duration
+        ):
+            current = {"start": word["start"], "end": word["end"], "words": []}
+            segments.append(current)
+        current["words"].append(word)
+        current["end"] = word["end"]
+    for segment in segments:
+        segment["text"] = " ".join(w["text"] for w in segment["words"])
+    return segments
+
+
+class InferenceBackend:
+    """
+    @class InferenceBackend
+    @description Base class of the inference engines. A backend loads a model in its
+    constructor and transcribes:
+    - windows, for streaming: {"text", "chunks"} in the transformers pipeline format, with
+      word timestamps in "chunks" when requested;
+    - long recordings, for subtitles: {"text", "segments"} in the whisper-timestamped format,
+      each segment with "start", "end", "text" and "words" ({"text", "start", "end"}).
+    Backends are callable like a transformers pipeline, so they can be served by
+    inference.InferenceExecutor directly. Calls to the model of a backend that is not
+    thread_safe are serialized, whatever the number of threads making them.
+    """
+
+    name = None
+    # Whether the model can run calls of several threads at the same time
+    thread_safe = False
+    # Whether model ids of ASSISTED_MODELS can be loaded, see speculative.py
+    supports_assistant = False
+
+    def __init__(self, model_id: str, device: str, torch_dtype: "torch.dtype"):
+        """
+        @function __init__
+        @param model_id: Model to load
+        @param device: Device to run the model on
+        @param torch_dtype: Data type for model computation, as returned by registry_dtype()
+        """
+        self.model_id = model_id
+        self.device = device
+        self.torch_dtype = torch_dtype
+        # The registry hands one backend to every thread, calls that must not overlap on the
+        # same model are made under this lock
+        self.lock = threading.Lock()
+
+    @classmethod
+    def registry_dtype(cls, torch_dtype: "torch.dtype", device: str) -> "torch.dtype":
+        """
+        @function registry_dtype
+        @description Dtype the model is loaded and cached with. Backends ignoring some dtypes
+        map them to None so they share one cached copy.
+        """
+        return torch_dtype
+
+    def transcribe_window(self, audio: np.ndarray, word_timestamps: bool = False) -> dict:
+        """
+        @function transcribe_window
+        @description Transcribes one streaming window of at most 30 s.
+        @param audio: float32 audio at 16 kHz
+        @param word_timestamps: Also return word timestamps in "chunks"
+        """
+        raise NotImplementedError
+
+    def transcribe_batch(
+        self, audios: list[np.ndarray], word_timestamps: bool = False
+    ) -> list[dict]:
+        """
+        @function transcribe_batch
+        @description Transcribes several windows, as one padded batch where supported.
+        @param audios: float32 audio arrays at 16 kHz
+        @param word_timestamps: Also return word timestamps in "chunks"
+        """
+        return [self.transcribe_window(audio, word_timestamps) for audio in audios]
+
+    def transcribe_long_form(self, audio: np.ndarray, vad: bool = True) -> dict:
+        """
+        @function transcribe_long_form
+        @description Transcribes a recording of any length with word timestamps.
+        @param audio: float32 audio at 16 kHz
+        @param vad: Skip non-speech where the backend supports it, reducing hallucinations
+        """
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """
+        @function memory_bytes
+        @description Memory held by the model weights, reported by the model registry.
+        """
+        return 0
+
+    def __call__(self, audio, return_timestamps: str = None, batch_size: int = None) -> dict:
+        word_timestamps = return_timestamps == "word"
+        if isinstance(audio, list):
+            return self.transcribe_batch(audio, word_timestamps)
+        return self.transcribe_window(audio, word_timestamps)
+
+
+@register_backend("transformers")
+class TransformersBackend(InferenceBackend):
+    """
+    @class TransformersBackend
+    @description Huggingface transformers pipeline, the reference implementation. Windows
+    from several sessions are decoded as one padded batch. Model ids of ASSISTED_MODELS, such
+    as prime-fast, use speculative decoding and decode windows one at a time.
+    """
+
+    supports_assistant = True
+
+    def __init__(self, model_id: str, device: str, torch_dtype: "torch.dtype"):
+        super().__init__(model_id, device, torch_dtype)
+        model_id, assistant_model_id = resolve_assisted_model(model_id)
+        self.pipe = build_pipe(model_id, device, torch_dtype, assistant_model_id)
+        self.assisted = assistant_model_id is not None
+
+    def _call(self, audio, **kwargs):
+        # Autocast is thread local, so it is entered on the thread running the model. The
+        # pipeline keeps per-call state on itself, so calls on a shared pipe must not overlap
+        with self.lock, autocast_for(self.pipe):
+            return self.pipe(audio, **kwargs)
+
+    def transcribe_window(self, audio: np.ndarray, word_timestamps: bool = False) -> dict:
+        return self._call(audio, **({"return_timestamps": "word"} if word_timestamps else {}))
+
+    def transcribe_batch(
+        self, audios: list[np.ndarray], word_timestamps: bool = False
+    ) -> list[dict]:
+        if self.assisted:
+            # Assisted generation only supports a batch size of 1
+            return super().transcribe_batch(audios, word_timestamps)
+        kwargs = {"return_timestamps": "word"} if word_timestamps else {}
+        return self._call(audios, batch_size=len(audios), **kwargs)
+
+    def transcribe_long_form(self, audio: np.ndarray, vad: bool = True) -> dict:
+        # The pipeline has no VAD, long audio is decoded in overlapping 30 s chunks
+        output = self._call(audio, chunk_length_s=30, return_timestamps="word")
+        return {
+            "text": output["text"].strip(),
+            "segments": segments_from_words(words_from_output(output)),
+        }
+
+    def memory_bytes(self) -> int:
+        size = estimate_model_bytes(self.pipe)
+        if self.pipe.draft_model is not None:
+            size += estimate_model_bytes(self.pipe.draft_model)
+        return size
+
+
+@register_backend("whisper_timestamped")
+class WhisperTimestampedBackend(InferenceBackend):
+    """
+    @class WhisperTimestampedBackend
+    @description openai-whisper model with whisper-timestamped alignment, giving the most
+    accurate word timestamps for subtitles. Windows are decoded one at a time.
+    """
+
+    def __init__(self, model_id: str, device: str, torch_dtype: "torch.dtype"):
+        import torch
+        import whisper_timestamped as whisper
+
+        super().__init__(model_id, device, torch_dtype)
+        self.whisper = whisper
+        logger.info(f"Loading Whisper model: {model_id}")
+        snapshot = find_snapshot(model_id, self.name)
+        if snapshot is not None:
+            logger.info(f"Loading {model_id} from snapshot {snapshot}")
+            model = load_whisper_model(snapshot).to(device)
+        else:
+            # For standard Whisper models, use model_id directly
+            # For HuggingFace models, whisper-timestamped may not support them
+            # We'll use 'tiny' as default which is fast and works well
+            try:
+                model = whisper.load_model(model_id, device=device)
+            except Exception as e:
+                logger.warning(f"Failed to load {model_id}, falling back to 'tiny' model: {e}")
+                model = whisper.load_model("tiny", device=device)
+
+        if torch_dtype == torch.qint8:
+            logger.info("Quantizing Linear layers to int8")
+            model = quantize_int8(model)
+        elif torch_dtype == torch.bfloat16:
+            # whisper expects float32 audio features and logits when fp16 is off, so autocast
+            # is scoped to the encoder and decoder passes
+            autocast_forward(model.encoder, torch.bfloat16)
+            autocast_forward(model.decoder, torch.bfloat16)
+        self.model = model
+
+    @classmethod
+    def registry_dtype(cls, torch_dtype: "torch.dtype", device: str) -> "torch.dtype":
+        import torch
+
+        # whisper-timestamped picks its own precision otherwise, so only these are part of the key
+        if device == "cpu" and torch_dtype in (torch.qint8, torch.bfloat16):
+            return torch_dtype
+        return None
+
+    def _transcribe(self, audio: np.ndarray, vad: bool) -> dict:
+        # whisper-timestamped registers forward hooks on the model for the length of a call,
+        # overlapping calls would record each other's attention weights and tokens
+        with self.lock:
+            return self.whisper.transcribe(
+                self.model,
+                audio,
+                language="hi",  # Hindi/Hinglish
+                vad=vad,  # Enable VAD to reduce hallucinations
+                condition_on_previous_text=False,  # CRITICAL: Prevents stopping at gaps/pauses
+                remove_empty_words=True,  # Clean up output
+                plot_word_alignment=False,  # Set True for debugging
+            )
+
+    def transcribe_window(self, audio: np.ndarray, word_timestamps: bool = False) -> dict:
+        result = self._transcribe(audio, vad=False)
+        output = {"text": result["text"]}
+        if word_timestamps:
+            words = [
+                {"text": w["text"], "start": w["start"], "end": w["end"]}
+                for segment in result["segments"]
+                for w in segment.get("words", [])
+            ]
+            output["chunks"] = chunks_from_words(words)
+        return output
+
+    def transcribe_long_form(self, audio: np.ndarray, vad: bool = True) -> dict:
+        return self._transcribe(audio, vad)
+
+    def memory_bytes(self) -> int:
+        return estimate_model_bytes(self.model)
+
+
+@register_backend("ctranslate2")
+class CTranslate2Backend(InferenceBackend):
+    """
+    @class CTranslate2Backend
+    @description CTranslate2 runtime through faster-whisper (pip install faster-whisper), the
+    fastest engine on CPU nodes, especially with --dtype int8. Huggingface models are
+    converted to the CTranslate2 format once and cached in CT2_CACHE_DIR; a directory holding
+    converted weights can be given as model_id instead.
+    """
+
+    # faster-whisper models can be called from several threads
+    thread_safe = True
+    # CTranslate2 compute types of the supported torch dtypes
+    COMPUTE_TYPES = {
+        "torch.qint8": "int8",
+        "torch.bfloat16": "bfloat16",
+        "torch.float16": "float16",
+        "torch.float32": "float32",
+    }
+
+    def __init__(self, model_id: str, device: str, torch_dtype: "torch.dtype"):
+        import torch
+
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError(
+                "The ctranslate2 backend requires faster-whisper: pip install faster-whisper"
+            ) from None
+
+        super().__init__(model_id, device, torch_dtype)
+        compute_type = self.COMPUTE_TYPES.get(str(torch_dtype), "default")
+        self.model_dir = self.convert(model_id, compute_type)
+        logger.info("Loading %s with ctranslate2 (%s)", self.model_dir, compute_type)
+        self.model = WhisperModel(
+            self.model_dir,
+            device=device,
+            compute_type=compute_type,
+            # Follows torch.set_num_threads, e.g. --threads-per-worker
+            cpu_threads=torch.get_num_threads(),
+            num_workers=CT2_NUM_WORKERS,
+        )
+
+    @staticmethod
+    def convert(model_id: str, quantization: str) -> str:
+        """
+        @function convert
+        @description Converts a huggingface model to the CTranslate2 format, once.
+        @param model_id: Huggingface model id, or a directory of converted weights
+        @param quantization: Weight type of the converted model
+        @return: Directory of the converted model
+        """
+        if os.path.isfile(os.path.join(model_id, "model.bin")):
+            return model_id
+        output_dir = os.path.join(CT2_CACHE_DIR, f"{model_id.replace('/', '--')}-{quantization}")
+        if os.path.isfile(os.path.join(output_dir, "model.bin")):
+            return output_dir
+
+        from ctranslate2.converters import TransformersConverter
+
+        logger.info("Converting %s to ctranslate2 in %s", model_id, output_dir)
+        converter = TransformersConverter(
+            model_id, copy_files=["tokenizer.json", "preprocessor_config.json"]
+        )
+        converter.convert(
+            output_dir, quantization=None if quantization == "default" else quantization
+        )
+        return output_dir
+
+    def _words(self, segments) -> list[dict]:
+        return [
+            {"text": w.word.strip(), "start": float(w.start), "end": float(w.end)}
+            for segment in segments
+            for w in segment.words or []
+        ]
+
+    def _transcribe(self, audio: np.ndarray, word_timestamps: bool, vad: bool) -> list:
+        # Same decoding as the transformers pipeline: greedy, Hinglish in latin script
+        segments, _ = self.model.transcribe(
+            audio,
+            language="en",
+            task="transcribe",
+            beam_size=1,
+            word_timestamps=word_timestamps,
+            vad_filter=vad,
+            condition_on_previous_text=False,
+        )
+        return list(segments)
+
+    def transcribe_window(self, audio: np.ndarray, word_timestamps: bool = False) -> dict:
+        segments = self._transcribe(audio, word_timestamps, vad=False)
+        output = {"text": "".join(segment.text for segment in segments)}
+        if word_timestamps:
+            output["chunks"] = chunks_from_words(self._words(segments))
+        return output
+
+    def transcribe_long_form(self, audio: np.ndarray, vad: bool = True) -> dict:
+        segments = self._transcribe(audio, word_timestamps=True, vad=vad)
+        return {
+            "text": "".join(segment.text for segment in segments).strip(),
+            "segments": [
+                {
+                    "start": float(segment.start),
+                    "end": float(segment.end),
+                    "text": segment.text.strip(),
+                    "words": self._words([segment]),
+                }
+                for segment in segments
+            ],
+        }
+
+    def memory_bytes(self) -> int:
+        # Converted weights are loaded whole, their file size is a close estimate
+        return os.path.getsize(os.path.join(self.model_dir, "model.bin"))
@@ -0,0 +1,81 @@
+"""
+Microbenchmark: streaming audio accumulation with np.concatenate vs AudioBuffer
+
+Simulates a client sending 10 ms chunks of 16 kHz audio and measures the time spent
+accumulating one window, for the old concatenate path (starting from a float64
+np.array([])) and the preallocated float32 AudioBuffer.
+
+Usage:
+    python benchmarks/bench_audio_buffer.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_buffer import AudioBuffer  # noqa: E402
+
+SAMPLING_RATE = 16_000
+
+
+def concatenate_path(chunks: list) -> np.ndarray:
+    """Accumulation as done before AudioBuffer"""
+    full_audio = np.array([])
+    for chunk in chunks:
+        full_audio = np.concatenate([full_audio, chunk])
+    return full_audio
+
+
+def buffer_path(chunks: list, buffer: AudioBuffer) -> np.ndarray:
+    """Accumulation through the preallocated arena"""
+    buffer.clear()
+    for chunk in chunks:
+        buffer.append(chunk)
+    return buffer.view()
+
+
+def best_of(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AudioBuffer microbenchmark")
+    parser.add_argument("--chunk-ms", type=int, default=10, help="Chunk size in ms")
+    parser.add_argument(
+        "--windows", type=float, nargs="+", default=[2, 10, 30], help="Window lengths in seconds"
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Repetitions per measurement")
+    args = parser.parse_args()
+
+    chunk_size = SAMPLING_RATE * args.chunk_ms // 1000
+    print(f"{'window':>8} {'chunks':>7} {'concatenate':>13} {'AudioBuffer':>13} {'speedup':>8} {'concat MB':>10} {'buffer MB':>10}")
+
+    for window in args.windows:
+        n_chunks = int(window * 1000 / args.chunk_ms)
+        chunks = [np.random.uniform(-1, 1, chunk_size).astype(np.float32) for _ in range(n_chunks)]
+        buffer = AudioBuffer(int(window * SAMPLING_RATE))
+
+        concat_time = best_of(lambda: concatenate_path(chunks), args.repeats)
+        buffer_time = best_of(lambda: buffer_path(chunks, buffer), args.repeats)
+
+        concat_audio = concatenate_path(chunks)
+        buffer_audio = buffer_path(chunks, buffer)
+        assert np.allclose(concat_audio, buffer_audio)
+
+        print(
+            f"{window:>7.0f}s {n_chunks:>7d} {concat_time * 1000:>11.2f}ms {buffer_time * 1000:>11.2f}ms"
+            f" {concat_time / buffer_time:>7.1f}x {concat_audio.nbytes / 1e6:>10.2f} {buffer_audio.nbytes / 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
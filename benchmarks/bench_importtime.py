@@ -0,0 +1,118 @@
+"""
+Benchmark: cold-start import time of the entry points
+
+Imports each entry point in a fresh interpreter with `python -X importtime` and checks the
+cumulative import time against a budget, and that no inference engine (torch, transformers,
+whisper) is imported before a model is loaded. Also times `--help`, which every batch script
+invocation pays. Exits with status 1 on a regression, so it can guard CI.
+
+Usage:
+    python benchmarks/bench_importtime.py
+    python benchmarks/bench_importtime.py --budget-scale 2 --top 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import budget per entry point in milliseconds, a few times the time measured on a laptop
+BUDGETS_MS = {
+    "video_to_srt": 600,
+    "web_server": 1000,
+    "websocket_server": 1000,
+}
+
+# Packages that must only be imported once inference starts
+HEAVY_PACKAGES = {
+    "torch",
+    "transformers",
+    "whisper",
+    "whisper_timestamped",
+    "ctranslate2",
+    "faster_whisper",
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) of every line printed by -X importtime"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # Header line
+            continue
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure_import(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Cumulative import time of module in ms, and every module it imported"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    imports = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative in imports if name == module)
+    return total / 1000, imports
+
+
+def measure_help(module: str) -> float:
+    """Wall time of `python <module>.py --help` in ms, interpreter start-up included"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, f"{module}.py", "--help"],
+        cwd=ROOT,
+        capture_output=True,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point import-time benchmark")
+    parser.add_argument(
+        "--modules", nargs="+", default=list(BUDGETS_MS), help="Entry points to check"
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per module, best is kept")
+    parser.add_argument(
+        "--budget-scale", type=float, default=1.0, help="Multiplier of the budgets for slow machines"
+    )
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':>18} {'import ms':>10} {'budget ms':>10} {'--help ms':>10}  heavy imports")
+    for module in args.modules:
+        runs = [measure_import(module) for _ in range(args.repeats)]
+        import_ms, imports = min(runs, key=lambda run: run[0])
+        help_ms = min(measure_help(module) for _ in range(args.repeats))
+        budget = BUDGETS_MS.get(module, 1000) * args.budget_scale
+        heavy = sorted({name.split(".")[0] for name, _, _ in imports} & HEAVY_PACKAGES)
+        print(
+            f"{module:>18} {import_ms:>10.0f} {budget:>10.0f} {help_ms:>10.0f}  "
+            f"{', '.join(heavy) or '-'}"
+        )
+        if import_ms > budget:
+            failures.append(f"{module} imports in {import_ms:.0f} ms, budget {budget:.0f} ms")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at module level")
+        if args.top:
+            for name, self_us, _ in sorted(imports, key=lambda i: -i[1])[: args.top]:
+                print(f"{'':>18} {self_us / 1000:>10.1f}  {name}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
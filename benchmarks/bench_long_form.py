@@ -0,0 +1,86 @@
+"""
+Benchmark: sequential against batched chunked long-form transcription
+
+Concatenates the example recordings into one long recording (repeated to --minutes) and
+transcribes it with the backend's own long-form decoding, window after window, and with
+long_form.transcribe_chunked at each --batch-sizes. Reports wall-clock time, real-time factor,
+the speedup over sequential decoding and the word error rate against the sequential transcript.
+
+Usage:
+    python benchmarks/bench_long_form.py
+    python benchmarks/bench_long_form.py --minutes 60 --batch-sizes 8 16 --threads 16
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_precision import word_error_rate  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLING_RATE = 16_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-form transcription benchmark")
+    parser.add_argument(
+        "--backend", default="transformers", help="Inference backend, see backends.py"
+    )
+    parser.add_argument(
+        "--model-id", default="Oriserve/Whisper-Hindi2Hinglish-Swift", help="Model to load"
+    )
+    parser.add_argument("--device", default="cpu", help="Device to run the model on")
+    parser.add_argument("--dtype", default="float32", help="Precision, as given to --dtype")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="torch threads")
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the recording")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+
+    import librosa
+    import numpy as np
+    import torch
+
+    from backends import load_backend
+    from long_form import transcribe_chunked
+
+    torch.set_num_threads(args.threads)
+    files = sorted(glob.glob(os.path.join(ROOT, "examples", "*.wav")))
+    pieces = []
+    for path in files:
+        pieces += [librosa.load(path, sr=SAMPLING_RATE)[0], np.zeros(SAMPLING_RATE, np.float32)]
+    recording = np.concatenate(pieces)
+    repeats = int(np.ceil(args.minutes * 60 * SAMPLING_RATE / len(recording)))
+    audio = np.tile(recording, repeats)[: int(args.minutes * 60 * SAMPLING_RATE)]
+    audio_seconds = len(audio) / SAMPLING_RATE
+
+    backend = load_backend(args.backend, args.model_id, args.device, args.dtype)
+    modes = {"sequential": lambda: backend.transcribe_long_form(audio, vad=False)}
+    for batch_size in args.batch_sizes:
+        modes[f"batch {batch_size}"] = (
+            lambda batch_size=batch_size: transcribe_chunked(backend, audio, batch_size)
+        )
+
+    # Pays for lazy initialization outside of the timings
+    backend.transcribe_window(audio[: 30 * SAMPLING_RATE])
+    results = {}
+    for mode, transcribe in modes.items():
+        start = time.perf_counter()
+        text = transcribe()["text"]
+        results[mode] = (time.perf_counter() - start, text)
+
+    reference_seconds, reference = results["sequential"]
+    print(f"{audio_seconds / 60:.1f} min of audio, {args.backend} {args.device} {args.dtype}, "
+          f"{args.threads} thread(s), WER against sequential")
+    print(f"{'mode':>12} {'wall s':>9} {'RTF':>6} {'speedup':>8} {'WER':>6}")
+    for mode, (seconds, text) in results.items():
+        print(
+            f"{mode:>12} {seconds:>9.1f} {seconds / audio_seconds:>6.3f} "
+            f"{reference_seconds / seconds:>7.2f}x {100 * word_error_rate(reference, text):>5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: VAD-segmented transcription across worker processes
+
+Builds a long recording from the example recordings separated by pauses, stores it like
+video_to_srt does and transcribes it with parallel_transcribe.transcribe_parallel for each
+--workers count. Reports wall-clock time (model loads included), real-time factor, the
+speedup over the first --workers count and the scaling efficiency (speedup per added worker,
+100% is linear).
+
+Usage:
+    python benchmarks/bench_parallel.py
+    python benchmarks/bench_parallel.py --minutes 30 --workers 1 8 16 32 --threads-per-worker 1
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLING_RATE = 16_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel transcription benchmark")
+    parser.add_argument(
+        "--backend", default="whisper_timestamped", help="Inference backend, see backends.py"
+    )
+    parser.add_argument(
+        "--model-id", default="Oriserve/Whisper-Hindi2Hinglish-Swift", help="Model to load"
+    )
+    parser.add_argument("--dtype", default="float32", help="Precision, as given to --dtype")
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the recording")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="torch threads")
+    args = parser.parse_args()
+
+    import librosa
+    import numpy as np
+
+    from audio_store import AudioStore
+    from parallel_transcribe import transcribe_parallel
+
+    pieces = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "examples", "*.wav"))):
+        pieces += [librosa.load(path, sr=SAMPLING_RATE)[0], np.zeros(SAMPLING_RATE, np.float32)]
+    recording = np.concatenate(pieces)
+    samples = int(args.minutes * 60 * SAMPLING_RATE)
+    audio = np.tile(recording, samples // len(recording) + 1)[:samples]
+
+    audio_seconds = len(audio) / SAMPLING_RATE
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        store = AudioStore.from_array(audio, os.path.join(directory, "audio.s16le"))
+        for workers in args.workers:
+            start = time.perf_counter()
+            transcribe_parallel(
+                store,
+                args.backend,
+                args.model_id,
+                "cpu",
+                args.dtype,
+                workers=workers,
+                threads_per_worker=args.threads_per_worker,
+            )
+            results.append((workers, time.perf_counter() - start))
+        store.close()
+
+    base_workers, base_seconds = results[0]
+    print(f"{audio_seconds / 60:.1f} min of audio, {args.backend} {args.dtype}, "
+          f"{args.threads_per_worker} thread(s) per worker, {os.cpu_count()} CPU(s)")
+    print(f"{'workers':>8} {'wall s':>8} {'RTF':>6} {'speedup':>8} {'efficiency':>11}")
+    for workers, seconds in results:
+        speedup = base_seconds / seconds
+        efficiency = speedup * base_workers / workers
+        print(f"{workers:>8} {seconds:>8.1f} {seconds / audio_seconds:>6.3f} "
+              f"{speedup:>7.2f}x {100 * efficiency:>10.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark: CPU inference precision modes (float32, bfloat16 autocast, int8 dynamic quantization)
+
+Transcribes the example recordings with the model loaded in each precision and reports
+latency, real-time factor, memory and the word error rate of the transcripts against the
+float32 transcripts (WER drift; there are no reference transcripts for the examples).
+Each precision runs in its own process so peak RSS is measured in isolation.
+
+Usage:
+    python benchmarks/bench_precision.py
+    python benchmarks/bench_precision.py --backend whisper_timestamped --model-id small
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLING_RATE = 16_000
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the reference length"""
+    ref, hyp = reference.split(), hypothesis.split()
+    if not ref:
+        return float(bool(hyp))
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(
+                row[j] + 1, row[j - 1] + 1, previous + (ref_word != hyp_word)
+            )
+    return row[-1] / len(ref)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def run_precision(args) -> dict:
+    """Loads the model in one precision and transcribes every file, in this process"""
+    import librosa
+    import torch
+
+    from backends import load_backend
+    from model_registry import estimate_model_bytes
+    from utils import torch_dtype_from_str
+
+    torch.set_num_threads(args.threads)
+    audios = [librosa.load(path, sr=SAMPLING_RATE)[0] for path in args.files]
+    dtype = torch_dtype_from_str(args.child, "cpu")
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    model = load_backend(args.backend, args.model_id, "cpu", dtype)
+    load_seconds = time.perf_counter() - start
+
+    def transcribe(audio):
+        return model.transcribe_window(audio)["text"]
+
+    # The first decode pays for lazy initialization, keep it out of the latency
+    transcribe(audios[0])
+    latencies, texts = [], []
+    for audio in audios:
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            text = transcribe(audio)
+            timings.append(time.perf_counter() - start)
+        latencies.append(min(timings))
+        texts.append(text.strip())
+
+    return {
+        "dtype": args.child,
+        "load_seconds": load_seconds,
+        "model_mb": estimate_model_bytes(model) / 2**20,
+        "rss_mb": peak_rss_mb() - baseline_rss,
+        "latency": latencies,
+        "audio_seconds": [len(audio) / SAMPLING_RATE for audio in audios],
+        "texts": texts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU precision benchmark")
+    parser.add_argument(
+        "--backend",
+        choices=["transformers", "whisper_timestamped", "ctranslate2"],
+        default="transformers",
+        help="Inference backend, see backends.py",
+    )
+    parser.add_argument(
+        "--model-id", default="Oriserve/Whisper-Hindi2Hinglish-Swift", help="Model to load"
+    )
+    parser.add_argument(
+        "--dtypes",
+        nargs="+",
+        default=["float32", "bfloat16", "int8"],
+        help="Precisions to compare, the first one is the WER reference",
+    )
+    parser.add_argument(
+        "--files",
+        nargs="+",
+        default=sorted(glob.glob(os.path.join(ROOT, "examples", "*.wav"))),
+        help="Audio files to transcribe",
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="Decodes per file, best is kept")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Torch threads")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_precision(args)))
+        return
+
+    results = []
+    for dtype in args.dtypes:
+        command = [sys.executable, os.path.abspath(__file__), "--child", dtype]
+        command += ["--backend", args.backend, "--model-id", args.model_id]
+        command += ["--repeats", str(args.repeats), "--threads", str(args.threads)]
+        command += ["--files", *args.files]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{dtype} failed:\n{output.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        sys.exit(1)
+    reference = results[0]
+    print(f"{len(args.files)} file(s), {sum(reference['audio_seconds']):.1f}s of audio, "
+          f"WER against {reference['dtype']}")
+    print(f"{'dtype':>9} {'load s':>7} {'latency s':>10} {'RTF':>6} {'speedup':>8} "
+          f"{'model MB':>9} {'RSS MB':>7} {'WER drift':>10}")
+    for result in results:
+        latency = sum(result["latency"])
+        drift = sum(
+            word_error_rate(ref, hyp) for ref, hyp in zip(reference["texts"], result["texts"])
+        ) / len(result["texts"])
+        print(
+            f"{result['dtype']:>9} {result['load_seconds']:>7.2f} {latency:>10.3f} "
+            f"{latency / sum(result['audio_seconds']):>6.3f} "
+            f"{sum(reference['latency']) / latency:>7.2f}x "
+            f"{result['model_mb']:>9.0f} {result['rss_mb']:>7.0f} {100 * drift:>9.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: speculative decoding of Prime with Swift drafting tokens (prime-fast)
+
+Transcribes the example recordings with Prime alone, with prime-fast and with Swift alone and
+reports latency, real-time factor, the speedup over Prime, the share of drafted tokens Prime
+accepted, the tokens produced per Prime decoder pass and the word error rate against the
+Prime transcripts (speculative decoding should not change them).
+
+Usage:
+    python benchmarks/bench_speculative.py
+    python benchmarks/bench_speculative.py --device cuda --dtype float16 --repeats 5
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_precision import word_error_rate  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLING_RATE = 16_000
+
+
+class DraftCounter:
+    """Counts drafted and accepted tokens of transformers assisted generation"""
+
+    def __init__(self):
+        from transformers.generation.candidate_generator import AssistedCandidateGenerator
+
+        self.drafted = self.accepted = self.steps = 0
+        get_candidates = AssistedCandidateGenerator.get_candidates
+        update_candidate_strategy = AssistedCandidateGenerator.update_candidate_strategy
+        counter = self
+
+        def counting_get_candidates(self, input_ids, *args, **kwargs):
+            candidates, logits = get_candidates(self, input_ids, *args, **kwargs)
+            counter.drafted += candidates.shape[-1] - input_ids.shape[-1]
+            counter.steps += 1
+            return candidates, logits
+
+        def counting_update(self, input_ids, scores, num_matches):
+            counter.accepted += int(num_matches)
+            return update_candidate_strategy(self, input_ids, scores, num_matches)
+
+        AssistedCandidateGenerator.get_candidates = counting_get_candidates
+        AssistedCandidateGenerator.update_candidate_strategy = counting_update
+
+    def reset(self):
+        self.drafted = self.accepted = self.steps = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative decoding benchmark")
+    parser.add_argument("--device", default="cpu", help="Device to run the models on")
+    parser.add_argument("--dtype", default="float32", help="Precision, as given to --dtype")
+    parser.add_argument(
+        "--files",
+        nargs="+",
+        default=sorted(glob.glob(os.path.join(ROOT, "examples", "*.wav"))),
+        help="Audio files to transcribe",
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="Decodes per file, best is kept")
+    args = parser.parse_args()
+
+    import librosa
+
+    from backends import load_backend
+    from speculative import SWIFT_MODEL_ID
+
+    audios = [librosa.load(path, sr=SAMPLING_RATE)[0] for path in args.files]
+    audio_seconds = sum(len(audio) for audio in audios) / SAMPLING_RATE
+    counter = DraftCounter()
+
+    prime_fast = load_backend("transformers", "prime-fast", args.device, args.dtype)
+    swift = load_backend("transformers", SWIFT_MODEL_ID, args.device, args.dtype)
+    # The prime-fast pipeline without its assistant is plain Prime
+    prime_kwargs = {"task": "transcribe", "language": "en", "assistant_model": None}
+    modes = {
+        "prime": lambda audio: prime_fast._call(audio, generate_kwargs=prime_kwargs),
+        "prime-fast": lambda audio: prime_fast._call(audio),
+        "swift": lambda audio: swift._call(audio),
+    }
+
+    results = {}
+    for mode, transcribe in modes.items():
+        # The first decode pays for lazy initialization, keep it out of the latency
+        transcribe(audios[0])
+        counter.reset()
+        latency, texts = 0.0, []
+        for audio in audios:
+            timings = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                text = transcribe(audio)["text"]
+                timings.append(time.perf_counter() - start)
+            latency += min(timings)
+            texts.append(text.strip())
+        results[mode] = {
+            "latency": latency,
+            "texts": texts,
+            "drafted": counter.drafted,
+            "accepted": counter.accepted,
+            "steps": counter.steps,
+        }
+
+    reference = results["prime"]
+    print(f"{len(audios)} file(s), {audio_seconds:.1f}s of audio, {args.device} {args.dtype}, "
+          f"WER against prime")
+    print(f"{'mode':>10} {'latency s':>10} {'RTF':>6} {'speedup':>8} {'accepted':>9} "
+          f"{'tokens/pass':>12} {'WER':>6}")
+    for mode, result in results.items():
+        wer = sum(
+            word_error_rate(ref, hyp) for ref, hyp in zip(reference["texts"], result["texts"])
+        ) / len(audios)
+        if result["steps"]:
+            accepted = f"{100 * result['accepted'] / max(result['drafted'], 1):>8.1f}%"
+            # Every verification pass adds the accepted drafts and one token of Prime's own
+            per_pass = f"{(result['accepted'] + result['steps']) / result['steps']:>12.2f}"
+        else:
+            accepted, per_pass = f"{'-':>9}", f"{'-':>12}"
+        print(
+            f"{mode:>10} {result['latency']:>10.3f} {result['latency'] / audio_seconds:>6.3f} "
+            f"{reference['latency'] / result['latency']:>7.2f}x {accepted} {per_pass} "
+            f"{100 * wer:>5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
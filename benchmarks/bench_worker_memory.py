@@ -0,0 +1,157 @@
+"""
+Benchmark: memory of several worker processes serving the same model (Linux only)
+
+Forks --workers processes the way websocket_server.py --workers does and reads the memory of
+each from /proc/<pid>/smaps_rollup once it has loaded the model and decoded a window:
+- copy:    every worker loads the model itself (from the hub cache or whisper checkpoint)
+- mmap:    every worker loads the snapshot, memory-mapped (--snapshot-dir)
+- preload: the supervisor loads the snapshot before forking (--snapshot-dir --preload)
+PSS splits shared pages between the processes mapping them, so the PSS summed over the
+supervisor and its workers is the memory the node really spends.
+
+Usage:
+    python snapshots.py --model-id <model> --backend whisper_timestamped --snapshot-dir /models
+    python benchmarks/bench_worker_memory.py --model-id <model> --snapshot-dir /models
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshots import SNAPSHOT_DIR_ENV  # noqa: E402
+
+MODES = ("copy", "mmap", "preload")
+
+
+def memory_mb(pid: int) -> dict:
+    """Rss, Pss and private memory of a process in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if rest.strip().endswith("kB"):
+                values[key] = int(rest.split()[0]) / 1024
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def worker(args, ready, stop):
+    import torch
+
+    from backends import load_backend
+    from warmup import synthetic_audio
+
+    torch.set_num_threads(1)
+    start = time.perf_counter()
+    backend = load_backend(args.backend, args.model_id, "cpu", args.dtype)
+    load_seconds = time.perf_counter() - start
+    if args.decode_seconds:
+        # Decoding reads every weight, pages written to would stop being shared
+        backend.transcribe_window(synthetic_audio(args.decode_seconds))
+    ready.put(load_seconds)
+    stop.wait()
+
+
+def run_mode(args) -> dict:
+    """Starts the workers of one mode, in this process"""
+    from backends import preload_backend
+
+    if args.child == "copy":
+        os.environ.pop(SNAPSHOT_DIR_ENV, None)
+    elif args.snapshot_dir:
+        os.environ[SNAPSHOT_DIR_ENV] = args.snapshot_dir
+    start = time.perf_counter()
+    if args.child == "preload":
+        preload_backend(args.backend, args.model_id, "cpu", args.dtype)
+    preload_seconds = time.perf_counter() - start
+
+    ctx = multiprocessing.get_context("fork")
+    ready, stop = ctx.Queue(), ctx.Event()
+    workers = [ctx.Process(target=worker, args=(args, ready, stop)) for _ in range(args.workers)]
+    for process in workers:
+        process.start()
+    try:
+        load_seconds = [ready.get(timeout=args.timeout) for _ in workers]
+        memory = [memory_mb(process.pid) for process in workers]
+        supervisor = memory_mb(os.getpid())
+    finally:
+        stop.set()
+        for process in workers:
+            process.join(10)
+            if process.is_alive():
+                process.kill()
+
+    return {
+        "mode": args.child,
+        "load_seconds": preload_seconds + max(load_seconds),
+        "total_pss": supervisor["pss"] + sum(m["pss"] for m in memory),
+        "worker_rss": sum(m["rss"] for m in memory) / len(memory),
+        "worker_private": sum(m["private"] for m in memory) / len(memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker memory benchmark")
+    parser.add_argument(
+        "--backend",
+        choices=["transformers", "whisper_timestamped"],
+        default="whisper_timestamped",
+        help="Inference backend, see backends.py",
+    )
+    parser.add_argument(
+        "--model-id", default="Oriserve/Whisper-Hindi2Hinglish-Swift", help="Model to load"
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.environ.get(SNAPSHOT_DIR_ENV),
+        help="Directory holding the snapshot of the model, see snapshots.py",
+    )
+    parser.add_argument("--dtype", default="float32", help="Precision, as given to --dtype")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument(
+        "--decode-seconds", type=float, default=2.0, help="Audio decoded by each worker, 0: none"
+    )
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for workers")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args)))
+        return
+
+    results = []
+    for mode in args.modes:
+        command = [sys.executable, os.path.abspath(__file__), "--child", mode]
+        command += ["--backend", args.backend, "--model-id", args.model_id]
+        command += ["--dtype", args.dtype, "--workers", str(args.workers)]
+        command += ["--decode-seconds", str(args.decode_seconds), "--timeout", str(args.timeout)]
+        if args.snapshot_dir:
+            command += ["--snapshot-dir", args.snapshot_dir]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{mode} failed:\n{output.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        sys.exit(1)
+    print(f"{args.workers} worker(s), {args.backend}, {args.dtype}")
+    print(f"{'mode':>8} {'load s':>7} {'total PSS MB':>13} {'RSS/worker':>11} {'private/worker':>15}")
+    for result in results:
+        print(
+            f"{result['mode']:>8} {result['load_seconds']:>7.2f} {result['total_pss']:>13.0f} "
+            f"{result['worker_rss']:>11.0f} {result['worker_private']:>15.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from logger import logger
+
+# Checkpoints of another format version are not resumed
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(output_srt_path: str) -> str:
+    """
+    @function checkpoint_path
+    @description Sidecar checkpoint file of an SRT file.
+    """
+    return f"{output_srt_path}.checkpoint.jsonl"
+
+
+def audio_hash(audio: np.ndarray) -> str:
+    """
+    @function audio_hash
+    @description Fingerprint of a range of audio, telling whether a checkpointed range still
+    holds the same audio.
+    @param audio: float32 audio
+    """
+    data = np.ascontiguousarray(audio, dtype=np.float32)
+    return hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()
+
+
+def _json_default(value):
+    # numpy scalars and arrays in backend outputs
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class TranscriptionCheckpoint:
+    """
+    @class TranscriptionCheckpoint
+    @description Results of a long transcription, saved range by range as they complete, so
+    a run that dies partway can be resumed. The sidecar is a JSON Lines file: a header with
+    the settings of the run, then one line per completed range with its sample offsets, the
+    hash of its audio and its result. Lines are appended and synced to disk one at a time, so
+    a crash loses at most the range being written, whose cut-off line is ignored on resume.
+    """
+
+    def __init__(self, path: str, settings: dict, resume: bool = False):
+        """
+        @function __init__
+        @param path: Sidecar file, see checkpoint_path()
+        @param settings: Model, backend, precision and mode of the run, JSON serializable.
+        Ranges checkpointed with other settings are not reused
+        @param resume: Reuse the ranges of an existing checkpoint, instead of starting over
+        """
+        self.path = path
+        self.settings = json.loads(json.dumps(settings, default=str))
+        self.ranges = self._load() if resume else {}
+        self.resumed = 0
+        self._hashes = {}
+        if self.ranges:
+            logger.info(f"Resuming from {path}: {len(self.ranges)} completed range(s)")
+
+        # The kept ranges are rewritten under a new header, replacing the file atomically
+        lines = [{"version": CHECKPOINT_VERSION, "settings": self.settings}]
+        lines += self.ranges.values()
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, default=_json_default) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            logger.info(f"No checkpoint at {self.path}, starting from the beginning")
+            return {}
+        ranges = {}
+        with open(self.path, encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                header = None
+            if not isinstance(header, dict) or header.get("version") != CHECKPOINT_VERSION:
+                logger.warning(f"Unreadable checkpoint {self.path}, starting from the beginning")
+                return {}
+            if header.get("settings") != self.settings:
+                logger.warning(
+                    f"Checkpoint {self.path} was made with {header.get('settings')}, not "
+                    f"{self.settings}; starting from the beginning"
+                )
+                return {}
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Cut off by the crash
+                    break
+                ranges[(entry["start"], entry["end"])] = entry
+        return ranges
+
+    def lookup(self, start: int, end: int, audio: np.ndarray):
+        """
+        @function lookup
+        @description Result of a range completed by an earlier run.
+        @param start: First sample of the range
+        @param end: Sample after the last one
+        @param audio: float32 audio of the range
+        @return: The result given to record(), or None if the range is still to transcribe
+        """
+        digest = audio_hash(audio)
+        entry = self.ranges.get((start, end))
+        if entry is not None and entry["audio"] == digest:
+            self.resumed += 1
+            return entry["result"]
+        # record() does not hash the same audio again
+        self._hashes[(start, end)] = digest
+        return None
+
+    def record(self, start: int, end: int, audio: np.ndarray, result):
+        """
+        @function record
+        @description Saves the result of a completed range.
+        @param start: First sample of the range
+        @param end: Sample after the last one
+        @param audio: float32 audio of the range
+        @param result: Result of the range, JSON serializable
+        """
+        digest = self._hashes.pop((start, end), None) or audio_hash(audio)
+        entry = {"start": start, "end": end, "audio": digest, "result": result}
+        line = json.dumps(entry, default=_json_default)
+        self.ranges[(start, end)] = json.loads(line)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        """
+        @function remove
+        @description Deletes the sidecar, once the SRT file is written.
+        """
+        if self.resumed:
+            logger.info(f"Reused {self.resumed} range(s) from the checkpoint")
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,280 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from logger import logger
+from precision import autocast_for
+
+
+class InferenceExecutor:
+    """
+    @class InferenceExecutor
+    @description Runs model inference on dedicated worker threads so that the asyncio loop
+    keeps receiving audio and sending text for every connection while a decode is running.
+    Torch releases the GIL inside its kernels, so a thread worker is enough to keep the loop
+    responsive.
+    """
+
+    def __init__(self, model, num_workers: int = 1):
+        """
+        @function __init__
+        @param model: Loaded pipeline (any callable taking an audio array)
+        @param num_workers: Number of inference threads consuming the job queue
+        """
+        self.model = model
+        self.num_workers = num_workers
+        if num_workers > 1 and not getattr(model, "thread_safe", False):
+            logger.warning(
+                "%s is not thread-safe, its calls are serialized and %d inference workers "
+                "run one at a time",
+                type(model).__name__,
+                num_workers,
+            )
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="inference"
+        )
+        self._pending = 0
+        self._running = 0
+        self._running_lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        @function queue_depth
+        @description Number of submitted jobs waiting for an inference thread.
+        """
+        return self._pending - self._running
+
+    @property
+    def in_flight(self) -> int:
+        """
+        @function in_flight
+        @description Number of submitted jobs that have not finished yet (waiting or running).
+        """
+        return self._pending
+
+    def _run(self, audio: np.ndarray, kwargs: dict, timing: dict) -> dict:
+        with self._running_lock:
+            self._running += 1
+        timing["started"] = time.perf_counter()
+        try:
+            with autocast_for(self.model):
+                return self.model(audio, **kwargs)
+        finally:
+            timing["finished"] = time.perf_counter()
+            with self._running_lock:
+                self._running -= 1
+
+    async def transcribe(self, audio: np.ndarray, timing: dict = None, **kwargs) -> dict:
+        """
+        @function transcribe
+        @description Submits audio to the inference queue and waits for the model output
+        without blocking the event loop.
+        @param audio: float32 audio at 16 kHz
+        @param timing: Optional dict receiving the time spent waiting for an inference thread
+        ("queue_wait") and running the model ("inference"), in seconds
+        @param kwargs: Extra keyword arguments forwarded to the pipeline call
+        """
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        logger.debug("Submitting inference job, queue depth %d", self.queue_depth)
+        start = time.perf_counter()
+        run_timing = {}
+        try:
+            return await loop.run_in_executor(
+                self._executor, self._run, audio, kwargs, run_timing
+            )
+        finally:
+            self._pending -= 1
+            if timing is not None and "finished" in run_timing:
+                timing["queue_wait"] = run_timing["started"] - start
+                timing["inference"] = run_timing["finished"] - run_timing["started"]
+            logger.debug(
+                "Inference job finished in %.3fs, queue depth %d",
+                time.perf_counter() - start,
+                self.queue_depth,
+            )
+
+    async def transcribe_batch(
+        self, audios: list[np.ndarray], timing: dict = None, **kwargs
+    ) -> list[dict]:
+        """
+        @function transcribe_batch
+        @description Runs several windows through the pipeline as one padded batch.
+        @param audios: List of float32 audio arrays at 16 kHz
+        @param timing: Optional dict receiving the timing of the batch, see transcribe()
+        @param kwargs: Extra keyword arguments forwarded to the pipeline call
+        """
+        if len(audios) == 1:
+            return [await self.transcribe(audios[0], timing, **kwargs)]
+        return await self.transcribe(audios, timing, batch_size=len(audios), **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        """
+        @function shutdown
+        @description Stops the inference threads once queued jobs are done.
+        @param wait: Block until the running jobs finish
+        """
+        self._executor.shutdown(wait=wait)
+
+
+class BatchScheduler:
+    """
+    @class BatchScheduler
+    @description Collects ready windows from all live sessions and decodes them together as
+    one padded batch. A batch is dispatched as soon as it reaches max_batch_size or when the
+    oldest window has waited max_wait_ms, whichever comes first. With max_batch_size=1 every
+    window is dispatched immediately, as if it was submitted to the executor directly.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        max_batch_size: int = 1,
+        max_wait_ms: float = 30.0,
+    ):
+        """
+        @function __init__
+        @param executor: Inference executor running the batches
+        @param max_batch_size: Largest number of windows decoded together
+        @param max_wait_ms: Longest time a window waits for other windows to join its batch
+        """
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._requests = None
+        self._task = None
+        self._slots = None
+
+        self.batches = 0
+        self.windows = 0
+        self.batch_size_histogram = {}
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        @function queue_depth
+        @description Windows waiting for a batch plus jobs queued on the executor.
+        """
+        waiting = self._requests.qsize() if self._requests is not None else 0
+        return waiting + self.executor.queue_depth
+
+    async def transcribe(self, audio: np.ndarray, timing: dict = None, **kwargs) -> dict:
+        """
+        @function transcribe
+        @description Queues a window for the next batch and waits for its own output.
+        @param audio: float32 audio at 16 kHz
+        @param timing: Optional dict receiving the time the window waited for its batch and an
+        inference thread ("queue_wait"), the inference duration of its batch ("inference") and
+        the batch size ("batch_size")
+        @param kwargs: Extra keyword arguments forwarded to the pipeline call. Only windows
+        with identical keyword arguments are batched together.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._requests = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.executor.num_workers)
+            self._task = loop.create_task(self._collect())
+
+        future = loop.create_future()
+        self._requests.put_nowait((audio, kwargs, future, time.perf_counter(), timing))
+        return await future
+
+    async def _collect(self):
+        while True:
+            # Only collect a new batch once an inference thread is free, so windows keep
+            # accumulating while every worker is busy
+            await self._slots.acquire()
+            batch = [await self._requests.get()]
+            deadline = batch[0][3] + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                if not self._requests.empty():
+                    batch.append(self._requests.get_nowait())
+                    continue
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._requests.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            asyncio.get_running_loop().create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: list):
+        try:
+            dispatched = time.perf_counter()
+            self._record(batch, dispatched)
+
+            # Windows with different call arguments can not share a pipeline call
+            groups = {}
+            for item in batch:
+                key = repr(sorted(item[1].items()))
+                groups.setdefault(key, []).append(item)
+
+            for items in groups.values():
+                audios = [item[0] for item in items]
+                batch_timing = {}
+                try:
+                    outputs = await self.executor.transcribe_batch(
+                        audios, batch_timing, **items[0][1]
+                    )
+                except Exception as e:
+                    for item in items:
+                        if not item[2].done():
+                            item[2].set_exception(e)
+                    continue
+                for item in items:
+                    if item[4] is not None:
+                        item[4]["queue_wait"] = (
+                            dispatched - item[3] + batch_timing.get("queue_wait", 0.0)
+                        )
+                        item[4]["inference"] = batch_timing.get("inference", 0.0)
+                        item[4]["batch_size"] = len(items)
+                for item, output in zip(items, outputs):
+                    if not item[2].done():
+                        item[2].set_result(output)
+        finally:
+            self._slots.release()
+
+    def _record(self, batch: list, dispatched: float):
+        size = len(batch)
+        self.batches += 1
+        self.windows += size
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+        for item in batch:
+            wait = dispatched - item[3]
+            self.total_wait += wait
+            self.max_wait_seen = max(self.max_wait_seen, wait)
+        logger.debug("Dispatching batch of %d window(s)", size)
+
+    def close(self):
+        """
+        @function close
+        @description Stops collecting batches, so a retired scheduler releases its executor.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        """
+        @function stats
+        @description Batch size and added wait statistics, used to tune throughput against
+        latency.
+        """
+        return {
+            "batches": self.batches,
+            "windows": self.windows,
+            "mean_batch_size": self.windows / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "mean_wait_ms": 1000 * self.total_wait / self.windows if self.windows else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_seen,
+        }
@@ -0,0 +1,87 @@
+import re
+
+_PUNCTUATION = re.compile(r"[^\w']+")
+
+
+def normalize_word(word: str) -> str:
+    """
+    @function normalize_word
+    @description Lower-cases a word and strips punctuation so that hypotheses differing only
+    in casing or punctuation still agree.
+    @param word: Word text as produced by the model
+    """
+    return _PUNCTUATION.sub("", word.lower())
+
+
+def words_from_output(output: dict) -> list[dict]:
+    """
+    @function words_from_output
+    @description Converts a pipeline output decoded with return_timestamps="word" to a list of
+    {"text", "start", "end"} words, with times in seconds relative to the decoded window.
+    @param output: Pipeline output with "chunks"
+    """
+    words = []
+    for chunk in output.get("chunks") or []:
+        text = chunk.get("text", "").strip()
+        if not text:
+            continue
+        start, end = chunk.get("timestamp") or (None, None)
+        if start is None:
+            start = words[-1]["end"] if words else 0.0
+        if end is None:
+            end = start
+        words.append({"text": text, "start": float(start), "end": float(end)})
+    return words
+
+
+class LocalAgreement:
+    """
+    @class LocalAgreement
+    @description Commits the part of a streaming transcript that consecutive hypotheses agree
+    on. Each time the growing window is re-decoded, the longest common word prefix between the
+    new hypothesis and the previous one is committed and will not change anymore; the rest is
+    only a partial result.
+    """
+
+    def __init__(self):
+        self.previous = []
+        self.committed_words = 0
+
+    def update(self, words: list[dict]) -> list[dict]:
+        """
+        @function update
+        @description Compares a new hypothesis of the uncommitted audio with the previous one.
+        @param words: Words of the new hypothesis, as returned by words_from_output
+        @return: Newly committed words
+        """
+        agreed = 0
+        for previous, current in zip(self.previous, words):
+            if normalize_word(previous["text"]) != normalize_word(current["text"]):
+                break
+            agreed += 1
+
+        newly_committed = words[:agreed]
+        self.previous = words[agreed:]
+        self.committed_words += len(newly_committed)
+        return newly_committed
+
+    def flush(self, words: list[dict] = None) -> list[dict]:
+        """
+        @function flush
+        @description Commits a whole hypothesis, e.g. at the end of an utterance, and starts
+        over.
+        @param words: Final hypothesis of the uncommitted audio, defaults to the last one seen
+        @return: Newly committed words
+        """
+        newly_committed = list(self.previous if words is None else words)
+        self.committed_words += len(newly_committed)
+        self.previous = []
+        return newly_committed
+
+    @property
+    def pending(self) -> list[dict]:
+        """
+        @function pending
+        @description Words of the last hypothesis that are not committed yet.
+        """
+        return self.previous
@@ -0,0 +1,256 @@
+import numpy as np
+
+from backends import segments_from_words
+from local_agreement import words_from_output
+from logger import logger
+
+SAMPLE_RATE = 16000
+# Whisper decodes 30 s windows, shorter chunks are padded to 30 s anyway
+CHUNK_SECONDS = 30.0
+# Words cut at a chunk edge are transcribed whole by the neighbouring chunk
+OVERLAP_SECONDS = 5.0
+# Chunks of digital silence are not decoded, whisper hallucinates text on them
+SILENCE_PEAK = 1e-4
+# Recordings read from an AudioStore are decoded in blocks of this length, bounding memory
+BLOCK_SECONDS = 600.0
+# Blocks end at the quietest 100 ms frame of their last seconds, rather than inside a word
+CUT_SEARCH_SECONDS = 30.0
+CUT_FRAME_SECONDS = 0.1
+
+
+def chunk_bounds(
+    num_samples: int,
+    chunk_seconds: float = CHUNK_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    sample_rate: int = SAMPLE_RATE,
+) -> list[tuple[int, int]]:
+    """
+    @function chunk_bounds
+    @description Splits a recording into chunks overlapping their neighbours. The last chunk
+    ends at the end of the recording and is as long as the others, so it is decoded with a
+    full window of context.
+    @param num_samples: Length of the recording, in samples
+    @param chunk_seconds: Length of a chunk
+    @param overlap_seconds: Audio shared by consecutive chunks
+    @param sample_rate: Sample rate of the recording
+    @return: (start, end) sample offsets of the chunks
+    """
+    chunk = int(chunk_seconds * sample_rate)
+    stride = chunk - int(overlap_seconds * sample_rate)
+    if stride <= 0:
+        raise ValueError("overlap_seconds must be shorter than chunk_seconds")
+    if num_samples <= chunk:
+        return [(0, num_samples)]
+    starts = list(range(0, num_samples - chunk, stride)) + [num_samples - chunk]
+    return [(start, start + chunk) for start in starts]
+
+
+def merge_chunk_words(
+    chunk_words: list[list[dict]],
+    bounds: list[tuple[int, int]],
+    sample_rate: int = SAMPLE_RATE,
+) -> list[dict]:
+    """
+    @function merge_chunk_words
+    @description Joins the words of overlapping chunks into one transcript. Each overlap is
+    cut in the middle, away from both chunk edges where words are cut off: a word belongs to
+    the chunk whose half of the overlap holds its middle.
+    @param chunk_words: Words of every chunk, with times in seconds relative to the chunk
+    @param bounds: (start, end) sample offsets of the chunks, as returned by chunk_bounds()
+    @param sample_rate: Sample rate of the recording
+    @return: Words with times in seconds relative to the recording
+    """
+    merged = []
+    for i, (words, (start, end)) in enumerate(zip(chunk_words, bounds)):
+        offset = start / sample_rate
+        # Middle of the overlap with the previous and the next chunk
+        low = (start + bounds[i - 1][1]) / 2 / sample_rate if i > 0 else float("-inf")
+        high = float("inf")
+        if i + 1 < len(bounds):
+            high = (bounds[i + 1][0] + end) / 2 / sample_rate
+        for word in words:
+            word = {**word, "start": word["start"] + offset, "end": word["end"] + offset}
+            if not low <= (word["start"] + word["end"]) / 2 < high:
+                continue
+            previous = merged[-1] if merged else None
+            # A word straddling the cut can be kept by both chunks
+            if (
+                previous is not None
+                and previous["text"] == word["text"]
+                and word["start"] < previous["end"]
+            ):
+                continue
+            merged.append(word)
+    return merged
+
+
+def transcribe_chunked(
+    backend,
+    audio: np.ndarray,
+    batch_size: int = 8,
+    chunk_seconds: float = CHUNK_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    checkpoint=None,
+) -> dict:
+    """
+    @function transcribe_chunked
+    @description Long-form transcription in batches: the recording is split into overlapping
+    chunks, the chunks are decoded batch_size at a time with word timestamps and the overlaps
+    are merged. Unlike the sequential long-form decoding of the backends, no window waits for
+    the text of the previous one, so backends decoding padded batches (transformers) keep
+    every core busy.
+    @param backend: InferenceBackend, see backends.py
+    @param audio: float32 audio at 16 kHz, or an AudioStore read chunk by chunk
+    @param batch_size: Chunks decoded together
+    @param chunk_seconds: Length of a chunk, at most the 30 s whisper window
+    @param overlap_seconds: Audio shared by consecutive chunks
+    @param checkpoint: TranscriptionCheckpoint saving the words of every chunk, chunks it
+    holds are not decoded again
+    @return: {"text", "segments"} in the format of InferenceBackend.transcribe_long_form()
+    """
+    bounds = chunk_bounds(len(audio), chunk_seconds, overlap_seconds)
+    chunk_words = [[] for _ in bounds]
+    speech = [
+        i
+        for i, (start, end) in enumerate(bounds)
+        if np.abs(audio[start:end]).max(initial=0) >= SILENCE_PEAK
+    ]
+    logger.info(
+        "Transcribing %d chunk(s) of %.0fs in batches of %d (%d silent)",
+        len(bounds),
+        chunk_seconds,
+        batch_size,
+        len(bounds) - len(speech),
+    )
+    if checkpoint is not None:
+        pending = []
+        for i in speech:
+            words = checkpoint.lookup(*bounds[i], audio[bounds[i][0]:bounds[i][1]])
+            if words is None:
+                pending.append(i)
+            else:
+                chunk_words[i] = words
+        if len(pending) < len(speech):
+            logger.info("%d chunk(s) restored from the checkpoint", len(speech) - len(pending))
+        speech = pending
+
+    for first in range(0, len(speech), batch_size):
+        batch = speech[first:first + batch_size]
+        chunks = [audio[bounds[i][0]:bounds[i][1]] for i in batch]
+        outputs = backend.transcribe_batch(chunks, word_timestamps=True)
+        for i, chunk, output in zip(batch, chunks, outputs):
+            chunk_words[i] = words_from_output(output)
+            if checkpoint is not None:
+                checkpoint.record(*bounds[i], chunk, chunk_words[i])
+        done = min(first + batch_size, len(speech))
+        logger.info("Transcribed %d/%d chunk(s)", done, len(speech))
+
+    words = merge_chunk_words(chunk_words, bounds)
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "segments": segments_from_words(words),
+    }
+
+
+def quiet_cut(
+    audio,
+    start: int,
+    end: int,
+    sample_rate: int = SAMPLE_RATE,
+    search_seconds: float = CUT_SEARCH_SECONDS,
+) -> int:
+    """
+    @function quiet_cut
+    @description Finds where to end a block: the start of the frame with the least energy in
+    the last search_seconds before end.
+    @param audio: float32 audio or AudioStore
+    @param start: First sample of the block
+    @param end: Latest end of the block
+    @param sample_rate: Sample rate of the audio
+    @param search_seconds: Audio searched for a quiet frame
+    @return: Sample to end the block at
+    """
+    frame = int(CUT_FRAME_SECONDS * sample_rate)
+    search_start = max(start + frame, end - int(search_seconds * sample_rate))
+    frames = (end - search_start) // frame
+    if frames <= 0:
+        return end
+    window = audio[search_start:search_start + frames * frame].reshape(frames, frame)
+    return search_start + int(np.argmin(np.square(window).sum(axis=1))) * frame
+
+
+def shift_segments(segments: list[dict], seconds: float) -> list[dict]:
+    """
+    @function shift_segments
+    @description Moves whisper-style segments and their words later in time.
+    @param segments: Segments with "start", "end" and optionally "words"
+    @param seconds: Offset to add
+    @return: New segments
+    """
+    shifted = []
+    for segment in segments:
+        segment = {**segment, "start": segment["start"] + seconds, "end": segment["end"] + seconds}
+        if segment.get("words"):
+            segment["words"] = [
+                {**word, "start": word["start"] + seconds, "end": word["end"] + seconds}
+                for word in segment["words"]
+            ]
+        shifted.append(segment)
+    return shifted
+
+
+def transcribe_blocks(
+    backend,
+    audio,
+    vad: bool = True,
+    block_seconds: float = BLOCK_SECONDS,
+    sample_rate: int = SAMPLE_RATE,
+    checkpoint=None,
+) -> dict:
+    """
+    @function transcribe_blocks
+    @description Sequential long-form transcription of a recording read block by block, so
+    only one block is held as float32. Each block is decoded with the backend's own long-form
+    decoding (VAD included) and ends at a quiet frame; recordings shorter than a block are
+    decoded in one call, as before.
+    @param backend: InferenceBackend, see backends.py
+    @param audio: AudioStore, or float32 audio at 16 kHz
+    @param vad: Skip non-speech where the backend supports it
+    @param block_seconds: Longest block
+    @param sample_rate: Sample rate of the audio
+    @param checkpoint: TranscriptionCheckpoint saving the result of every block, blocks it
+    holds are not decoded again
+    @return: {"text", "segments"} in the format of InferenceBackend.transcribe_long_form()
+    """
+    block = int(block_seconds * sample_rate)
+    texts, segments = [], []
+    start = 0
+    while start < len(audio):
+        end = len(audio)
+        if end - start > block:
+            end = quiet_cut(audio, start, start + block, sample_rate)
+        window = audio[start:end]
+        result = checkpoint.lookup(start, end, window) if checkpoint is not None else None
+        if result is None:
+            logger.info(
+                "Transcribing %.0fs - %.0fs of %.0fs",
+                start / sample_rate,
+                end / sample_rate,
+                len(audio) / sample_rate,
+            )
+            result = backend.transcribe_long_form(window, vad=vad)
+            if checkpoint is not None:
+                checkpoint.record(start, end, window, result)
+        else:
+            logger.info(
+                "%.0fs - %.0fs restored from the checkpoint", start / sample_rate, end / sample_rate
+            )
+        # Only one block is held as float32
+        del window
+        texts.append(result.get("text", "").strip())
+        segments += shift_segments(result.get("segments") or [], start / sample_rate)
+        start = end
+    for i, segment in enumerate(segments):
+        if "id" in segment:
+            segment["id"] = i
+    return {"text": " ".join(text for text in texts if text), "segments": segments}
@@ -0,0 +1,240 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, from a few milliseconds up to a long decode
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+WINDOW_BUCKETS = (0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0)
+
+
+class Metric:
+    """
+    @class Metric
+    @description Base class of the Prometheus-style metrics below. Values can be updated from
+    the event loop and from inference threads.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """
+    @class Counter
+    @description Monotonically increasing value.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name} {self.value:g}"]
+
+
+class Gauge(Metric):
+    """
+    @class Gauge
+    @description Value that goes up and down. A callback can compute it at scrape time.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback=None):
+        super().__init__(name, help_text)
+        self.value = 0.0
+        self.callback = callback
+
+    def set(self, value: float):
+        self.value = value
+
+    def _samples(self) -> list[str]:
+        value = self.callback() if self.callback is not None else self.value
+        return [f"{self.name} {value:g}"]
+
+
+class Histogram(Metric):
+    """
+    @class Histogram
+    @description Distribution of observed values over fixed buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def _samples(self) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:g}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class StreamingMetrics:
+    """
+    @class StreamingMetrics
+    @description Process-wide measurements of the websocket server, exported in the
+    Prometheus text format by render().
+    """
+
+    def __init__(self, queue_depth=None, active_sessions=None, pool_sessions=None):
+        """
+        @function __init__
+        @param queue_depth: Callback returning the number of windows waiting for inference
+        @param active_sessions: Callback returning the number of live sessions
+        @param pool_sessions: Callback returning the live sessions of all worker processes,
+        when running in a worker pool
+        """
+        self.started_at = time.time()
+        self.uptime = Gauge(
+            "ws_uptime_seconds", "Time since the server started", lambda: time.time() - self.started_at
+        )
+        self.sessions_total = Counter("ws_sessions_total", "Sessions accepted")
+        self.sessions_rejected = Counter(
+            "ws_sessions_rejected_total", "Connections rejected by admission control"
+        )
+        self.sessions_active = Gauge("ws_sessions_active", "Live sessions", active_sessions)
+        if pool_sessions is not None:
+            self.pool_sessions_active = Gauge(
+                "ws_pool_sessions_active", "Live sessions of all worker processes", pool_sessions
+            )
+        self.inference_queue_depth = Gauge(
+            "ws_inference_queue_depth", "Windows waiting for inference", queue_depth
+        )
+        self.queue_wait = Histogram(
+            "ws_queue_wait_seconds", "Time a window waited for batching and an inference thread"
+        )
+        self.inference = Histogram("ws_inference_seconds", "Model inference duration per call")
+        self.real_time_factor = Histogram(
+            "ws_real_time_factor", "Inference duration divided by window duration", RATIO_BUCKETS
+        )
+        self.time_to_first_text = Histogram(
+            "ws_time_to_first_text_seconds", "Time from first audio to first text of a session"
+        )
+        self.window = Histogram(
+            "ws_window_seconds", "Duration of the windows sent to the model", WINDOW_BUCKETS
+        )
+        self.dropped_chunks = Counter(
+            "ws_dropped_chunks_total", "Audio chunks dropped by queue overflow"
+        )
+        self.dropped_audio = Counter(
+            "ws_dropped_audio_seconds_total", "Audio dropped by queue overflow"
+        )
+
+    def metrics(self) -> list[Metric]:
+        return [value for value in vars(self).values() if isinstance(value, Metric)]
+
+    def render(self) -> str:
+        """
+        @function render
+        @description All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class SessionMetrics:
+    """
+    @class SessionMetrics
+    @description Measurements of a single session, summarised when it ends and optionally
+    attached to outgoing messages as a `timing` field.
+    """
+
+    def __init__(self):
+        self.first_audio_at = None
+        self.time_to_first_text = None
+        self.windows = 0
+        self.audio_seconds = 0.0
+        self.inference_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+        self.max_window_seconds = 0.0
+        self.last_timing = None
+
+    def audio_received(self):
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+
+    def text_sent(self) -> float:
+        """
+        @function text_sent
+        @description Records the first text of the session.
+        @return: Time to first text in seconds, only on the first call
+        """
+        if self.time_to_first_text is None and self.first_audio_at is not None:
+            self.time_to_first_text = time.perf_counter() - self.first_audio_at
+            return self.time_to_first_text
+        return None
+
+    def window_decoded(self, window_seconds: float, timing: dict) -> dict:
+        """
+        @function window_decoded
+        @description Accumulates the timing of one decoded window.
+        @param window_seconds: Duration of the decoded audio
+        @param timing: queue_wait and inference durations in seconds
+        @return: Timing summary of the window, in milliseconds
+        """
+        self.windows += 1
+        self.audio_seconds += window_seconds
+        self.inference_seconds += timing.get("inference", 0.0)
+        self.queue_wait_seconds += timing.get("queue_wait", 0.0)
+        self.max_window_seconds = max(self.max_window_seconds, window_seconds)
+        self.last_timing = {
+            "window_ms": round(1000 * window_seconds, 1),
+            "queue_wait_ms": round(1000 * timing.get("queue_wait", 0.0), 1),
+            "inference_ms": round(1000 * timing.get("inference", 0.0), 1),
+            "rtf": round(timing.get("inference", 0.0) / window_seconds, 3)
+            if window_seconds
+            else None,
+        }
+        return self.last_timing
+
+    def summary(self) -> dict:
+        return {
+            "windows": self.windows,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "inference_seconds": round(self.inference_seconds, 3),
+            "queue_wait_seconds": round(self.queue_wait_seconds, 3),
+            "real_time_factor": round(self.inference_seconds / self.audio_seconds, 3)
+            if self.audio_seconds
+            else None,
+            "time_to_first_text": round(self.time_to_first_text, 3)
+            if self.time_to_first_text is not None
+            else None,
+            "max_window_seconds": round(self.max_window_seconds, 2),
+        }
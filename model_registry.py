@@ -0,0 +1,298 @@
+import gc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from logger import logger
+
+
+def estimate_model_bytes(model) -> int:
+    """
+    @function estimate_model_bytes
+    @description Memory held by the weights of a model: tensors in the state dict of a torch
+    module, or of the module wrapped by a pipeline. The state dict also covers the packed
+    weights of quantized layers, which are not parameters.
+    @param model: torch module, pipeline with a `model` attribute, or any object reporting its
+    own size with a memory_bytes() method
+    @return: Size in bytes, 0 if unknown
+    """
+    if hasattr(model, "memory_bytes"):
+        return model.memory_bytes()
+    module = model if hasattr(model, "state_dict") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "state_dict"):
+        return 0
+    size = 0
+    seen = set()
+    values = list(module.state_dict(keep_vars=True).values())
+    while values:
+        value = values.pop()
+        if isinstance(value, (tuple, list)):
+            values.extend(value)
+        elif hasattr(value, "element_size") and id(value) not in seen:
+            # Tied weights appear under several names
+            seen.add(id(value))
+            size += value.numel() * value.element_size()
+    return size
+
+
+class _Entry:
+    def __init__(self, key: tuple, dtype):
+        self.key = key
+        # The loader gets the dtype object, the key only holds its name
+        self.dtype = dtype
+        self.model = None
+        self.size = 0
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.loaded = threading.Event()
+        self.error = None
+        # Replaced by a refreshed load, freed once its last lease is released
+        self.detached = False
+
+
+class ModelRegistry:
+    """
+    @class ModelRegistry
+    @description Process-wide cache of loaded models keyed by (model_id, backend, device, dtype).
+    Callers acquire a model and release it when done; concurrent requests for the same key
+    share one load (single flight) and one copy. Models nobody holds stay cached for the next
+    request and are evicted least recently used first once the memory budget is exceeded.
+    """
+
+    def __init__(self, memory_budget: int = 0):
+        """
+        @function __init__
+        @param memory_budget: Bytes of weights kept loaded, 0 for no limit. Models in use are
+        never evicted, so the budget can be exceeded while they are held.
+        """
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_model = {}
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_id: str, backend: str, device: str, dtype) -> tuple:
+        # torch dtypes print as "torch.float16", keep keys independent of the dtype objects
+        return (model_id, backend, device, None if dtype is None else str(dtype))
+
+    def acquire(
+        self,
+        model_id: str,
+        backend: str,
+        device: str,
+        dtype,
+        loader,
+        refresh: bool = False,
+    ):
+        """
+        @function acquire
+        @description Returns the cached model for the key, loading it if needed. Every call
+        must be paired with release().
+        @param model_id: Model identifier
+        @param backend: Inference backend the model is loaded for
+        @param device: Device the model runs on
+        @param dtype: Data type of the weights
+        @param loader: Called as loader(model_id, device, dtype) to load the model
+        @param refresh: Load fresh weights even if the model is cached, e.g. after a deploy.
+        Holders of the previous copy keep it until they release it.
+        @return: Loaded model
+        """
+        key = self.make_key(model_id, backend, device, dtype)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and refresh and entry.loaded.is_set():
+                self._detach(entry)
+                entry = None
+            owner = entry is None
+            if owner:
+                entry = _Entry(key, dtype)
+                self._entries[key] = entry
+            else:
+                self.hits += 1
+            entry.refs += 1
+
+        if owner:
+            self._load(entry, loader)
+        else:
+            entry.loaded.wait()
+            if entry.error is not None:
+                with self._lock:
+                    entry.refs -= 1
+                raise entry.error
+
+        with self._lock:
+            entry.last_used = time.monotonic()
+        return entry.model
+
+    def _load(self, entry: _Entry, loader):
+        model_id, backend, device, _ = entry.key
+        start = time.perf_counter()
+        logger.info("Loading %s (%s) on %s", model_id, backend, device)
+        try:
+            model = loader(model_id, device, entry.dtype)
+        except BaseException as e:
+            with self._lock:
+                entry.error = e
+                entry.refs -= 1
+                if self._entries.get(entry.key) is entry:
+                    del self._entries[entry.key]
+            entry.loaded.set()
+            raise
+
+        with self._lock:
+            entry.model = model
+            entry.size = estimate_model_bytes(model)
+            self._by_model[id(model)] = entry
+            self.loads += 1
+        entry.loaded.set()
+        logger.info(
+            "Loaded %s (%s) in %.2fs, %.0f MB",
+            model_id,
+            backend,
+            time.perf_counter() - start,
+            entry.size / 2**20,
+        )
+        self._evict()
+
+    def release(self, model) -> bool:
+        """
+        @function release
+        @description Gives back a model obtained from acquire(). The model stays cached until
+        it is evicted.
+        @param model: Model returned by acquire()
+        @return: False if the model is not managed by the registry
+        """
+        with self._lock:
+            entry = self._by_model.get(id(model))
+            if entry is None or entry.refs == 0:
+                return False
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            freed = entry.detached and entry.refs == 0
+            if freed:
+                self._drop(entry)
+        if freed:
+            self._collect()
+        else:
+            self._evict()
+        return True
+
+    @contextmanager
+    def lease(self, model_id: str, backend: str, device: str, dtype, loader):
+        """
+        @function lease
+        @description Context manager acquiring a model for the duration of a block.
+        """
+        model = self.acquire(model_id, backend, device, dtype, loader)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def evict(self, model_id: str = None) -> int:
+        """
+        @function evict
+        @description Drops cached models nobody holds.
+        @param model_id: Only evict this model, defaults to all idle models
+        @return: Number of evicted models
+        """
+        with self._lock:
+            idle = [
+                e
+                for e in self._entries.values()
+                if e.refs == 0 and e.loaded.is_set() and model_id in (None, e.key[0])
+            ]
+            for entry in idle:
+                self._drop(entry)
+                self.evictions += 1
+        if idle:
+            self._collect()
+        return len(idle)
+
+    @property
+    def loaded_bytes(self) -> int:
+        """
+        @function loaded_bytes
+        @description Weights held by all loaded models, including replaced ones still in use.
+        """
+        with self._lock:
+            return sum(e.size for e in self._by_model.values())
+
+    def stats(self) -> dict:
+        """
+        @function stats
+        @description Cached models, their leases and the cache counters.
+        """
+        with self._lock:
+            return {
+                "models": [
+                    {
+                        "model_id": e.key[0],
+                        "backend": e.key[1],
+                        "device": e.key[2],
+                        "dtype": e.key[3],
+                        "refs": e.refs,
+                        "size_mb": round(e.size / 2**20, 1),
+                        "detached": e.detached,
+                    }
+                    for e in self._by_model.values()
+                ],
+                "memory_budget_mb": round(self.memory_budget / 2**20, 1),
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+            }
+
+    def _detach(self, entry: _Entry):
+        del self._entries[entry.key]
+        entry.detached = True
+        if entry.refs == 0:
+            self._drop(entry)
+
+    def _drop(self, entry: _Entry):
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        self._by_model.pop(id(entry.model), None)
+        logger.info("Unloading %s (%s) on %s", *entry.key[:3])
+        entry.model = None
+
+    def _evict(self):
+        if not self.memory_budget:
+            return
+        evicted = False
+        with self._lock:
+            total = sum(e.size for e in self._by_model.values())
+            idle = sorted(
+                (e for e in self._entries.values() if e.refs == 0 and e.loaded.is_set()),
+                key=lambda e: e.last_used,
+            )
+            for entry in idle:
+                if total <= self.memory_budget:
+                    break
+                total -= entry.size
+                self._drop(entry)
+                self.evictions += 1
+                evicted = True
+            if total > self.memory_budget:
+                logger.warning(
+                    "Loaded models use %.0f MB, above the %.0f MB budget, while in use",
+                    total / 2**20,
+                    self.memory_budget / 2**20,
+                )
+        if evicted:
+            self._collect()
+
+    @staticmethod
+    def _collect():
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# Shared by every entry point of the process
+MODEL_REGISTRY = ModelRegistry()
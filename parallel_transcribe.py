@@ -0,0 +1,346 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import webrtcvad
+
+from audio_store import AudioStore
+from backends import segments_from_words
+from local_agreement import words_from_output
+from logger import logger
+from long_form import quiet_cut
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Audio read per VAD pass, bounds memory for recordings of any length
+VAD_READ_SECONDS = 60
+# Whisper decodes 30 s windows, work units are packed up to that length
+UNIT_SECONDS = 30.0
+
+# Backend of the worker process, loaded once by _init_worker
+_worker = {}
+
+
+class SpeechSegmenter:
+    """
+    @class SpeechSegmenter
+    @description Finds the speech in audio fed in pieces, with webrtcvad. Voiced 30 ms frames
+    closer than min_silence_ms are joined, regions shorter than min_speech_ms are dropped and
+    the rest are padded, so word edges are not clipped. A region is returned as soon as no
+    later frame can extend it.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        aggressiveness: int = 2,
+        min_silence_ms: int = 300,
+        min_speech_ms: int = 250,
+        pad_ms: int = 200,
+        max_region_seconds: float = None,
+    ):
+        """
+        @function __init__
+        @param sample_rate: Sample rate of the audio, one webrtcvad accepts
+        @param aggressiveness: webrtcvad aggressiveness, 0 (least) to 3 (most aggressive)
+        @param min_silence_ms: Shortest pause separating two regions
+        @param min_speech_ms: Shortest region kept
+        @param pad_ms: Audio added on both sides of a region
+        @param max_region_seconds: Ends regions of uninterrupted speech at this length, so
+        streamed audio is not held for a region that never ends (default: no limit)
+        """
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * FRAME_MS // 1000
+        self.min_silence = min_silence_ms * sample_rate // 1000
+        self.min_speech = min_speech_ms * sample_rate // 1000
+        self.pad = pad_ms * sample_rate // 1000
+        self.max_region = int(max_region_seconds * sample_rate) if max_region_seconds else None
+        self.position = 0
+        self.region = None
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    @property
+    def horizon(self) -> int:
+        """
+        @function horizon
+        @description Earliest sample regions still to come can end at.
+        """
+        return self.region[1] if self.region else self.position
+
+    @property
+    def earliest_start(self) -> int:
+        """
+        @function earliest_start
+        @description Earliest sample regions still to come can start at, padding included.
+        """
+        return max(0, (self.region[0] if self.region else self.position) - self.pad)
+
+    def push(self, audio: np.ndarray) -> list[tuple[int, int]]:
+        """
+        @function push
+        @description Runs VAD over the complete frames available after appending audio.
+        @param audio: float32 audio following the audio pushed before
+        @return: (start, end) sample offsets of the regions that ended
+        """
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        pcm = np.concatenate([self._pending, pcm])
+        frames = len(pcm) // self.frame
+        regions = []
+        for i in range(frames):
+            frame = pcm[i * self.frame:(i + 1) * self.frame]
+            start = self.position
+            self.position += self.frame
+            if self.vad.is_speech(frame.tobytes(), self.sample_rate):
+                if self.region is not None and start - self.region[1] < self.min_silence:
+                    self.region[1] = self.position
+                else:
+                    self.region = [start, self.position]
+                if self.max_region and self.region[1] - self.region[0] >= self.max_region:
+                    regions += self._close(self.position)
+            elif (
+                self.region is not None
+                and self.position - self.region[1] >= max(self.min_silence, self.pad)
+            ):
+                regions += self._close(self.position)
+        self._pending = pcm[frames * self.frame:]
+        return regions
+
+    def flush(self) -> list[tuple[int, int]]:
+        """
+        @function flush
+        @description Ends the audio.
+        @return: The region still open, if any
+        """
+        return self._close(self.position + len(self._pending)) if self.region else []
+
+    def _close(self, length: int) -> list[tuple[int, int]]:
+        start, end = self.region
+        self.region = None
+        if end - start < self.min_speech:
+            return []
+        return [(max(0, start - self.pad), min(length, end + self.pad))]
+
+
+def speech_regions(audio, sample_rate: int = SAMPLE_RATE, **kwargs) -> list[tuple[int, int]]:
+    """
+    @function speech_regions
+    @description Finds the speech in a recording, see SpeechSegmenter.
+    @param audio: AudioStore, or float32 audio
+    @param sample_rate: Sample rate of the audio, one webrtcvad accepts
+    @param kwargs: Options of SpeechSegmenter
+    @return: (start, end) sample offsets of the speech regions, in order
+    """
+    segmenter = SpeechSegmenter(sample_rate, **kwargs)
+    regions = []
+    read = VAD_READ_SECONDS * sample_rate
+    for offset in range(0, len(audio), read):
+        regions += segmenter.push(audio[offset:offset + read])
+    return regions + segmenter.flush()
+
+
+class UnitPacker:
+    """
+    @class UnitPacker
+    @description Packs consecutive speech regions into work units of at most unit_seconds,
+    from the start of their first region to the end of their last. Regions longer than a
+    unit are split at their quietest frames.
+    """
+
+    def __init__(self, audio, unit_seconds: float = UNIT_SECONDS, sample_rate: int = SAMPLE_RATE):
+        """
+        @function __init__
+        @param audio: AudioStore, float32 audio or any audio sliced by sample offsets, read
+        to split long regions
+        @param unit_seconds: Longest unit
+        @param sample_rate: Sample rate of the audio
+        """
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.limit = int(unit_seconds * sample_rate)
+        self.unit = None
+        self.end = 0
+
+    def push(self, region: tuple[int, int]) -> list[tuple[int, int]]:
+        """
+        @function push
+        @description Adds the next speech region.
+        @return: (start, end) sample offsets of the units completed
+        """
+        start, end = region
+        # Padding can make neighbouring regions overlap
+        start = max(start, self.end)
+        if end <= start:
+            return []
+        if self.unit is not None and end - self.unit[0] <= self.limit:
+            self.unit = (self.unit[0], end)
+            self.end = end
+            return []
+        units = [self.unit] if self.unit is not None else []
+        while end - start > self.limit:
+            cut = quiet_cut(
+                self.audio, start, start + self.limit, self.sample_rate, search_seconds=5.0
+            )
+            units.append((start, cut))
+            start = cut
+        self.unit, self.end = (start, end), end
+        return units
+
+    def ready(self, horizon: int) -> list[tuple[int, int]]:
+        """
+        @function ready
+        @description Completes the open unit if no region still to come can join it.
+        @param horizon: Earliest sample regions still to come can end at
+        """
+        if self.unit is not None and horizon - self.unit[0] > self.limit:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[tuple[int, int]]:
+        """
+        @function flush
+        @description Completes the open unit.
+        """
+        units = [self.unit] if self.unit is not None else []
+        self.unit = None
+        return units
+
+
+def pack_work_units(
+    audio,
+    regions: list[tuple[int, int]],
+    unit_seconds: float = UNIT_SECONDS,
+    sample_rate: int = SAMPLE_RATE,
+) -> list[tuple[int, int]]:
+    """
+    @function pack_work_units
+    @description Packs speech regions into work units, see UnitPacker.
+    @param audio: AudioStore, or float32 audio, read to split long regions
+    @param regions: Speech regions, as returned by speech_regions()
+    @param unit_seconds: Longest unit
+    @param sample_rate: Sample rate of the audio
+    @return: (start, end) sample offsets of the units, in order and not overlapping
+    """
+    packer = UnitPacker(audio, unit_seconds, sample_rate)
+    units = []
+    for region in regions:
+        units += packer.push(region)
+    return units + packer.flush()
+
+
+def _init_worker(
+    store_path: str, backend: str, model_id: str, device: str, torch_dtype, threads: int
+):
+    import torch
+
+    from backends import load_backend
+
+    torch.set_num_threads(threads)
+    _worker["audio"] = AudioStore(store_path)
+    _worker["backend"] = load_backend(backend, model_id, device, torch_dtype)
+    logger.info("Transcription worker (pid %d) ready, %d torch thread(s)", os.getpid(), threads)
+
+
+def unit_words(
+    backend, audio: np.ndarray, start: int, sample_rate: int = SAMPLE_RATE
+) -> list[dict]:
+    """
+    @function unit_words
+    @description Transcribes a work unit with word timestamps.
+    @param backend: InferenceBackend to decode with
+    @param audio: float32 audio of the unit, up to 30 s
+    @param start: Sample offset of the unit in the recording
+    @param sample_rate: Sample rate of the audio
+    @return: {"text", "start", "end"} words, in seconds of the recording
+    """
+    output = backend.transcribe_window(audio, word_timestamps=True)
+    offset, duration = start / sample_rate, len(audio) / sample_rate
+    # Timestamps can point into the padding of the 30 s window
+    return [
+        {
+            **word,
+            "start": min(word["start"], duration) + offset,
+            "end": min(word["end"], duration) + offset,
+        }
+        for word in words_from_output(output)
+    ]
+
+
+def _transcribe_unit(unit: tuple[int, int]) -> list[dict]:
+    start, end = unit
+    return unit_words(_worker["backend"], _worker["audio"][start:end], start)
+
+
+def transcribe_parallel(
+    store: AudioStore,
+    backend: str,
+    model_id: str,
+    device: str = "cpu",
+    torch_dtype=None,
+    workers: int = None,
+    threads_per_worker: int = 0,
+    checkpoint=None,
+) -> dict:
+    """
+    @function transcribe_parallel
+    @description Long-form transcription spread over a pool of worker processes. Speech
+    regions found with webrtcvad are packed into work units of up to 30 s; every worker
+    loads its own model, maps the store file and transcribes whole units with word
+    timestamps, which are shifted back to the time of the recording. Units are independent,
+    so throughput grows with the number of workers until the cores are used up.
+    @param store: Recording to transcribe, backed by a file the workers can map
+    @param backend: Inference backend name, see backends.available_backends()
+    @param model_id: Model every worker loads
+    @param device: Device to run the models on
+    @param torch_dtype: Data type for model computation, as given to --dtype
+    @param workers: Worker processes (default: CPU count)
+    @param threads_per_worker: Torch threads per worker (0: CPU count divided by workers)
+    @param checkpoint: TranscriptionCheckpoint saving the words of every unit as it completes,
+    units it holds are not transcribed again
+    @return: {"text", "segments"} in the format of InferenceBackend.transcribe_long_form()
+    """
+    workers = workers or os.cpu_count()
+    threads = threads_per_worker or max(1, os.cpu_count() // workers)
+    regions = speech_regions(store)
+    units = pack_work_units(store, regions)
+    speech_seconds = sum(end - start for start, end in units) / SAMPLE_RATE
+    logger.info(
+        "Transcribing %.0fs of speech in %d unit(s) with %d worker(s)",
+        speech_seconds,
+        len(units),
+        workers,
+    )
+
+    unit_results = [None] * len(units)
+    if checkpoint is not None:
+        for i, (start, end) in enumerate(units):
+            unit_results[i] = checkpoint.lookup(start, end, store[start:end])
+    pending = [i for i, result in enumerate(unit_results) if result is None]
+    if len(pending) < len(units):
+        logger.info("%d unit(s) restored from the checkpoint", len(units) - len(pending))
+
+    if pending:
+        # Spawned, not forked: no torch threads or CUDA state of this process are inherited
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(store.path, backend, model_id, device, torch_dtype, threads),
+        ) as pool:
+            futures = {pool.submit(_transcribe_unit, units[i]): i for i in pending}
+            # Saved as they complete, a unit finished early is not lost to a later failure
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                unit_results[i] = future.result()
+                if checkpoint is not None:
+                    start, end = units[i]
+                    checkpoint.record(start, end, store[start:end], unit_results[i])
+                if done % 10 == 0 or done == len(pending):
+                    logger.info("Transcribed %d/%d unit(s)", done, len(pending))
+
+    words = [word for result in unit_results for word in result]
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "segments": segments_from_words(words),
+    }
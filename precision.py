@@ -0,0 +1,136 @@
+import functools
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
+
+from logger import logger
+
+# PRECISIONS is read by the command line parsers, torch is only imported once a model is loaded
+if TYPE_CHECKING:
+    import torch
+    from torch import nn
+
+# Precisions accepted by --dtype
+PRECISIONS = ("float16", "float32", "bfloat16", "int8")
+
+# Marks a model loaded with float32 weights that runs its forward passes under bf16 autocast
+AUTOCAST_ATTR = "autocast_dtype"
+
+
+def cpu_supports_bf16() -> bool:
+    """
+    @function cpu_supports_bf16
+    @description Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX). Other
+    CPUs emulate bf16 and run slower than float32.
+    """
+    import torch
+
+    cpu = getattr(torch, "cpu", None)
+    for check in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"):
+        if hasattr(cpu, check) and getattr(cpu, check)():
+            return True
+    return False
+
+
+def resolve_dtype(torch_dtype: "torch.dtype", device: str) -> "torch.dtype":
+    """
+    @function resolve_dtype
+    @description Replaces precisions the device cannot run efficiently with the closest one it
+    can: float16 runs as float32 on CPU, int8 dynamic quantization is CPU only and bfloat16
+    needs a CPU with native bf16 support.
+    @param torch_dtype: Requested dtype, torch.qint8 for int8 dynamic quantization
+    @param device: Device the model runs on
+    """
+    import torch
+
+    if device == "cpu" and torch_dtype == torch.float16:
+        logger.info("Switching to float32 for CPU compatibility")
+        return torch.float32
+    if device != "cpu" and torch_dtype == torch.qint8:
+        logger.warning("int8 dynamic quantization runs on CPU only, using float16 on %s", device)
+        return torch.float16
+    if device == "cpu" and torch_dtype == torch.bfloat16 and not cpu_supports_bf16():
+        logger.warning("CPU has no native bfloat16 support, using float32")
+        return torch.float32
+    return torch_dtype
+
+
+def _to_plain_linear(module: "nn.Module") -> "nn.Module":
+    from torch import nn
+
+    # openai-whisper subclasses nn.Linear, quantize_dynamic only swaps exact nn.Linear modules
+    for name, child in module.named_children():
+        if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+            linear = nn.Linear(
+                child.in_features, child.out_features, bias=child.bias is not None
+            )
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _to_plain_linear(child)
+    return module
+
+
+def quantize_int8(model: "nn.Module") -> "nn.Module":
+    """
+    @function quantize_int8
+    @description Applies dynamic int8 quantization to the Linear layers of the encoder and
+    decoder: weights are stored in int8 and activations are quantized on the fly, which cuts
+    their memory by 4x and speeds up the matmuls on CPU. Convolutions, embeddings and layer
+    norms stay in float32.
+    @param model: float32 model on CPU
+    @return: Quantized model
+    """
+    import torch
+    from torch import nn
+
+    model = _to_plain_linear(model.float().eval())
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def set_autocast(model, dtype: "torch.dtype"):
+    """
+    @function set_autocast
+    @description Makes autocast_for(model) run the model under CPU autocast to dtype.
+    @param model: Model or pipeline
+    @param dtype: Autocast dtype, None to disable
+    """
+    setattr(model, AUTOCAST_ATTR, dtype)
+
+
+def autocast_for(model):
+    """
+    @function autocast_for
+    @description Context manager enabling the autocast set on the model with set_autocast().
+    Autocast is thread local, so it must be entered on the thread running the model.
+    @param model: Model or pipeline
+    """
+    dtype = getattr(model, AUTOCAST_ATTR, None)
+    if dtype is None:
+        return nullcontext()
+    import torch
+
+    return torch.autocast("cpu", dtype=dtype)
+
+
+def autocast_forward(module: "nn.Module", dtype: "torch.dtype") -> "nn.Module":
+    """
+    @function autocast_forward
+    @description Runs the forward pass of a module under CPU autocast and returns its output
+    in float32, so code around the module keeps float32 tensors. Used for models whose
+    callers check or combine tensor dtypes themselves, such as openai-whisper.
+    @param module: Module returning a tensor
+    @param dtype: Autocast dtype
+    @return: The same module
+    """
+    import torch
+
+    forward = module.forward
+
+    @functools.wraps(forward)
+    def autocast_wrapper(*args, **kwargs):
+        with torch.autocast("cpu", dtype=dtype):
+            return forward(*args, **kwargs).float()
+
+    module.forward = autocast_wrapper
+    return module
@@ -0,0 +1,161 @@
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def polyphase_filter(
+    src_sr: int, dst_sr: int, half_width: int = 16, rolloff: float = 0.9, beta: float = 8.0
+) -> Tuple[int, int, int, np.ndarray]:
+    """
+    @function polyphase_filter
+    @description Designs the anti-aliasing low-pass filter for a (src, dst) rate pair and splits
+    it into its polyphase components. The design is cached so it is paid once per rate pair
+    instead of once per chunk.
+    @param src_sr: Source sampling rate
+    @param dst_sr: Target sampling rate
+    @param half_width: Zero crossings of the windowed sinc kept on each side
+    @param rolloff: Cutoff as a fraction of the lower of the two Nyquist frequencies
+    @param beta: Kaiser window shape parameter
+    @return: (up, down, delay, phases) where phases[p, j] is the tap applied to the j-th most
+    recent input sample for output phase p, and delay is the filter group delay in
+    upsampled samples
+    """
+    divisor = gcd(src_sr, dst_sr)
+    up, down = dst_sr // divisor, src_sr // divisor
+
+    # Filter runs at the virtual rate src_sr * up; cutoff is relative to its Nyquist
+    cutoff = rolloff / max(up, down)
+    delay = half_width * max(up, down)
+    n = np.arange(2 * delay + 1) - delay
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * delay + 1, beta)
+    # Zero stuffing divides the signal by up, the filter gain restores it
+    taps *= up / taps.sum()
+
+    taps_per_phase = -(-len(taps) // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[: len(taps)] = taps
+    phases = padded.reshape(taps_per_phase, up).T.copy()
+    return up, down, delay, phases
+
+
+class StreamingResampler:
+    """
+    @class StreamingResampler
+    @description Stateful polyphase resampler for streaming audio. It keeps the tail of the
+    previous chunks, so consecutive chunks are filtered as one continuous signal without edge
+    artifacts at chunk boundaries, and the cached filter of its rate pair. Output sample n is
+    aligned with input time n / dst_sr; it is emitted once all the input it depends on has
+    arrived, and flush() emits the remainder at the end of the stream.
+    """
+
+    def __init__(self, src_sr: int, dst_sr: int = 16_000):
+        """
+        @function __init__
+        @param src_sr: Sampling rate of the incoming audio (e.g. 8000, 44100, 48000)
+        @param dst_sr: Sampling rate of the produced audio
+        """
+        self.src_sr = src_sr
+        self.dst_sr = dst_sr
+        self.passthrough = src_sr == dst_sr
+
+        if not self.passthrough:
+            self.up, self.down, self.delay, self.phases = polyphase_filter(src_sr, dst_sr)
+            self._history = self.phases.shape[1] - 1
+            self.reset()
+
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def reset(self):
+        """
+        @function reset
+        @description Forgets the filter state, starting a new stream.
+        """
+        if self.passthrough:
+            return
+        # Leading zeros stand in for the audio before the start of the stream
+        self._buffer = np.zeros(self._history, dtype=np.float64)
+        self._offset = -self._history
+        self._next_output = 0
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """
+        @function process
+        @description Resamples the next chunk of the stream.
+        @param audio: 1-D float audio chunk at src_sr
+        @return: float32 audio at dst_sr
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        self.samples_in += len(audio)
+        if self.passthrough:
+            self.samples_out += len(audio)
+            return audio
+
+        self._buffer = np.concatenate([self._buffer, audio])
+        return self._emit(self._offset + len(self._buffer))
+
+    def flush(self) -> np.ndarray:
+        """
+        @function flush
+        @description Emits the samples still held back by the filter delay, padding the end of
+        the stream with silence, and resets the state for a new stream.
+        """
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+
+        expected = -(-self.samples_in * self.up // self.down)
+        missing = expected - self._next_output
+        if missing <= 0:
+            self.reset()
+            return np.zeros(0, dtype=np.float32)
+
+        available = self._offset + len(self._buffer)
+        needed = ((expected - 1) * self.down + self.delay) // self.up + 1
+        if needed > available:
+            self._buffer = np.concatenate([self._buffer, np.zeros(needed - available)])
+        out = self._emit(self._offset + len(self._buffer), limit=expected)
+        self.reset()
+        return out
+
+    def _emit(self, available: int, limit: int = None) -> np.ndarray:
+        # Output n needs inputs up to (n * down + delay) // up
+        last = (available * self.up - 1 - self.delay) // self.down
+        if limit is not None:
+            last = min(last, limit - 1)
+        if last < self._next_output:
+            return np.zeros(0, dtype=np.float32)
+
+        n = np.arange(self._next_output, last + 1)
+        t = n * self.down + self.delay
+        newest = t // self.up - self._offset
+        index = newest[:, None] - np.arange(self.phases.shape[1])[None, :]
+        out = np.einsum("ij,ij->i", self._buffer[index], self.phases[t % self.up])
+
+        self._next_output = last + 1
+        self.samples_out += len(out)
+
+        # Keep only the history needed by the next output sample
+        next_newest = (self._next_output * self.down + self.delay) // self.up
+        keep_from = next_newest - self._history - self._offset
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._offset += keep_from
+        return out.astype(np.float32)
+
+
+def resample(audio: np.ndarray, src_sr: int, dst_sr: int = 16_000) -> np.ndarray:
+    """
+    @function resample
+    @description Resamples a complete signal in one call, using the same cached filters as
+    the streaming resampler.
+    @param audio: 1-D float audio at src_sr
+    @param src_sr: Source sampling rate
+    @param dst_sr: Target sampling rate
+    """
+    resampler = StreamingResampler(src_sr, dst_sr)
+    return np.concatenate([resampler.process(audio), resampler.flush()])
@@ -28,6 +28,27 @@ setup(
         "example_api_usage",
         "utils",
         "logger",
+        "inference",
+        "audio_buffer",
+        "resampler",
+        "streaming_vad",
+        "local_agreement",
+        "audio_queue",
+        "audio_codecs",
+        "metrics",
+        "worker_pool",
+        "warmup",
+        "model_registry",
+        "precision",
+        "backends",
+        "snapshots",
+        "speculative",
+        "long_form",
+        "audio_store",
+        "parallel_transcribe",
+        "srt_writer",
+        "srt_pipeline",
+        "checkpoint",
     ],
     classifiers=[
         "Development Status :: 4 - Beta",
@@ -58,6 +79,8 @@ setup(
     ],
     extras_require={
         "microphone": ["pyaudio"],
+        "opus": ["opuslib"],
+        "ctranslate2": ["faster-whisper>=1.0.0"],
         "dev": ["pytest>=7.0.0", "black>=22.0.0", "flake8>=4.0.0"],
     },
     entry_points={
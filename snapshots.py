@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import struct
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+from logger import logger
+
+if TYPE_CHECKING:
+    import torch
+    from torch import nn
+
+# Snapshots hold the weights of a model in one safetensors file, memory-mapped on load so
+# worker processes share the pages of the file. Create one where the hub is reachable with
+#   python snapshots.py --model-id <model> --backend <backend> --snapshot-dir <dir>
+# and the servers given --snapshot-dir (or this variable) load models from it without hub calls.
+SNAPSHOT_DIR_ENV = "MODEL_SNAPSHOT_DIR"
+
+WEIGHTS_NAME = "model.safetensors"
+
+# Backends that can load a snapshot, and the format of the snapshot they load
+SNAPSHOT_BACKENDS = ("transformers", "whisper_timestamped")
+
+_SAFETENSORS_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def snapshot_path(model_id: str, backend: str, snapshot_dir: str) -> str:
+    """
+    @function snapshot_path
+    @description Directory holding the snapshot of a model for a backend.
+    @param model_id: Model identifier
+    @param backend: Backend name, one of SNAPSHOT_BACKENDS
+    @param snapshot_dir: Root directory of the snapshots
+    """
+    return os.path.join(snapshot_dir, model_id.replace("/", "--"), backend)
+
+
+def find_snapshot(model_id: str, backend: str) -> Optional[str]:
+    """
+    @function find_snapshot
+    @description Snapshot to load a model from: model_id itself when it is a snapshot
+    directory, otherwise its snapshot in MODEL_SNAPSHOT_DIR.
+    @param model_id: Model identifier
+    @param backend: Backend name
+    @return: Snapshot directory, None when snapshots are not configured
+    @raises FileNotFoundError: Snapshots are configured but this model has none, so loading it
+    would need the hub
+    """
+    if os.path.isfile(os.path.join(model_id, WEIGHTS_NAME)):
+        return model_id
+    snapshot_dir = os.environ.get(SNAPSHOT_DIR_ENV)
+    if not snapshot_dir:
+        return None
+    path = snapshot_path(model_id, backend, snapshot_dir)
+    if not os.path.isfile(os.path.join(path, WEIGHTS_NAME)):
+        raise FileNotFoundError(
+            f"No snapshot of {model_id} for the {backend} backend in {snapshot_dir}, create it "
+            f"with: python snapshots.py --model-id {model_id} --backend {backend} "
+            f"--snapshot-dir {snapshot_dir}"
+        )
+    return path
+
+
+def save_weights(module: "nn.Module", path: str, metadata: dict = None):
+    """
+    @function save_weights
+    @description Writes the state dict of a module to a safetensors file. Tied weights are
+    stored once.
+    @param module: Module to save
+    @param path: File to write
+    @param metadata: String values stored in the file header
+    """
+    from safetensors.torch import save_model
+
+    save_model(module, path, metadata=metadata)
+
+
+def load_weights(path: str) -> tuple[dict, dict]:
+    """
+    @function load_weights
+    @description Maps a safetensors file into memory and returns its tensors without reading
+    them. The mapping is private: the pages stay in the page cache, shared by every process
+    mapping the file, and are only copied by a process writing to them.
+    @param path: safetensors file
+    @return: Tensors by name, and the metadata of the file header
+    """
+    import torch
+
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    metadata = header.pop("__metadata__", None) or {}
+
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        raw = data[8 + header_size + start : 8 + header_size + end]
+        if raw.storage_offset() % dtype.itemsize:
+            # Views must be aligned to the element size, copy the rare tensors that are not
+            raw = raw.clone()
+        tensors[name] = raw.view(dtype).reshape(info["shape"])
+    return tensors, metadata
+
+
+@contextmanager
+def _meta_parameters():
+    # Parameters are created on the meta device, so building a model allocates no weights.
+    # Buffers are kept, some are not saved in state dicts and must be computed. Random
+    # initialization is skipped, on meta tensors it costs seconds of imports the first time.
+    from torch import nn
+
+    register_parameter = nn.Module.register_parameter
+    init_functions = {
+        name: getattr(nn.init, name)
+        for name in dir(nn.init)
+        if name.endswith("_") and not name.startswith("_")
+    }
+
+    def register_on_meta(module, name, param):
+        if param is not None:
+            param = nn.Parameter(param.to("meta"), requires_grad=param.requires_grad)
+        register_parameter(module, name, param)
+
+    def skip_init(tensor, *args, **kwargs):
+        return tensor
+
+    nn.Module.register_parameter = register_on_meta
+    for name in init_functions:
+        setattr(nn.init, name, skip_init)
+    try:
+        yield
+    finally:
+        nn.Module.register_parameter = register_parameter
+        for name, function in init_functions.items():
+            setattr(nn.init, name, function)
+
+
+def _assign_weights(model: "nn.Module", tensors: dict, tie_weights=None) -> "nn.Module":
+    # The parameters become the mapped tensors themselves, nothing is copied
+    model.load_state_dict(tensors, strict=False, assign=True)
+    if tie_weights is not None:
+        tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise ValueError(f"Snapshot is missing {len(missing)} weight(s): {', '.join(missing[:5])}")
+    return model.eval()
+
+
+def save_transformers_snapshot(model, path: str, processor=None):
+    """
+    @function save_transformers_snapshot
+    @description Writes a transformers model, its configs and its processor to a snapshot
+    directory, which from_pretrained can also read.
+    @param model: Model to save
+    @param path: Snapshot directory
+    @param processor: Processor saved with the model
+    """
+    os.makedirs(path, exist_ok=True)
+    model.config.save_pretrained(path)
+    model.generation_config.save_pretrained(path)
+    if processor is not None:
+        processor.save_pretrained(path)
+    save_weights(model, os.path.join(path, WEIGHTS_NAME), metadata={"format": "pt"})
+
+
+def load_transformers_model(path: str, torch_dtype: "torch.dtype" = None):
+    """
+    @function load_transformers_model
+    @description Loads a speech-to-text transformers model from a snapshot with its weights
+    memory-mapped. Weights stored in another dtype than torch_dtype are converted, which
+    gives the process its own copy.
+    @param path: Snapshot directory
+    @param torch_dtype: Dtype of the weights, defaults to the stored dtype
+    """
+    from transformers import AutoConfig, AutoModelForSpeechSeq2Seq, GenerationConfig
+
+    config = AutoConfig.from_pretrained(path, local_files_only=True)
+    tensors, _ = load_weights(os.path.join(path, WEIGHTS_NAME))
+    with _meta_parameters():
+        model = AutoModelForSpeechSeq2Seq.from_config(config)
+    model = _assign_weights(model, tensors, model.tie_weights)
+    if os.path.isfile(os.path.join(path, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(path, local_files_only=True)
+    if torch_dtype is not None and model.dtype != torch_dtype:
+        model.to(torch_dtype)
+    return model
+
+
+def save_whisper_snapshot(model, path: str):
+    """
+    @function save_whisper_snapshot
+    @description Writes an openai-whisper model to a snapshot directory. The model dimensions
+    and alignment heads are stored in the file header.
+    @param model: whisper.model.Whisper
+    @param path: Snapshot directory
+    """
+    os.makedirs(path, exist_ok=True)
+    heads = model.alignment_heads.to_dense().nonzero().tolist()
+    metadata = {
+        "format": "pt",
+        "dims": json.dumps(vars(model.dims)),
+        "alignment_heads": json.dumps(heads),
+    }
+    save_weights(model, os.path.join(path, WEIGHTS_NAME), metadata=metadata)
+
+
+def load_whisper_model(path: str):
+    """
+    @function load_whisper_model
+    @description Loads an openai-whisper model from a snapshot with its weights
+    memory-mapped, on CPU.
+    @param path: Snapshot directory
+    """
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    tensors, metadata = load_weights(os.path.join(path, WEIGHTS_NAME))
+    dims = ModelDimensions(**json.loads(metadata["dims"]))
+    with _meta_parameters():
+        model = Whisper(dims)
+    model = _assign_weights(model, tensors)
+
+    heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    for layer, head in json.loads(metadata["alignment_heads"]):
+        heads[layer, head] = True
+    model.register_buffer("alignment_heads", heads.to_sparse(), persistent=False)
+    return model
+
+
+def export_snapshot(model_id: str, backend: str, snapshot_dir: str) -> str:
+    """
+    @function export_snapshot
+    @description Downloads a model and writes its snapshot for a backend, in float32.
+    @param model_id: Model to export
+    @param backend: Backend name, one of SNAPSHOT_BACKENDS
+    @param snapshot_dir: Root directory of the snapshots
+    @return: Snapshot directory
+    """
+    import torch
+
+    path = snapshot_path(model_id, backend, snapshot_dir)
+    if backend == "transformers":
+        from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
+
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_id, torch_dtype=torch.float32, use_safetensors=True
+        )
+        save_transformers_snapshot(model, path, AutoProcessor.from_pretrained(model_id))
+    elif backend == "whisper_timestamped":
+        import whisper_timestamped as whisper
+
+        save_whisper_snapshot(whisper.load_model(model_id, device="cpu").float(), path)
+    else:
+        raise ValueError(
+            f"Backend '{backend}' has no snapshot format, expected one of: "
+            f"{', '.join(SNAPSHOT_BACKENDS)}"
+        )
+    logger.info("Saved snapshot of %s for %s to %s", model_id, backend, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a local model snapshot")
+    parser.add_argument(
+        "--model-id", default="Oriserve/Whisper-Hindi2Hinglish-Swift", help="Model to export"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=SNAPSHOT_BACKENDS,
+        default="transformers",
+        help="Backend the snapshot is loaded by",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.environ.get(SNAPSHOT_DIR_ENV),
+        required=not os.environ.get(SNAPSHOT_DIR_ENV),
+        help=f"Root directory of the snapshots (default: ${SNAPSHOT_DIR_ENV})",
+    )
+    args = parser.parse_args()
+    export_snapshot(args.model_id, args.backend, args.snapshot_dir)
@@ -0,0 +1,148 @@
+import functools
+from typing import TYPE_CHECKING, Optional
+
+from logger import logger
+
+if TYPE_CHECKING:
+    import torch
+    from torch import nn
+
+SWIFT_MODEL_ID = "Oriserve/Whisper-Hindi2Hinglish-Swift"
+PRIME_MODEL_ID = "Oriserve/Whisper-Hindi2Hinglish-Prime"
+
+# Model ids decoded with speculative decoding, as (model, assistant drafting its tokens). The
+# model verifies every drafted token, so transcripts are those of the model alone.
+ASSISTED_MODELS = {
+    "prime-fast": (PRIME_MODEL_ID, SWIFT_MODEL_ID),
+}
+
+
+def resolve_assisted_model(model_id: str) -> tuple[str, Optional[str]]:
+    """
+    @function resolve_assisted_model
+    @description Splits a model id into the model to load and its assistant model.
+    @param model_id: Model identifier, or a name from ASSISTED_MODELS
+    @return: (model_id, assistant model_id or None)
+    """
+    return ASSISTED_MODELS.get(model_id, (model_id, None))
+
+
+def mel_conversion(filters: "torch.Tensor", target_filters: "torch.Tensor") -> "torch.Tensor":
+    """
+    @function mel_conversion
+    @description Linear map from the mel power spectrum of one filter bank to another, through
+    the least-squares estimate of the power spectrum.
+    @param filters: Mel filters of the input features, (frequency bins, mels)
+    @param target_filters: Mel filters of the output features, (frequency bins, target mels)
+    @return: (mels, target mels) matrix
+    """
+    import torch
+
+    filters = torch.as_tensor(filters, dtype=torch.float64)
+    target_filters = torch.as_tensor(target_filters, dtype=torch.float64)
+    return (torch.linalg.pinv(filters) @ target_filters).float()
+
+
+def convert_log_mel(features: "torch.Tensor", conversion: "torch.Tensor") -> "torch.Tensor":
+    """
+    @function convert_log_mel
+    @description Converts whisper log-mel input features to another number of mel bins.
+    @param features: Normalized log-mel features, (batch, mels, frames)
+    @param conversion: Matrix returned by mel_conversion()
+    @return: Features with the target number of mel bins, in the input dtype
+    """
+    import torch
+
+    # Undo the whisper normalization, (log10(mel) + 4) / 4, in float32 for the small powers
+    mel = torch.pow(10.0, 4.0 * features.float() - 4.0)
+    mel = torch.einsum("bmt,mn->bnt", mel, conversion.to(mel.device))
+    log_mel = torch.clamp(mel, min=1e-10).log10()
+    # Same 80 dB dynamic range as the feature extractor
+    log_mel = torch.maximum(log_mel, log_mel.amax(dim=(1, 2), keepdim=True) - 8.0)
+    return ((log_mel + 4.0) / 4.0).to(features.dtype)
+
+
+def adapt_input_features(encoder: "nn.Module", conversion: "torch.Tensor") -> "nn.Module":
+    """
+    @function adapt_input_features
+    @description Makes an encoder accept the input features of a model with another number of
+    mel bins, so an assistant can run on the features computed for the main model.
+    @param encoder: Whisper encoder
+    @param conversion: Matrix returned by mel_conversion()
+    @return: The same encoder
+    """
+    forward = encoder.forward
+
+    @functools.wraps(forward)
+    def converting_forward(input_features, *args, **kwargs):
+        return forward(convert_log_mel(input_features, conversion), *args, **kwargs)
+
+    encoder.forward = converting_forward
+    return encoder
+
+
+def align_vocabulary(model, vocab: dict, target_vocab: dict):
+    """
+    @function align_vocabulary
+    @description Reorders the token embeddings of a model to the token ids of another
+    vocabulary, so it reads and predicts the ids of the main model. Whisper checkpoints share
+    the text tokens but number some special tokens differently (large-v3 added a language).
+    Tokens the model does not know get zero embeddings.
+    @param model: Whisper model with tied input and output embeddings
+    @param vocab: Token to id of the model
+    @param target_vocab: Token to id of the main model
+    @return: The same model
+    """
+    import torch
+    from torch import nn
+
+    index = torch.full((max(target_vocab.values()) + 1,), -1, dtype=torch.long)
+    for token, token_id in target_vocab.items():
+        index[token_id] = vocab.get(token, -1)
+    known = index >= 0
+
+    embeddings = model.get_input_embeddings().weight.detach()
+    weight = embeddings.new_zeros(len(index), embeddings.shape[1])
+    weight[known] = embeddings[index[known]]
+    embedding = nn.Embedding.from_pretrained(weight, freeze=True)
+    projection = nn.Linear(weight.shape[1], len(index), bias=False)
+    projection.weight = embedding.weight
+    model.set_input_embeddings(embedding)
+    model.set_output_embeddings(projection)
+    model.config.vocab_size = len(index)
+    logger.info(
+        "Aligned assistant vocabulary: %d token(s) renumbered, %d unknown",
+        int((index[known] != torch.arange(len(index))[known]).sum()),
+        int((~known).sum()),
+    )
+    return model
+
+
+def prepare_assistant(assistant, assistant_processor, processor):
+    """
+    @function prepare_assistant
+    @description Makes a whisper model usable as the assistant of another in transformers
+    assisted generation, which feeds the assistant the input features and token ids of the
+    main model: converts the features when the number of mel bins differs and renumbers the
+    vocabulary when the token ids differ.
+    @param assistant: Assistant model
+    @param assistant_processor: Processor of the assistant
+    @param processor: Processor of the main model
+    @return: The same assistant
+    """
+    extractor = processor.feature_extractor
+    assistant_extractor = assistant_processor.feature_extractor
+    if extractor.feature_size != assistant_extractor.feature_size:
+        logger.info(
+            "Converting %d-bin input features to the %d bins of the assistant",
+            extractor.feature_size,
+            assistant_extractor.feature_size,
+        )
+        conversion = mel_conversion(extractor.mel_filters, assistant_extractor.mel_filters)
+        adapt_input_features(assistant.get_encoder(), conversion)
+
+    vocab = assistant_processor.tokenizer.get_vocab()
+    target_vocab = processor.tokenizer.get_vocab()
+    if vocab != target_vocab:
+        align_vocabulary(assistant, vocab, target_vocab)
+    return assistant
@@ -0,0 +1,294 @@
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from audio_store import SAMPLE_RATE, ffmpeg_pcm_command
+from logger import logger
+from parallel_transcribe import UNIT_SECONDS, SpeechSegmenter, UnitPacker, unit_words
+from srt_writer import SrtWriter
+
+# Audio read from the ffmpeg pipe at a time
+BLOCK_SECONDS = 10
+# Uninterrupted speech is handed to the packer in regions of at most this length, which
+# bounds the audio held between the decoding and the transcription stages
+MAX_REGION_SECONDS = 120
+# Items each queue between two stages holds
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def threaded(iterable, maxsize: int = QUEUE_SIZE, name: str = None):
+    """
+    @function threaded
+    @description Runs a pipeline stage in its own thread. Items are handed over through a
+    bounded queue, so a stage runs ahead of the next one by at most maxsize items and then
+    waits. Exceptions of the stage are raised where its items are read; closing the returned
+    generator stops the stage and closes the iterable.
+    @param iterable: Stage, usually a generator reading the previous stage
+    @param maxsize: Items the queue holds
+    @param name: Name of the thread
+    @return: Generator of the items of iterable
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except Exception as error:
+            put(_StageError(error))
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def decode_blocks(
+    media_path: str, sample_rate: int = SAMPLE_RATE, block_seconds: float = BLOCK_SECONDS
+):
+    """
+    @function decode_blocks
+    @description Decodes the audio track of a video with ffmpeg, block after block as the
+    pipe delivers it.
+    @param media_path: Video or audio file
+    @param sample_rate: Sample rate to resample to
+    @param block_seconds: Length of a block, the last one can be shorter
+    @return: Generator of float32 blocks scaled like whisper.audio.load_audio
+    @raise RuntimeError: If ffmpeg fails to decode the file
+    """
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ffmpeg_pcm_command(media_path, "-", sample_rate),
+        stdout=subprocess.PIPE,
+        stderr=stderr,
+    )
+    block = np.empty(int(block_seconds * sample_rate), dtype=np.int16)
+    view = memoryview(block).cast("B")
+    try:
+        while True:
+            filled = 0
+            while filled < len(view):
+                read = process.stdout.readinto(view[filled:])
+                if not read:
+                    break
+                filled += read
+            if filled >= 2:
+                yield np.multiply(block[:filled // 2], 1 / 32768.0, dtype=np.float32)
+            if filled < len(view):
+                break
+        if process.wait() != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors="replace").strip()
+            raise RuntimeError(f"Failed to extract audio from video: {message}")
+    finally:
+        # Stopped early, e.g. by a failing later stage
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        stderr.close()
+
+
+class AudioWindow:
+    """
+    @class AudioWindow
+    @description The latest part of a stream of audio, sliced by sample offsets of the whole
+    stream like an AudioStore. Audio before the part still needed is trimmed, so memory stays
+    bounded however long the stream is.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        @function __init__
+        @param capacity: Most samples held, older ones are dropped
+        """
+        self.buffer = AudioBuffer(capacity)
+        self.start = 0
+
+    def __len__(self) -> int:
+        return self.start + len(self.buffer)
+
+    def append(self, samples: np.ndarray):
+        """
+        @function append
+        @description Adds the next samples of the stream.
+        """
+        dropped = self.buffer.dropped_samples
+        self.buffer.append(samples)
+        if self.buffer.dropped_samples > dropped:
+            logger.warning(
+                "Audio window full, dropped %d samples", self.buffer.dropped_samples - dropped
+            )
+            self.start += self.buffer.dropped_samples - dropped
+
+    def trim(self, start: int):
+        """
+        @function trim
+        @description Drops the samples before start, which are not read any more.
+        """
+        if start > self.start:
+            self.buffer.consume(start - self.start)
+            self.start = start
+
+    def __getitem__(self, index: slice) -> np.ndarray:
+        start, end, _ = index.indices(len(self))
+        return self.buffer.view()[max(start - self.start, 0):max(end - self.start, 0)]
+
+
+def speech_units(
+    blocks,
+    sample_rate: int = SAMPLE_RATE,
+    unit_seconds: float = UNIT_SECONDS,
+    block_seconds: float = BLOCK_SECONDS,
+):
+    """
+    @function speech_units
+    @description Finds the speech in streamed audio with webrtcvad and packs it into work
+    units like parallel_transcribe.pack_work_units(), each one handed on as soon as no later
+    speech can join it.
+    @param blocks: float32 audio blocks of at most block_seconds, in order
+    @param sample_rate: Sample rate of the audio
+    @param unit_seconds: Longest unit
+    @param block_seconds: Longest block
+    @return: Generator of (start sample, float32 audio) units
+    """
+    segmenter = SpeechSegmenter(sample_rate, max_region_seconds=MAX_REGION_SECONDS)
+    window = AudioWindow(
+        int((MAX_REGION_SECONDS + 2 * unit_seconds + block_seconds) * sample_rate)
+    )
+    packer = UnitPacker(window, unit_seconds, sample_rate)
+    for block in blocks:
+        window.append(block)
+        units = []
+        for region in segmenter.push(block):
+            units += packer.push(region)
+        units += packer.ready(segmenter.horizon)
+        for start, end in units:
+            yield start, window[start:end].copy()
+        earliest = segmenter.earliest_start
+        window.trim(min(packer.unit[0], earliest) if packer.unit else earliest)
+
+    units = []
+    for region in segmenter.flush():
+        units += packer.push(region)
+    for start, end in units + packer.flush():
+        yield start, window[start:end].copy()
+
+
+def transcribe_units(units, backend, sample_rate: int = SAMPLE_RATE, checkpoint=None):
+    """
+    @function transcribe_units
+    @description Transcribes work units with word timestamps, one after the other.
+    @param units: (start sample, float32 audio) units, as from speech_units()
+    @param backend: InferenceBackend to decode with
+    @param sample_rate: Sample rate of the audio
+    @param checkpoint: TranscriptionCheckpoint saving the words of every unit, units it holds
+    are not transcribed again
+    @return: Generator of the words of each unit, in seconds of the recording
+    """
+    for start, audio in units:
+        end = start + len(audio)
+        words = checkpoint.lookup(start, end, audio) if checkpoint is not None else None
+        if words is None:
+            words = unit_words(backend, audio, start, sample_rate)
+            if checkpoint is not None:
+                checkpoint.record(start, end, audio, words)
+        yield words
+
+
+def stream_srt(
+    media_path: str,
+    output_srt_path: str,
+    backend,
+    sample_rate: int = SAMPLE_RATE,
+    block_seconds: float = BLOCK_SECONDS,
+    checkpoint=None,
+) -> dict:
+    """
+    @function stream_srt
+    @description Transcribes a video to SRT in stages running at the same time: ffmpeg
+    decoding, VAD and unit packing, transcription and SRT writing, connected by bounded
+    queues. Cues are appended to the SRT file as soon as their unit is transcribed, so the
+    first subtitles are usable while the rest of the video is still being decoded, and
+    memory stays flat whatever the length of the video.
+    @param media_path: Video or audio file
+    @param output_srt_path: SRT file to write
+    @param backend: InferenceBackend to decode with
+    @param sample_rate: Sample rate to decode to
+    @param block_seconds: Audio read from ffmpeg at a time
+    @param checkpoint: TranscriptionCheckpoint saving the words of every unit, units it holds
+    are not transcribed again
+    @return: {"audio_seconds", "units", "cues", "first_cue_seconds"}, first_cue_seconds being
+    the wall-clock time until the first cue was written (None without cues)
+    """
+    started = time.perf_counter()
+    stats = {"audio_seconds": 0.0, "units": 0, "cues": 0, "first_cue_seconds": None}
+
+    def counted(blocks):
+        for block in blocks:
+            stats["audio_seconds"] += len(block) / sample_rate
+            yield block
+
+    blocks = threaded(
+        counted(decode_blocks(media_path, sample_rate, block_seconds)), name="srt-decode"
+    )
+    units = threaded(
+        speech_units(blocks, sample_rate, block_seconds=block_seconds), name="srt-vad"
+    )
+    words = threaded(
+        transcribe_units(units, backend, sample_rate, checkpoint), name="srt-transcribe"
+    )
+    try:
+        with SrtWriter(output_srt_path) as writer:
+            for new_words in words:
+                stats["units"] += 1
+                writer.add_words(new_words)
+                if writer.cues and stats["first_cue_seconds"] is None:
+                    stats["first_cue_seconds"] = time.perf_counter() - started
+                    logger.info(f"First cue written after {stats['first_cue_seconds']:.1f}s")
+                logger.info(
+                    f"Unit {stats['units']} transcribed, {writer.cues} cue(s) up to "
+                    f"{writer.end:.1f}s written"
+                )
+    finally:
+        words.close()
+    stats["cues"] = writer.cues
+    if writer.cues and stats["first_cue_seconds"] is None:
+        stats["first_cue_seconds"] = time.perf_counter() - started
+    return stats
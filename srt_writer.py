@@ -0,0 +1,229 @@
+from logger import logger
+
+
+def format_timestamp(seconds: float) -> str:
+    """
+    Convert seconds to SRT timestamp format (HH:MM:SS,mmm)
+
+    Args:
+        seconds: Time in seconds
+
+    Returns:
+        str: Formatted timestamp
+    """
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    millis = int((seconds % 1) * 1000)
+
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+
+def group_words_for_subtitles(
+    segments: list[dict],
+    max_words: int = 4,
+    max_chars: int = 42,
+    max_pause_gap: float = 0.5
+) -> list[tuple[str, float, float]]:
+    """
+    Group words from whisper-timestamped output into subtitle-friendly chunks.
+
+    Args:
+        segments: List of segments from whisper-timestamped with 'words' key
+        max_words: Maximum words per subtitle (default 4)
+        max_chars: Maximum characters per subtitle (default 42 - Netflix standard)
+        max_pause_gap: Maximum gap between words to keep in same subtitle (default 0.5s)
+
+    Returns:
+        List of tuples: (text, start_time, end_time)
+    """
+    all_words = []
+
+    # Extract all words from all segments
+    for segment in segments:
+        if 'words' in segment and segment['words']:
+            # Best case: segment has word-level timestamps
+            all_words.extend(segment['words'])
+        else:
+            # Fallback: Create synthetic word entry from segment-level data
+            logger.warning("Segment missing 'words' key, using segment-level fallback")
+            segment_text = segment.get('text', '').strip()
+            if segment_text:
+                # Create one "word" entry per segment as fallback
+                synthetic_word = {
+                    'text': segment_text,
+                    'start': segment.get('start', 0.0),
+                    'end': segment.get('end', 0.0)
+                }
+                all_words.append(synthetic_word)
+                logger.info(f"Created fallback word: '{segment_text[:30]}...' ({synthetic_word['start']:.2f}s - {synthetic_word['end']:.2f}s)")
+
+    if not all_words:
+        logger.error("No words found in any segment - transcription may have failed")
+        return []
+
+    subtitles = []
+    current_group = []
+    current_text = ""
+
+    for i, word_data in enumerate(all_words):
+        word = word_data.get('text', '').strip()
+        start = word_data.get('start')
+        end = word_data.get('end')
+
+        if not word or start is None or end is None:
+            # Log the issue
+            logger.debug(f"Word at index {i} has invalid data: text='{word}', start={start}, end={end}")
+
+            # Try to recover if word has text but missing timestamps
+            if word and current_group:
+                # Estimate timestamps based on previous word
+                last_word = current_group[-1]
+                estimated_start = last_word['end']
+                estimated_end = estimated_start + 0.5  # Conservative 0.5s duration
+
+                logger.debug(f"Estimated timestamps for '{word}': {estimated_start:.2f}s - {estimated_end:.2f}s")
+
+                # Create recovered word entry
+                word_data = {
+                    'text': word,
+                    'start': estimated_start,
+                    'end': estimated_end
+                }
+                # Don't continue, process this word with estimated timestamps
+                start = estimated_start
+                end = estimated_end
+            else:
+                # Can't recover, skip this word
+                continue
+
+        # Check if we should start a new group
+        should_break = False
+
+        if len(current_group) == 0:
+            # First word - start new group
+            should_break = False
+        elif len(current_group) >= max_words:
+            # Reached max words
+            should_break = True
+        elif len(current_text) + len(word) + 1 > max_chars:
+            # Would exceed character limit
+            should_break = True
+        else:
+            # Check pause gap
+            last_word = current_group[-1]
+            gap = start - last_word['end']
+            if gap > max_pause_gap:
+                # Long pause - break here
+                should_break = True
+
+        if should_break and current_group:
+            # Save current group
+            group_text = ' '.join(w['text'].strip() for w in current_group)
+            group_start = current_group[0]['start']
+            group_end = current_group[-1]['end']
+            subtitles.append((group_text, group_start, group_end))
+
+            # Reset
+            current_group = []
+            current_text = ""
+
+        # Add word to current group
+        current_group.append(word_data)
+        current_text = current_text + ' ' + word if current_text else word
+
+    # Don't forget last group
+    if current_group:
+        group_text = ' '.join(w['text'].strip() for w in current_group)
+        group_start = current_group[0]['start']
+        group_end = current_group[-1]['end']
+        subtitles.append((group_text, group_start, group_end))
+
+    logger.info(f"Grouped {len(all_words)} words into {len(subtitles)} subtitles")
+    return subtitles
+
+
+class SrtWriter:
+    """
+    @class SrtWriter
+    @description Writes SRT cues as words arrive, so the file is usable while a long video is
+    still being transcribed. Words are grouped like group_words_for_subtitles() groups a whole
+    transcript: grouping is greedy, so every cue but the last one is final and is appended
+    and flushed right away, numbered in order. The last cue waits for the next words, which
+    may still join it, or for close().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_words: int = 4,
+        max_chars: int = 42,
+        max_pause_gap: float = 0.5,
+    ):
+        """
+        @function __init__
+        @param path: SRT file to write, replaced if it exists
+        @param max_words: Maximum words per cue
+        @param max_chars: Maximum characters per cue
+        @param max_pause_gap: Longest pause inside a cue, in seconds
+        """
+        self.path = path
+        self.options = {
+            "max_words": max_words,
+            "max_chars": max_chars,
+            "max_pause_gap": max_pause_gap,
+        }
+        self.file = open(path, "w", encoding="utf-8")
+        self.cues = 0
+        self.end = 0.0
+        self._pending = []
+
+    def add_words(self, words: list[dict]) -> int:
+        """
+        @function add_words
+        @description Adds the next words of the transcript and writes the cues they complete.
+        @param words: Words with "text", "start" and "end" in seconds, in order
+        @return: Number of cues written
+        """
+        self._pending += words
+        return self._write(final=False)
+
+    def close(self) -> int:
+        """
+        @function close
+        @description Writes the last cue and closes the file.
+        @return: Number of cues written
+        """
+        written = self._write(final=True)
+        self.file.close()
+        return written
+
+    def _write(self, final: bool) -> int:
+        if not self._pending:
+            return 0
+        subtitles = group_words_for_subtitles([{"words": self._pending}], **self.options)
+        if not final:
+            # The last cue can still grow, its words wait for the next ones
+            tokens, kept = len(subtitles[-1][0].split()) if subtitles else 0, 0
+            while tokens > 0:
+                kept += 1
+                tokens -= len((self._pending[-kept].get("text") or "").split())
+            self._pending = self._pending[len(self._pending) - kept:]
+            subtitles = subtitles[:-1]
+        else:
+            self._pending = []
+        for text, start, end in subtitles:
+            self.cues += 1
+            self.file.write(f"{self.cues}\n")
+            self.file.write(f"{format_timestamp(start)} --> {format_timestamp(end)}\n")
+            self.file.write(f"{text}\n\n")
+            self.end = end
+        self.file.flush()
+        return len(subtitles)
+
+    def __enter__(self) -> "SrtWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.file.closed:
+            self.close()
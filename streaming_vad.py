@@ -0,0 +1,117 @@
+from collections import deque
+
+import numpy as np
+import webrtcvad
+
+VALID_FRAME_MS = (10, 20, 30)
+VALID_SAMPLE_RATES = (8000, 16000, 32000, 48000)
+
+
+class StreamingVad:
+    """
+    @class StreamingVad
+    @description Voice activity detection for streamed audio. webrtcvad only accepts 10, 20 or
+    30 ms frames, so incoming audio of any message size is re-framed into exact frames and the
+    remainder is carried over to the next call. Frame decisions are smoothed: speech starts
+    after onset_frames consecutive voiced frames and lasts until hangover_ms of unvoiced audio
+    has passed. Each session owns its own instance, as webrtcvad adapts its noise estimate
+    to the stream it sees.
+    """
+
+    def __init__(
+        self,
+        aggressiveness: int = 3,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        onset_frames: int = 2,
+        hangover_ms: int = 150,
+    ):
+        """
+        @function __init__
+        @param aggressiveness: webrtcvad aggressiveness, 0 (least) to 3 (most aggressive)
+        @param sample_rate: Sampling rate of the audio passed to process()
+        @param frame_ms: Frame length handed to webrtcvad, 10, 20 or 30 ms
+        @param onset_frames: Consecutive voiced frames needed before speech starts
+        @param hangover_ms: Unvoiced audio tolerated before speech ends
+        """
+        if frame_ms not in VALID_FRAME_MS:
+            raise ValueError(f"frame_ms must be one of {VALID_FRAME_MS}, got {frame_ms}")
+        if sample_rate not in VALID_SAMPLE_RATES:
+            raise ValueError(f"sample_rate must be one of {VALID_SAMPLE_RATES}, got {sample_rate}")
+
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.onset_frames = onset_frames
+        self.hangover_ms = hangover_ms
+
+        self._pending = bytearray()
+        self._recent = deque(maxlen=onset_frames)
+
+        self.triggered = False
+        self.window_has_speech = False
+        self.trailing_silence_ms = 0
+        self.speech_ms = 0
+        self.frames = 0
+
+    def process(self, audio: np.ndarray) -> bool:
+        """
+        @function process
+        @description Runs VAD over the complete frames available after appending audio.
+        @param audio: float32 audio in [-1, 1] at sample_rate
+        @return: True if speech is active after this chunk
+        """
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        self._pending += pcm.tobytes()
+
+        n_frames = len(self._pending) // self.frame_bytes
+        for i in range(n_frames):
+            frame = bytes(self._pending[i * self.frame_bytes:(i + 1) * self.frame_bytes])
+            self._update(self.vad.is_speech(frame, self.sample_rate))
+        del self._pending[:n_frames * self.frame_bytes]
+
+        return self.triggered
+
+    def _update(self, voiced: bool):
+        self.frames += 1
+        self._recent.append(voiced)
+
+        if voiced:
+            self.trailing_silence_ms = 0
+        else:
+            self.trailing_silence_ms += self.frame_ms
+
+        if not self.triggered:
+            if len(self._recent) == self.onset_frames and all(self._recent):
+                self.triggered = True
+                self.window_has_speech = True
+                # The onset frames were speech too
+                self.speech_ms += self.frame_ms * (self.onset_frames - 1)
+        elif self.trailing_silence_ms > self.hangover_ms:
+            self.triggered = False
+
+        if self.triggered:
+            self.speech_ms += self.frame_ms
+
+    def endpoint(self, silence_ms: int) -> bool:
+        """
+        @function endpoint
+        @description Whether the current window holds speech followed by enough silence to
+        end the utterance. Speech is never cut while the hangover still holds it active.
+        @param silence_ms: Trailing silence that ends an utterance
+        """
+        return (
+            self.window_has_speech
+            and not self.triggered
+            and self.trailing_silence_ms >= silence_ms
+        )
+
+    def reset_window(self):
+        """
+        @function reset_window
+        @description Starts a new window once the buffered audio was sent to the model. Speech
+        still in progress carries over to the new window.
+        """
+        self.window_has_speech = self.triggered
+        self.speech_ms = 0
@@ -0,0 +1,31 @@
+import os
+import stat
+import sys
+
+import pytest
+
+# Stands in for ffmpeg: writes the int16 samples stored in the input file to the output file
+# or to stdout, in pieces of odd sizes like a pipe delivers them, or fails like ffmpeg on a
+# broken file
+FAKE_FFMPEG = f"""#!{sys.executable}
+import sys
+path, output = sys.argv[sys.argv.index("-i") + 1], sys.argv[-1]
+try:
+    data = open(path, "rb").read()
+except OSError as e:
+    sys.stderr.write(f"{{path}}: {{e.strerror}}\\n")
+    sys.exit(1)
+out = sys.stdout.buffer if output == "-" else open(output, "wb")
+for i in range(0, len(data), 7777):
+    out.write(data[i:i + 7777])
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Puts FAKE_FFMPEG first on PATH, ffmpeg is not needed to run the tests"""
+    ffmpeg = tmp_path / "bin" / "ffmpeg"
+    ffmpeg.parent.mkdir()
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{ffmpeg.parent}{os.pathsep}{os.environ['PATH']}")
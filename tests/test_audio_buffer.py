@@ -0,0 +1,59 @@
+"""
+Tests for the preallocated streaming audio buffer
+"""
+import numpy as np
+
+from audio_buffer import AudioBuffer
+
+
+def test_append_and_view_are_float32():
+    """Appended chunks come back in order as one float32 view"""
+    buffer = AudioBuffer(1000)
+    buffer.append(np.arange(0, 160, dtype=np.int16))
+    buffer.append(np.arange(160, 320, dtype=np.float64))
+
+    view = buffer.view()
+
+    assert view.dtype == np.float32
+    assert np.array_equal(view, np.arange(320, dtype=np.float32))
+
+
+def test_view_is_zero_copy():
+    """view() shares memory with the arena instead of copying"""
+    buffer = AudioBuffer(1000)
+    buffer.append(np.ones(100, dtype=np.float32))
+
+    assert np.shares_memory(buffer.view(), buffer._data)
+
+
+def test_consume_and_compaction_keep_order():
+    """Dropping old audio and wrapping around the arena keeps samples contiguous"""
+    buffer = AudioBuffer(100)
+    buffer.append(np.arange(80, dtype=np.float32))
+    buffer.consume(60)
+    buffer.append(np.arange(80, 140, dtype=np.float32))
+
+    assert len(buffer) == 80
+    assert np.array_equal(buffer.view(), np.arange(60, 140, dtype=np.float32))
+
+
+def test_overflow_drops_oldest_samples():
+    """Audio beyond the capacity pushes out the oldest samples"""
+    buffer = AudioBuffer(100)
+    for start in range(0, 150, 10):
+        buffer.append(np.arange(start, start + 10, dtype=np.float32))
+
+    assert len(buffer) == 100
+    assert buffer.dropped_samples == 50
+    assert np.array_equal(buffer.view(), np.arange(50, 150, dtype=np.float32))
+
+
+def test_tracks_max_window():
+    """The largest buffered window survives clear()"""
+    buffer = AudioBuffer(1000)
+    buffer.append(np.zeros(300, dtype=np.float32))
+    buffer.clear()
+    buffer.append(np.zeros(100, dtype=np.float32))
+
+    assert len(buffer) == 100
+    assert buffer.max_window == 300
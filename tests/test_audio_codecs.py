@@ -0,0 +1,81 @@
+"""
+Tests for the websocket audio codec registry
+"""
+import numpy as np
+import pytest
+
+from audio_codecs import ALAW_TABLE, MULAW_TABLE, available_codecs, get_decoder
+
+
+def test_registry_resolves_encoding_names():
+    """Client encoding names map to decoders, case-insensitively"""
+    for name in ("linear16", "mulaw", "ulaw", "alaw", "opus"):
+        assert name in available_codecs()
+    assert type(get_decoder("MULAW", 8000)).__name__ == "MulawDecoder"
+
+    with pytest.raises(ValueError):
+        get_decoder("mp3", 16000)
+
+
+def test_linear16_keeps_odd_trailing_byte():
+    """A sample split across two messages is decoded once both halves arrived"""
+    decoder = get_decoder("linear16", 16000)
+    payload = np.array([1000, -2000, 3000], dtype="<i2").tobytes()
+
+    first = decoder.decode(payload[:3])
+    second = decoder.decode(payload[3:])
+
+    assert np.allclose(np.concatenate([first, second]) * 32768, [1000, -2000, 3000])
+
+
+def test_mulaw_table_matches_g711():
+    """Mu-law lookup table follows G.711: 0xFF/0x7F are silence, 0x00/0x80 the extremes"""
+    assert MULAW_TABLE[0xFF] == 0.0
+    assert MULAW_TABLE[0x7F] == 0.0
+    assert MULAW_TABLE[0x00] * 32768 == -32124
+    assert MULAW_TABLE[0x80] * 32768 == 32124
+    assert np.all(np.diff(MULAW_TABLE[0x80:0x100]) <= 0)
+
+
+def test_alaw_table_matches_g711():
+    """A-law lookup table follows G.711: 0xD5/0x55 are the smallest steps, 0xAA/0x2A the extremes"""
+    assert ALAW_TABLE[0xD5] * 32768 == 8
+    assert ALAW_TABLE[0x55] * 32768 == -8
+    assert ALAW_TABLE[0xAA] * 32768 == 32256
+    assert ALAW_TABLE[0x2A] * 32768 == -32256
+
+
+def test_lut_decoders_match_audioop():
+    """LUT decoding is bit-exact with the deprecated audioop module where it still exists"""
+    audioop = pytest.importorskip("audioop")
+    payload = bytes(range(256))
+
+    for encoding, expand in (("mulaw", audioop.ulaw2lin), ("alaw", audioop.alaw2lin)):
+        expected = np.frombuffer(expand(payload, 2), dtype=np.int16) / 32768.0
+        assert np.array_equal(get_decoder(encoding, 8000).decode(payload), expected)
+
+
+def test_stereo_is_downmixed():
+    """Interleaved channels are averaged to mono"""
+    decoder = get_decoder("linear16", 16000, channels=2)
+    payload = np.array([1000, 3000, -1000, -3000], dtype="<i2").tobytes()
+
+    assert np.allclose(decoder.decode(payload) * 32768, [2000, -2000])
+
+
+def test_opus_needs_local_decoder_or_roundtrips():
+    """Opus either decodes through libopus or fails with an install hint"""
+    try:
+        decoder = get_decoder("opus", 16000)
+    except ImportError as e:
+        assert "opuslib" in str(e)
+        return
+
+    import opuslib
+
+    encoder = opuslib.Encoder(16000, 1, opuslib.APPLICATION_VOIP)
+    frame = (np.sin(np.arange(320) / 5) * 10000).astype("<i2").tobytes()
+    samples = decoder.decode(encoder.encode(frame, 320))
+
+    assert len(samples) == 320
+    assert samples.dtype == np.float32
@@ -0,0 +1,76 @@
+"""
+Tests for the bounded per-session audio queue
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from audio_queue import AudioQueue, QueueOverflow
+
+
+def chunk(start, size=10):
+    return np.arange(start, start + size, dtype=np.float32)
+
+
+def drain(queue):
+    async def run():
+        items = []
+        while len(queue):
+            items.append(await queue.get())
+        return items
+
+    return asyncio.run(run())
+
+
+def test_drop_oldest_keeps_newest_audio():
+    """Beyond the bound the oldest chunks are dropped"""
+    queue = AudioQueue(max_samples=30, policy="drop_oldest")
+    for start in range(0, 50, 10):
+        queue.put(chunk(start))
+
+    items = drain(queue)
+
+    assert np.array_equal(np.concatenate(items), np.arange(20, 50, dtype=np.float32))
+    assert queue.dropped_samples == 20
+    assert queue.overflows == 2
+
+
+def test_coalesce_merges_backlog_into_one_chunk():
+    """Coalescing turns the backlog into a single chunk bounded in duration"""
+    queue = AudioQueue(max_samples=30, policy="coalesce")
+    for start in range(0, 45, 5):
+        queue.put(chunk(start, size=5))
+
+    items = drain(queue)
+
+    assert len(items) <= 2
+    assert np.array_equal(np.concatenate(items), np.arange(15, 45, dtype=np.float32))
+    assert queue.queued_samples == 0
+
+
+def test_close_policy_raises():
+    """The close policy reports the overflow instead of dropping audio"""
+    queue = AudioQueue(max_samples=15, policy="close")
+    queue.put(chunk(0))
+
+    with pytest.raises(QueueOverflow):
+        queue.put(chunk(10))
+
+
+def test_control_messages_are_never_dropped():
+    """EOF stays queued after the audio even when the queue overflows"""
+    queue = AudioQueue(max_samples=10, policy="drop_oldest")
+    queue.put(chunk(0))
+    queue.put_control("EOF")
+    queue.put(chunk(10))
+
+    items = drain(queue)
+
+    assert "EOF" in [item for item in items if isinstance(item, str)]
+
+
+def test_rejects_unknown_policy():
+    """Only the documented overflow policies are accepted"""
+    with pytest.raises(ValueError):
+        AudioQueue(max_samples=10, policy="block")
@@ -0,0 +1,47 @@
+"""
+Tests for the memory-mapped int16 audio store
+"""
+import os
+
+import numpy as np
+import pytest
+
+from audio_store import AUDIO_STORE_DIR_ENV, AudioStore
+from warmup import synthetic_audio
+
+
+def test_windows_match_the_audio(tmp_path):
+    """Slices and windows are float32 reads of the int16 samples"""
+    audio = synthetic_audio(3.0)
+    store = AudioStore.from_array(audio, str(tmp_path / "audio.s16le"))
+
+    assert len(store) == len(audio)
+    assert store.duration == 3.0
+    assert isinstance(store.samples, np.memmap)
+    window = store[16000:32000]
+    assert window.dtype == np.float32
+    np.testing.assert_allclose(window, audio[16000:32000], atol=1 / 32768)
+    assert len(store[-100:]) == 100
+    starts = [start for start, _ in store.iter_windows(1.25)]
+    assert starts == [0, 20000, 40000]
+    with pytest.raises(TypeError):
+        store[::2]
+
+
+def test_from_media_spools_and_removes_the_file(tmp_path, fake_ffmpeg, monkeypatch):
+    """ffmpeg decodes into AUDIO_STORE_DIR, the file is gone once the store is closed"""
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setenv(AUDIO_STORE_DIR_ENV, str(spool))
+    samples = np.arange(-5000, 5000, dtype=np.int16)
+    video = tmp_path / "video.mp4"
+    video.write_bytes(samples.tobytes())
+
+    with AudioStore.from_media(str(video)) as store:
+        assert os.listdir(spool) == [os.path.basename(store.path)]
+        np.testing.assert_array_equal(store[:], samples / 32768.0)
+
+    assert os.listdir(spool) == []
+    with pytest.raises(RuntimeError, match="missing.mp4"):
+        AudioStore.from_media(str(tmp_path / "missing.mp4"))
+    assert os.listdir(spool) == []
@@ -0,0 +1,244 @@
+"""
+Tests for the pluggable inference backends
+"""
+import asyncio
+import importlib.util
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+
+import backends
+from backends import (
+    CTranslate2Backend,
+    InferenceBackend,
+    TransformersBackend,
+    WhisperTimestampedBackend,
+    available_backends,
+    get_backend_class,
+    load_backend,
+    segments_from_words,
+)
+from inference import InferenceExecutor
+from local_agreement import words_from_output
+from model_registry import MODEL_REGISTRY
+
+
+class LengthBackend(InferenceBackend):
+    """Backend answering with the number of samples it was given"""
+
+    loads = 0
+
+    def __init__(self, model_id, device, torch_dtype):
+        super().__init__(model_id, device, torch_dtype)
+        LengthBackend.loads += 1
+
+    def transcribe_window(self, audio, word_timestamps=False):
+        output = {"text": str(len(audio))}
+        if word_timestamps:
+            output["chunks"] = [{"text": str(len(audio)), "timestamp": (0.0, 0.5)}]
+        return output
+
+
+def test_registered_backends():
+    """The three engines are selectable by name, unknown names are rejected"""
+    assert available_backends() == ["ctranslate2", "transformers", "whisper_timestamped"]
+    assert get_backend_class("whisper_timestamped") is WhisperTimestampedBackend
+    with pytest.raises(ValueError, match="Unknown backend"):
+        get_backend_class("onnx")
+
+
+def test_backend_is_callable_like_a_pipeline():
+    """The executor can call a backend with the pipeline keyword arguments"""
+    backend = LengthBackend("model", "cpu", torch.float32)
+
+    assert backend(np.zeros(100)) == {"text": "100"}
+    words = words_from_output(backend(np.zeros(100), return_timestamps="word"))
+    assert words == [{"text": "100", "start": 0.0, "end": 0.5}]
+    outputs = backend([np.zeros(10), np.zeros(20)], batch_size=2)
+    assert [output["text"] for output in outputs] == ["10", "20"]
+
+
+def test_load_backend_caches_per_key(monkeypatch):
+    """Backends are shared through the model registry; ignored dtypes share one copy"""
+    monkeypatch.setitem(backends._BACKENDS, "length", LengthBackend)
+    monkeypatch.setattr(
+        LengthBackend,
+        "registry_dtype",
+        classmethod(WhisperTimestampedBackend.registry_dtype.__func__),
+    )
+    LengthBackend.loads = 0
+
+    first = load_backend("length", "model", "cpu", torch.float32)
+    second = load_backend("length", "model", "cpu", torch.float16)
+    int8 = load_backend("length", "model", "cpu", torch.qint8)
+    try:
+        assert first is second
+        assert first.torch_dtype is None
+        assert int8 is not first
+        assert int8.torch_dtype == torch.qint8
+        assert LengthBackend.loads == 2
+    finally:
+        for backend in (first, second, int8):
+            MODEL_REGISTRY.release(backend)
+        MODEL_REGISTRY.evict("model")
+
+
+def test_load_pipe_returns_the_transformers_pipeline(monkeypatch):
+    """load_pipe() keeps working for callers of the pipeline, through the registry"""
+    from utils import load_pipe
+
+    class PipeBackend(LengthBackend):
+        def __init__(self, model_id, device, torch_dtype):
+            super().__init__(model_id, device, torch_dtype)
+            self.pipe = ("pipeline", model_id, torch_dtype)
+
+    monkeypatch.setitem(backends._BACKENDS, "transformers", PipeBackend)
+    try:
+        assert load_pipe("model", "cpu", "float16") == ("pipeline", "model", torch.float32)
+        assert load_pipe("model", "cpu", torch.float32) is load_pipe("model", "cpu")
+    finally:
+        MODEL_REGISTRY.evict("model")
+
+
+def test_segments_from_words_split_at_pauses():
+    """Long-form words are grouped into segments at pauses and at the duration limit"""
+    words = [
+        {"text": "ek", "start": 0.0, "end": 0.4},
+        {"text": "do", "start": 0.5, "end": 0.9},
+        {"text": "teen", "start": 3.0, "end": 3.4},
+        {"text": "char", "start": 3.5, "end": 40.0},
+    ]
+
+    segments = segments_from_words(words)
+
+    assert [s["text"] for s in segments] == ["ek do", "teen", "char"]
+    assert (segments[0]["start"], segments[0]["end"]) == (0.0, 0.9)
+    assert segments[1]["words"] == [words[2]]
+
+
+def test_whisper_timestamped_window_words():
+    """Word timestamps of whisper-timestamped are returned as pipeline chunks"""
+
+    class StubWhisper:
+        def transcribe(self, model, audio, **kwargs):
+            assert kwargs["vad"] is False
+            return {
+                "text": " namaste duniya",
+                "segments": [
+                    {
+                        "words": [
+                            {"text": "namaste", "start": 0.1, "end": 0.6, "confidence": 0.9},
+                            {"text": "duniya", "start": 0.7, "end": 1.2, "confidence": 0.8},
+                        ]
+                    }
+                ],
+            }
+
+    backend = WhisperTimestampedBackend.__new__(WhisperTimestampedBackend)
+    InferenceBackend.__init__(backend, "stub", "cpu", None)
+    backend.whisper = StubWhisper()
+    backend.model = None
+
+    output = backend(np.zeros(16000), return_timestamps="word")
+
+    assert output["text"] == " namaste duniya"
+    assert words_from_output(output) == [
+        {"text": "namaste", "start": 0.1, "end": 0.6},
+        {"text": "duniya", "start": 0.7, "end": 1.2},
+    ]
+
+
+def test_whisper_timestamped_calls_do_not_overlap(tmp_path):
+    """Threads sharing one model get their calls, and the hooks recording them, in turn"""
+    from whisper.model import ModelDimensions, Whisper
+
+    torch.manual_seed(0)
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=1500,
+        n_audio_state=16,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=51865,
+        n_text_ctx=448,
+        n_text_state=16,
+        n_text_head=2,
+        n_text_layer=1,
+    )
+    model = Whisper(dims)
+    checkpoint = str(tmp_path / "tiny.pt")
+    torch.save({"dims": dims.__dict__, "model_state_dict": model.state_dict()}, checkpoint)
+    backend = WhisperTimestampedBackend(checkpoint, "cpu", None)
+    # Every thread reaching the hooked layers, in order, like whisper-timestamped's own hooks
+    callers = []
+    for layer in (backend.model.encoder.conv1, backend.model.decoder.ln):
+        layer.register_forward_hook(lambda *args: callers.append(threading.get_ident()))
+    errors = []
+
+    def transcribe(seconds):
+        try:
+            backend.transcribe_window(np.zeros(int(seconds * 16000), dtype=np.float32), True)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=transcribe, args=(seconds,)) for seconds in (1.0, 2.0)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert set(callers) == {thread.ident for thread in threads}
+    # One run per call: the second call starts once the first one has finished
+    runs = [ident for i, ident in enumerate(callers) if i == 0 or ident != callers[i - 1]]
+    assert len(runs) == 2
+
+
+def test_transformers_calls_do_not_overlap():
+    """Inference workers sharing a pipeline run it one call at a time"""
+
+    class OverlapPipe:
+        model = None
+
+        def __init__(self):
+            self.running = 0
+            self.overlaps = 0
+
+        def __call__(self, audio, **kwargs):
+            self.running += 1
+            self.overlaps += self.running > 1
+            time.sleep(0.02)
+            self.running -= 1
+            return {"text": str(len(audio))}
+
+    backend = TransformersBackend.__new__(TransformersBackend)
+    InferenceBackend.__init__(backend, "stub", "cpu", None)
+    backend.pipe = OverlapPipe()
+    backend.assisted = False
+    executor = InferenceExecutor(backend, num_workers=4)
+
+    async def run():
+        return await asyncio.gather(
+            *(executor.transcribe(np.zeros(n)) for n in range(1, 9))
+        )
+
+    try:
+        outputs = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert [output["text"] for output in outputs] == [str(n) for n in range(1, 9)]
+    assert backend.pipe.overlaps == 0
+    assert not TransformersBackend.thread_safe and CTranslate2Backend.thread_safe
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("faster_whisper") is not None, reason="faster-whisper installed"
+)
+def test_ctranslate2_requires_faster_whisper():
+    """The optional runtime reports how to install it"""
+    with pytest.raises(ImportError, match="pip install faster-whisper"):
+        CTranslate2Backend("model", "cpu", torch.qint8)
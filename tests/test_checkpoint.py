@@ -0,0 +1,93 @@
+"""
+Tests for checkpointing long transcriptions and resuming them
+"""
+import numpy as np
+import pytest
+
+from audio_store import AudioStore
+from checkpoint import TranscriptionCheckpoint, checkpoint_path
+from long_form import transcribe_blocks
+from srt_pipeline import stream_srt
+from tests.test_long_form import BlockBackend
+from tests.test_parallel_transcribe import spaced_examples
+from tests.test_srt_pipeline import MarkBackend
+from warmup import synthetic_audio
+
+SETTINGS = {"model_id": "swift", "backend": "clock", "dtype": "float32", "mode": "blocks"}
+
+
+class CrashingBackend(BlockBackend):
+    """Dies like a preempted run after transcribing a number of blocks"""
+
+    def __init__(self, blocks):
+        super().__init__()
+        self.blocks = blocks
+
+    def transcribe_long_form(self, audio, vad=True):
+        if len(self.lengths) == self.blocks:
+            raise KeyboardInterrupt
+        return super().transcribe_long_form(audio, vad)
+
+
+def test_checkpoint_keeps_ranges_of_the_same_audio_and_settings(tmp_path):
+    """Completed ranges are reused only for the same audio, settings and --resume"""
+    path = str(tmp_path / "out.srt.checkpoint.jsonl")
+    audio = synthetic_audio(2.0)
+    checkpoint = TranscriptionCheckpoint(path, SETTINGS)
+    assert checkpoint.lookup(0, 16000, audio[:16000]) is None
+    checkpoint.record(0, 16000, audio[:16000], [{"text": "a", "start": np.float32(0.5)}])
+    checkpoint.record(16000, 32000, audio[16000:], [])
+    with open(path, "a") as f:
+        f.write('{"start": 32000, "end": 480')
+
+    resumed = TranscriptionCheckpoint(path, SETTINGS, resume=True)
+
+    assert resumed.lookup(0, 16000, audio[:16000]) == [{"text": "a", "start": 0.5}]
+    assert resumed.lookup(16000, 32000, audio[16000:]) == []
+    assert resumed.lookup(16000, 32000, audio[16000:] * 0.5) is None
+    assert TranscriptionCheckpoint(path, {**SETTINGS, "model_id": "prime"}, resume=True).ranges == {}
+    assert TranscriptionCheckpoint(path, SETTINGS).ranges == {}
+
+
+def test_transcribe_blocks_resumes_after_a_crash(tmp_path):
+    """A rerun transcribes only the blocks the crashed run did not finish"""
+    store = AudioStore.from_array(synthetic_audio(50.0), str(tmp_path / "audio.s16le"))
+    path = checkpoint_path(str(tmp_path / "out.srt"))
+    expected = transcribe_blocks(BlockBackend(), store, block_seconds=12)
+
+    crashed = CrashingBackend(2)
+    with pytest.raises(KeyboardInterrupt):
+        transcribe_blocks(
+            crashed, store, block_seconds=12,
+            checkpoint=TranscriptionCheckpoint(path, SETTINGS),
+        )
+    backend = BlockBackend()
+    checkpoint = TranscriptionCheckpoint(path, SETTINGS, resume=True)
+    result = transcribe_blocks(backend, store, block_seconds=12, checkpoint=checkpoint)
+
+    assert checkpoint.resumed == 2
+    assert sum(crashed.lengths) + sum(backend.lengths) == len(store)
+    assert result == expected
+    checkpoint.remove()
+    assert not (tmp_path / "out.srt.checkpoint.jsonl").exists()
+
+
+def test_stream_srt_resumes_units(tmp_path, fake_ffmpeg):
+    """A resumed streaming run writes the same SRT file without transcribing again"""
+    audio, _ = spaced_examples(2, silence_seconds=40.0)
+    video = tmp_path / "video.mp4"
+    video.write_bytes((audio * 32768).astype(np.int16).tobytes())
+    output = tmp_path / "video.srt"
+    settings = {**SETTINGS, "mode": "stream"}
+    stream_srt(
+        str(video), str(output), MarkBackend(),
+        checkpoint=TranscriptionCheckpoint(checkpoint_path(str(output)), settings),
+    )
+    first = output.read_text(encoding="utf-8")
+
+    backend = MarkBackend()
+    checkpoint = TranscriptionCheckpoint(checkpoint_path(str(output)), settings, resume=True)
+    stream_srt(str(video), str(output), backend, checkpoint=checkpoint)
+
+    assert backend.windows == [] and checkpoint.resumed == 2
+    assert output.read_text(encoding="utf-8") == first
@@ -0,0 +1,27 @@
+"""
+Tests for decoding the audio of a video from an ffmpeg pipe
+"""
+import numpy as np
+import pytest
+
+from srt_pipeline import decode_blocks
+
+
+def test_decode_blocks_delivers_every_sample(tmp_path, fake_ffmpeg):
+    """All samples arrive in full blocks, scaled like whisper.audio.load_audio"""
+    samples = np.random.default_rng(0).integers(-32768, 32767, 16000 * 5 + 123, dtype=np.int16)
+    video = tmp_path / "video.mp4"
+    video.write_bytes(samples.tobytes())
+
+    blocks = list(decode_blocks(str(video), block_seconds=1))
+
+    assert [len(block) for block in blocks] == [16000] * 5 + [123]
+    audio = np.concatenate(blocks)
+    assert audio.dtype == np.float32
+    np.testing.assert_array_equal(audio, samples.astype(np.float32) / 32768.0)
+
+
+def test_decode_blocks_reports_ffmpeg_errors(tmp_path, fake_ffmpeg):
+    """A file ffmpeg cannot decode raises with the ffmpeg message"""
+    with pytest.raises(RuntimeError, match="missing.mp4"):
+        list(decode_blocks(str(tmp_path / "missing.mp4")))
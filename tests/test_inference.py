@@ -0,0 +1,133 @@
+"""
+Tests for the websocket inference executor and batch scheduler
+"""
+import asyncio
+import time
+
+import numpy as np
+
+from inference import BatchScheduler, InferenceExecutor
+
+
+class SlowModel:
+    """Stand-in pipeline that sleeps like a real decode would"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+
+    def __call__(self, audio, **kwargs):
+        time.sleep(self.delay)
+        return {"text": f"{len(audio)} samples"}
+
+
+def test_executor_returns_model_output():
+    """Output of the pipeline is handed back to the awaiting coroutine"""
+    executor = InferenceExecutor(SlowModel(delay=0.0))
+
+    output = asyncio.run(executor.transcribe(np.zeros(1600, dtype=np.float32)))
+
+    assert output == {"text": "1600 samples"}
+    assert executor.in_flight == 0
+    executor.shutdown()
+
+
+def test_executor_keeps_event_loop_responsive():
+    """Event loop keeps running other tasks while a decode is in progress"""
+    executor = InferenceExecutor(SlowModel(delay=0.2))
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await executor.transcribe(np.zeros(16000, dtype=np.float32))
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+    executor.shutdown()
+
+
+def test_executor_reports_queue_depth():
+    """Jobs waiting behind a running decode are reported as queued"""
+    executor = InferenceExecutor(SlowModel(delay=0.1), num_workers=1)
+
+    async def run():
+        audio = np.zeros(160, dtype=np.float32)
+        jobs = [asyncio.create_task(executor.transcribe(audio)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        depth = executor.queue_depth
+        await asyncio.gather(*jobs)
+        return depth
+
+    assert asyncio.run(run()) == 2
+    assert executor.queue_depth == 0
+    executor.shutdown()
+
+
+class BatchModel:
+    """Stand-in pipeline recording the size of each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, audio, batch_size=None, **kwargs):
+        if isinstance(audio, list):
+            self.calls.append(len(audio))
+            return [{"text": f"{len(a)} samples"} for a in audio]
+        self.calls.append(1)
+        return {"text": f"{len(audio)} samples"}
+
+
+def test_scheduler_batches_concurrent_windows():
+    """Windows submitted together are decoded in one call and routed back in order"""
+    model = BatchModel()
+    scheduler = BatchScheduler(InferenceExecutor(model), max_batch_size=4, max_wait_ms=50)
+
+    async def run():
+        audios = [np.zeros(n, dtype=np.float32) for n in (100, 200, 300)]
+        return await asyncio.gather(*[scheduler.transcribe(a) for a in audios])
+
+    outputs = asyncio.run(run())
+
+    assert [o["text"] for o in outputs] == ["100 samples", "200 samples", "300 samples"]
+    assert model.calls == [3]
+    stats = scheduler.stats()
+    assert stats["batches"] == 1
+    assert stats["batch_size_histogram"] == {3: 1}
+    assert stats["max_wait_ms"] >= 40
+
+
+def test_scheduler_respects_max_batch_size():
+    """Batches never grow beyond max_batch_size"""
+    model = BatchModel()
+    scheduler = BatchScheduler(InferenceExecutor(model), max_batch_size=2, max_wait_ms=10)
+
+    async def run():
+        audios = [np.zeros(10, dtype=np.float32) for _ in range(5)]
+        return await asyncio.gather(*[scheduler.transcribe(a) for a in audios])
+
+    asyncio.run(run())
+
+    assert max(model.calls) <= 2
+    assert sum(model.calls) == 5
+    assert scheduler.stats()["windows"] == 5
+
+
+def test_scheduler_reports_window_timing():
+    """Timing of a window covers its batch wait and the inference of its batch"""
+    scheduler = BatchScheduler(
+        InferenceExecutor(SlowModel(delay=0.05)), max_batch_size=2, max_wait_ms=20
+    )
+    timing = {}
+
+    asyncio.run(scheduler.transcribe(np.zeros(160, dtype=np.float32), timing))
+
+    assert timing["queue_wait"] >= 0.015
+    assert timing["inference"] >= 0.045
+    assert timing["batch_size"] == 1
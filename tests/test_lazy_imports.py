@@ -0,0 +1,39 @@
+"""
+Tests that the entry points start without importing the inference engines
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_PACKAGES = ["torch", "transformers", "whisper", "whisper_timestamped"]
+
+
+@pytest.mark.parametrize("module", ["video_to_srt", "web_server", "websocket_server"])
+def test_entry_point_does_not_import_torch(module):
+    """Heavy dependencies are deferred until a model is loaded"""
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_PACKAGES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_web_server_startup_with_cuda_does_not_import_torch():
+    """The CUDA fallback is left to the first model load"""
+    code = (
+        "import runpy, sys, flask; "
+        "flask.Flask.run = lambda *args, **kwargs: None; "
+        "sys.argv = ['web_server.py', '--device', 'cuda', '--no-warmup']; "
+        "runpy.run_path('web_server.py', run_name='__main__'); "
+        f"print(','.join(m for m in {HEAVY_PACKAGES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
@@ -0,0 +1,70 @@
+"""
+Tests for stable-prefix commitment of streaming hypotheses
+"""
+from local_agreement import LocalAgreement, normalize_word, words_from_output
+
+
+def hypothesis(text, step=0.3):
+    return [
+        {"text": word, "start": i * step, "end": (i + 1) * step}
+        for i, word in enumerate(text.split())
+    ]
+
+
+def texts(words):
+    return [w["text"] for w in words]
+
+
+def test_commits_agreed_prefix_only():
+    """Only words two consecutive hypotheses agree on are committed"""
+    agreement = LocalAgreement()
+
+    assert agreement.update(hypothesis("main kal")) == []
+    committed = agreement.update(hypothesis("main kal office jaunga"))
+
+    assert texts(committed) == ["main", "kal"]
+    assert texts(agreement.pending) == ["office", "jaunga"]
+
+
+def test_disagreement_commits_nothing():
+    """A changed first word holds back the whole hypothesis"""
+    agreement = LocalAgreement()
+    agreement.update(hypothesis("mein kal"))
+
+    assert agreement.update(hypothesis("main kal office")) == []
+    assert texts(agreement.pending) == ["main", "kal", "office"]
+
+
+def test_agreement_ignores_case_and_punctuation():
+    """Hypotheses differing only in casing or punctuation agree"""
+    agreement = LocalAgreement()
+    agreement.update(hypothesis("Hello, world"))
+
+    assert texts(agreement.update(hypothesis("hello world."))) == ["hello", "world."]
+    assert normalize_word("Don't!") == "don't"
+
+
+def test_flush_commits_everything():
+    """End of utterance commits the final hypothesis and starts over"""
+    agreement = LocalAgreement()
+    agreement.update(hypothesis("theek hai"))
+
+    assert texts(agreement.flush(hypothesis("theek hai bhai"))) == ["theek", "hai", "bhai"]
+    assert agreement.pending == []
+    assert agreement.committed_words == 3
+
+
+def test_words_from_pipeline_output():
+    """Word chunks from the pipeline become timed words, filling missing timestamps"""
+    output = {
+        "text": " haan ji",
+        "chunks": [
+            {"text": " haan", "timestamp": (0.0, 0.4)},
+            {"text": " ji", "timestamp": (0.5, None)},
+        ],
+    }
+
+    assert words_from_output(output) == [
+        {"text": "haan", "start": 0.0, "end": 0.4},
+        {"text": "ji", "start": 0.5, "end": 0.5},
+    ]
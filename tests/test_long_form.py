@@ -0,0 +1,127 @@
+"""
+Tests for batched long-form transcription of overlapping chunks
+"""
+import numpy as np
+import pytest
+import torch
+
+from backends import InferenceBackend
+from audio_store import AudioStore
+from long_form import (
+    SAMPLE_RATE,
+    chunk_bounds,
+    merge_chunk_words,
+    transcribe_blocks,
+    transcribe_chunked,
+)
+from warmup import synthetic_audio
+
+
+class ClockBackend(InferenceBackend):
+    """Backend hearing one word per second of speech, named after its time in the recording"""
+
+    def __init__(self, audio, speech_seconds):
+        super().__init__("clock", "cpu", torch.float32)
+        self.audio = audio
+        self.speech_seconds = speech_seconds
+        self.batches = []
+
+    def transcribe_batch(self, audios, word_timestamps=False):
+        self.batches.append(len(audios))
+        outputs = []
+        for chunk in audios:
+            # Chunks are views of the recording, their address gives their offset
+            address = chunk.__array_interface__["data"][0]
+            first = (address - self.audio.__array_interface__["data"][0]) // chunk.itemsize
+            offset, end = first / SAMPLE_RATE, (first + len(chunk)) / SAMPLE_RATE
+            chunks = []
+            for second in range(int(np.ceil(offset)), min(int(end), self.speech_seconds)):
+                # Words cut off by a chunk edge inside the recording are misheard
+                cut = (offset > 0 and second < offset + 1) or (
+                    end < len(self.audio) / SAMPLE_RATE and second > end - 2
+                )
+                text = "cut" if cut else f"w{second}"
+                start = second - offset
+                chunks.append({"text": f" {text}", "timestamp": (start + 0.1, start + 0.9)})
+            outputs.append({"text": "", "chunks": chunks})
+        return outputs
+
+
+def test_chunk_bounds_cover_the_recording():
+    """Chunks overlap, the last one ends with the recording and has full length"""
+    bounds = chunk_bounds(70 * SAMPLE_RATE, chunk_seconds=30, overlap_seconds=5)
+
+    assert bounds == [(0, 30 * SAMPLE_RATE), (25 * SAMPLE_RATE, 55 * SAMPLE_RATE),
+                      (40 * SAMPLE_RATE, 70 * SAMPLE_RATE)]
+    assert chunk_bounds(10 * SAMPLE_RATE) == [(0, 10 * SAMPLE_RATE)]
+    with pytest.raises(ValueError):
+        chunk_bounds(70 * SAMPLE_RATE, chunk_seconds=30, overlap_seconds=30)
+
+
+def test_merge_cuts_overlaps_in_the_middle():
+    """Words are kept once, by the chunk owning their half of the overlap"""
+    bounds = [(0, 30 * SAMPLE_RATE), (25 * SAMPLE_RATE, 55 * SAMPLE_RATE)]
+    first = [{"text": "a", "start": 26.0, "end": 27.0}, {"text": "b", "start": 27.2, "end": 27.9}]
+    second = [
+        {"text": "a", "start": 1.0, "end": 2.0},
+        {"text": "b", "start": 2.2, "end": 2.9},
+        {"text": "c", "start": 4.0, "end": 5.0},
+    ]
+
+    words = merge_chunk_words([first, second], bounds)
+
+    assert [(w["text"], w["start"]) for w in words] == [("a", 26.0), ("b", 27.2), ("c", 29.0)]
+
+
+def test_transcribe_chunked_matches_the_recording():
+    """Batches of chunks give every word once, at its time in the recording"""
+    audio = synthetic_audio(100.0)
+    # Nothing is decoded in the silent last minute
+    audio = np.concatenate([audio, np.zeros(60 * SAMPLE_RATE, dtype=np.float32)])
+    backend = ClockBackend(audio, speech_seconds=100)
+
+    result = transcribe_chunked(backend, audio, batch_size=3)
+
+    words = [w for segment in result["segments"] for w in segment["words"]]
+    assert [w["text"] for w in words] == [f"w{second}" for second in range(100)]
+    assert all(abs(w["start"] - int(w["text"][1:]) - 0.1) < 1e-6 for w in words)
+    assert backend.batches == [3, 1]
+    assert result["text"].split() == [w["text"] for w in words]
+
+
+class BlockBackend(InferenceBackend):
+    """Backend giving one segment per block it is asked to transcribe"""
+
+    def __init__(self):
+        super().__init__("block", "cpu", torch.float32)
+        self.lengths = []
+
+    def transcribe_long_form(self, audio, vad=True):
+        self.lengths.append(len(audio))
+        seconds = len(audio) / SAMPLE_RATE
+        word = {"text": "block", "start": 0.5, "end": seconds - 0.5}
+        segment = {"id": 0, "start": 0.0, "end": seconds, "text": "block", "words": [word]}
+        return {"text": "block", "segments": [segment]}
+
+
+def test_transcribe_blocks_reads_the_store_block_by_block(tmp_path):
+    """Long recordings are decoded in blocks ending at a pause, with times shifted back"""
+    audio = synthetic_audio(50.0)
+    audio[int(17.3 * SAMPLE_RATE):int(17.6 * SAMPLE_RATE)] = 0
+    store = AudioStore.from_array(audio, str(tmp_path / "audio.s16le"))
+    backend = BlockBackend()
+
+    result = transcribe_blocks(backend, store, block_seconds=20)
+
+    assert backend.lengths[0] in range(int(17.3 * SAMPLE_RATE), int(17.5 * SAMPLE_RATE) + 1)
+    assert sum(backend.lengths) == len(audio)
+    assert all(length <= 20 * SAMPLE_RATE for length in backend.lengths)
+    segments = result["segments"]
+    assert [segment["id"] for segment in segments] == list(range(len(backend.lengths)))
+    assert segments[1]["start"] == backend.lengths[0] / SAMPLE_RATE
+    assert segments[1]["words"][0]["start"] == segments[1]["start"] + 0.5
+    assert segments[-1]["end"] == 50.0
+    # Short recordings are decoded whole
+    backend.lengths = []
+    transcribe_blocks(backend, store, block_seconds=60)
+    assert backend.lengths == [len(audio)]
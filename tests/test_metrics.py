@@ -0,0 +1,73 @@
+"""
+Tests for the websocket server metrics
+"""
+from metrics import Counter, Gauge, Histogram, SessionMetrics, StreamingMetrics
+
+
+def test_histogram_buckets_are_cumulative():
+    """Each bucket counts the observations up to and including its bound"""
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    lines = histogram.render()
+
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 2.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_counter_and_gauge_render_type_and_value():
+    """Counters accumulate, gauges can be computed at scrape time"""
+    counter = Counter("dropped_total", "Dropped chunks")
+    counter.inc()
+    counter.inc(2)
+    gauge = Gauge("sessions", "Live sessions", lambda: 3)
+
+    assert counter.render() == [
+        "# HELP dropped_total Dropped chunks",
+        "# TYPE dropped_total counter",
+        "dropped_total 3",
+    ]
+    assert gauge.render()[-1] == "sessions 3"
+
+
+def test_streaming_metrics_render_all_metrics():
+    """The exposition contains every server metric"""
+    metrics = StreamingMetrics(queue_depth=lambda: 2, active_sessions=lambda: 1)
+    metrics.window.observe(1.5)
+
+    text = metrics.render()
+
+    assert text.endswith("\n")
+    assert "ws_inference_queue_depth 2" in text
+    assert "ws_sessions_active 1" in text
+    assert "ws_window_seconds_count 1" in text
+    for name in (
+        "ws_queue_wait_seconds",
+        "ws_inference_seconds",
+        "ws_real_time_factor",
+        "ws_time_to_first_text_seconds",
+        "ws_dropped_chunks_total",
+    ):
+        assert f"# TYPE {name} " in text
+
+
+def test_session_metrics_summarise_windows():
+    """Window timings add up to the session real-time factor"""
+    stats = SessionMetrics()
+    assert stats.text_sent() is None
+
+    stats.audio_received()
+    timing = stats.window_decoded(2.0, {"queue_wait": 0.01, "inference": 0.5})
+    stats.window_decoded(1.0, {"queue_wait": 0.02, "inference": 0.25})
+
+    assert timing == {"window_ms": 2000.0, "queue_wait_ms": 10.0, "inference_ms": 500.0, "rtf": 0.25}
+    assert stats.text_sent() >= 0
+    assert stats.text_sent() is None
+    summary = stats.summary()
+    assert summary["windows"] == 2
+    assert summary["real_time_factor"] == 0.25
+    assert summary["max_window_seconds"] == 2.0
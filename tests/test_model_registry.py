@@ -0,0 +1,111 @@
+"""
+Tests for the process-wide model registry
+"""
+import threading
+import time
+
+import pytest
+import torch
+
+from model_registry import ModelRegistry, estimate_model_bytes
+
+
+class CountingLoader:
+    """Loader building small torch modules, counting its calls"""
+
+    def __init__(self, delay=0.0, features=256):
+        self.delay = delay
+        self.features = features
+        self.calls = []
+
+    def __call__(self, model_id, device, dtype):
+        self.calls.append(model_id)
+        time.sleep(self.delay)
+        return torch.nn.Linear(self.features, self.features, bias=False)
+
+
+def test_estimate_model_bytes_counts_parameters():
+    """Weights of a module or of the module wrapped by a pipeline are counted"""
+    module = torch.nn.Linear(10, 10, bias=False)
+
+    class Pipeline:
+        model = module
+
+    assert estimate_model_bytes(module) == 400
+    assert estimate_model_bytes(Pipeline()) == 400
+    assert estimate_model_bytes(object()) == 0
+
+
+def test_concurrent_acquires_share_one_load():
+    """Requests racing for the same model wait for a single load"""
+    registry = ModelRegistry()
+    loader = CountingLoader(delay=0.2)
+    models = []
+
+    def acquire():
+        models.append(registry.acquire("swift", "transformers", "cpu", None, loader))
+
+    threads = [threading.Thread(target=acquire) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == ["swift"]
+    assert all(model is models[0] for model in models)
+    assert registry.stats()["models"][0]["refs"] == 4
+    assert registry.hits == 3
+
+
+def test_idle_models_are_evicted_least_recently_used_first():
+    """Beyond the budget idle models are dropped, models in use are kept"""
+    loader = CountingLoader(features=256)
+    size = 256 * 256 * 4
+    registry = ModelRegistry(memory_budget=2 * size)
+
+    with registry.lease("swift", "transformers", "cpu", None, loader):
+        pass
+    prime = registry.acquire("prime", "transformers", "cpu", None, loader)
+    with registry.lease("swift", "transformers", "cpu", None, loader):
+        pass
+    # A third model goes over the budget: idle swift is evicted, leased prime is kept
+    registry.acquire("large", "transformers", "cpu", None, loader)
+
+    loaded = {m["model_id"] for m in registry.stats()["models"]}
+    assert loaded == {"prime", "large"}
+    assert registry.evictions == 1
+
+    registry.release(prime)
+    with registry.lease("swift", "transformers", "cpu", None, loader):
+        pass
+    assert loader.calls == ["swift", "prime", "large", "swift"]
+    assert "prime" not in {m["model_id"] for m in registry.stats()["models"]}
+
+
+def test_refresh_loads_new_copy_and_keeps_old_one_until_released():
+    """A refreshed model replaces the cached one, current holders keep theirs"""
+    registry = ModelRegistry()
+    loader = CountingLoader()
+
+    old = registry.acquire("swift", "transformers", "cpu", None, loader)
+    new = registry.acquire("swift", "transformers", "cpu", None, loader, refresh=True)
+
+    assert new is not old
+    assert len(registry.stats()["models"]) == 2
+    assert registry.release(old)
+    assert [m["refs"] for m in registry.stats()["models"]] == [1]
+    assert registry.acquire("swift", "transformers", "cpu", None, loader) is new
+
+
+def test_failed_load_is_reported_to_every_waiter():
+    """A loader error propagates and the next acquire retries the load"""
+    registry = ModelRegistry()
+
+    def broken(model_id, device, dtype):
+        raise OSError("no weights")
+
+    with pytest.raises(OSError):
+        registry.acquire("swift", "transformers", "cpu", None, broken)
+    assert registry.stats()["models"] == []
+    assert registry.acquire("swift", "transformers", "cpu", None, CountingLoader()) is not None
+    assert registry.release(object()) is False
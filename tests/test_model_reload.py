@@ -0,0 +1,90 @@
+"""
+Tests for hot model reload in the websocket server
+"""
+import asyncio
+
+import websocket_server
+
+
+class NamedModel:
+    """Stand-in pipeline answering with its model id"""
+
+    def __init__(self, model_id):
+        self.model_id = model_id
+
+    def __call__(self, audio, **kwargs):
+        return {"text": self.model_id}
+
+
+def make_server(monkeypatch, **kwargs):
+    monkeypatch.setattr(
+        websocket_server,
+        "load_backend",
+        lambda backend, model_id, device, dtype, **kwargs: NamedModel(model_id),
+    )
+    return websocket_server.Server(warmup=False, **kwargs)
+
+
+def test_retired_generation_is_released_after_its_sessions_end(monkeypatch):
+    """New sessions use the new model, the old one is freed once drained"""
+    server = make_server(monkeypatch)
+
+    async def run():
+        await server.load_model("swift", "cpu", None)
+        old = server.current
+        old.sessions = 1
+
+        assert await server.reload("prime")
+        assert server.current.model_id == "prime"
+        assert server.retired == [old]
+        assert old.model is not None
+
+        old.sessions = 0
+        server.release_drained()
+        return old
+
+    old = asyncio.run(run())
+    assert server.retired == []
+    assert old.model is None
+    assert server.health()["generation"] == 2
+
+
+def test_failed_reload_keeps_current_model(monkeypatch):
+    """A model that fails to load does not replace the serving one"""
+    server = make_server(monkeypatch)
+
+    def fail(backend, model_id, device, dtype, **kwargs):
+        raise OSError("missing weights")
+
+    async def run():
+        await server.load_model("swift", "cpu", None)
+        monkeypatch.setattr(websocket_server, "load_backend", fail)
+        return await server.reload("broken")
+
+    assert asyncio.run(run()) is False
+    assert server.current.model_id == "swift"
+    assert server.reloading is False
+
+
+def test_admin_reload_requires_token(monkeypatch):
+    """/admin/reload is disabled without a token and checks the bearer token"""
+    disabled = make_server(monkeypatch)
+    server = make_server(monkeypatch, admin_token="secret")
+
+    async def run():
+        await server.load_model("swift", "cpu", None)
+        statuses = [
+            (await disabled.process_request("/admin/reload", {}))[0],
+            (await server.process_request("/admin/reload", {"Authorization": "Bearer x"}))[0],
+            (
+                await server.process_request(
+                    "/admin/reload?model_id=prime", {"Authorization": "Bearer secret"}
+                )
+            )[0],
+        ]
+        while server.reloading or server.current.model_id != "prime":
+            await asyncio.sleep(0.01)
+        return statuses
+
+    assert asyncio.run(run()) == [404, 403, 202]
+    assert server.current.number == 2
@@ -0,0 +1,90 @@
+"""
+Tests for VAD-segmented transcription across worker processes
+"""
+import glob
+import os
+
+import librosa
+import numpy as np
+import torch
+from whisper.model import ModelDimensions, Whisper
+
+from audio_store import AudioStore
+from parallel_transcribe import SAMPLE_RATE, pack_work_units, speech_regions, transcribe_parallel
+
+EXAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "examples", "*.wav")))
+
+
+def spaced_examples(count: int, silence_seconds: float = 2.0):
+    """Example recordings separated by silence, with the sample range of each"""
+    parts, spans, position = [], [], 0
+    for path in EXAMPLES[:count]:
+        silence = np.zeros(int(silence_seconds * SAMPLE_RATE), dtype=np.float32)
+        speech = librosa.load(path, sr=SAMPLE_RATE)[0]
+        parts += [silence, speech]
+        spans.append((position + len(silence), position + len(silence) + len(speech)))
+        position += len(silence) + len(speech)
+    return np.concatenate(parts), spans
+
+
+def test_speech_regions_find_each_recording():
+    """Every recording is one region, the silence between them is left out"""
+    audio, spans = spaced_examples(3)
+
+    regions = speech_regions(audio)
+
+    assert len(regions) == len(spans)
+    for (start, end), (speech_start, speech_end) in zip(regions, spans):
+        assert speech_start - 0.4 * SAMPLE_RATE <= start and end <= speech_end + 0.4 * SAMPLE_RATE
+        assert end - start > (speech_end - speech_start) / 2
+
+
+def test_pack_work_units():
+    """Regions are packed up to the unit length, long regions are split at quiet frames"""
+    audio = np.full(100 * SAMPLE_RATE, 0.1, dtype=np.float32)
+    audio[int(70.2 * SAMPLE_RATE):int(70.3 * SAMPLE_RATE)] = 0
+    seconds = [(1, 5), (4.9, 12), (20, 28), (29, 40), (42, 90)]
+    regions = [(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)) for start, end in seconds]
+
+    units = pack_work_units(audio, regions, unit_seconds=30)
+
+    assert [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in units] == [
+        (1, 28), (29, 40), (42, 70.2), (70.2, 90)
+    ]
+
+
+def test_transcribe_parallel_shifts_words_to_the_recording(tmp_path):
+    """Workers load the model and transcribe units, words come back in recording time"""
+    torch.manual_seed(0)
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=1500,
+        n_audio_state=16,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=51865,
+        n_text_ctx=448,
+        n_text_state=16,
+        n_text_head=2,
+        n_text_layer=1,
+    )
+    model = Whisper(dims)
+    for parameter in model.parameters():
+        torch.nn.init.normal_(parameter, std=0.02)
+    checkpoint = str(tmp_path / "tiny.pt")
+    torch.save({"dims": dims.__dict__, "model_state_dict": model.state_dict()}, checkpoint)
+    audio, _ = spaced_examples(2, silence_seconds=40.0)
+    store = AudioStore.from_array(audio, str(tmp_path / "audio.s16le"))
+    units = pack_work_units(store, speech_regions(store))
+    assert len(units) == 2
+
+    result = transcribe_parallel(store, "whisper_timestamped", checkpoint, "cpu", workers=2)
+
+    words = [word for segment in result["segments"] for word in segment["words"]]
+    assert words
+    for word in words:
+        assert any(
+            start <= word["start"] * SAMPLE_RATE <= word["end"] * SAMPLE_RATE <= end + 1
+            for start, end in units
+        )
+    assert [word["start"] for word in words] == sorted(word["start"] for word in words)
@@ -0,0 +1,105 @@
+"""
+Tests for the reduced-precision CPU inference modes
+"""
+import asyncio
+
+import numpy as np
+import torch
+
+import precision
+from inference import InferenceExecutor
+from model_registry import estimate_model_bytes
+from precision import autocast_forward, quantize_int8, resolve_dtype, set_autocast
+from utils import torch_dtype_from_str
+
+
+class SubclassedLinear(torch.nn.Linear):
+    """Linear subclass as used by openai-whisper"""
+
+    def forward(self, x):
+        return torch.nn.functional.linear(x, self.weight.to(x.dtype), self.bias)
+
+
+def test_dtype_names():
+    """int8 and bfloat16 are accepted next to float16/float32"""
+    assert torch_dtype_from_str("int8", "cpu") == torch.qint8
+    assert torch_dtype_from_str("bfloat16", "cpu") == torch.bfloat16
+    assert torch_dtype_from_str("float16", "cpu") == torch.float16
+    assert torch_dtype_from_str("auto", "cpu") == torch.float32
+
+
+def test_resolve_dtype_falls_back_per_device(monkeypatch):
+    """Precisions a device cannot run are replaced by the closest one it can"""
+    assert resolve_dtype(torch.float16, "cpu") == torch.float32
+    assert resolve_dtype(torch.qint8, "cpu") == torch.qint8
+    assert resolve_dtype(torch.qint8, "cuda") == torch.float16
+    assert resolve_dtype(torch.bfloat16, "cuda") == torch.bfloat16
+
+    monkeypatch.setattr(precision, "cpu_supports_bf16", lambda: False)
+    assert resolve_dtype(torch.bfloat16, "cpu") == torch.float32
+    monkeypatch.setattr(precision, "cpu_supports_bf16", lambda: True)
+    assert resolve_dtype(torch.bfloat16, "cpu") == torch.bfloat16
+
+
+def test_quantize_int8_swaps_linear_layers():
+    """Linear layers, including subclasses, become dynamic int8 layers with close outputs"""
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(
+        torch.nn.Linear(64, 256), torch.nn.GELU(), SubclassedLinear(256, 64)
+    ).eval()
+    x = torch.randn(8, 64)
+    with torch.no_grad():
+        expected = model(x)
+    size = estimate_model_bytes(model)
+
+    quantized = quantize_int8(model)
+
+    dynamic = torch.ao.nn.quantized.dynamic.Linear
+    assert isinstance(quantized[0], dynamic)
+    assert isinstance(quantized[2], dynamic)
+    with torch.no_grad():
+        output = quantized(x)
+    assert torch.allclose(output, expected, atol=0.05)
+    # Packed int8 weights are counted, at about a quarter of the float32 size
+    assert 0 < estimate_model_bytes(quantized) < size / 2
+
+
+def test_autocast_forward_returns_float32():
+    """The wrapped module computes in bf16 and hands float32 back to its caller"""
+    seen = []
+    module = torch.nn.Sequential(torch.nn.Linear(16, 16))
+    module[0].register_forward_hook(lambda m, inputs, output: seen.append(output.dtype))
+    autocast_forward(module, torch.bfloat16)
+
+    output = module(torch.randn(2, 16))
+
+    assert seen == [torch.bfloat16]
+    assert output.dtype == torch.float32
+
+
+def test_executor_runs_autocast_pipelines_in_bf16():
+    """Autocast set on a pipeline is entered on the inference thread"""
+
+    class Pipeline:
+        def __init__(self):
+            self.linear = torch.nn.Linear(4, 4)
+
+        def __call__(self, audio, **kwargs):
+            return {"dtype": self.linear(torch.from_numpy(audio).view(-1, 4)).dtype}
+
+    audio = np.zeros(16, dtype=np.float32)
+    plain = Pipeline()
+    autocast = Pipeline()
+    set_autocast(autocast, torch.bfloat16)
+
+    async def run():
+        executor = InferenceExecutor(plain)
+        first = await executor.transcribe(audio)
+        executor.model = autocast
+        second = await executor.transcribe(audio)
+        executor.shutdown()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["dtype"] == torch.float32
+    assert second["dtype"] == torch.bfloat16
@@ -0,0 +1,63 @@
+"""
+Tests for the streaming polyphase resampler
+"""
+import numpy as np
+import pytest
+
+from resampler import StreamingResampler, polyphase_filter, resample
+
+
+def tone(sr, seconds=1.0, freq=440.0):
+    t = np.arange(int(sr * seconds)) / sr
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+@pytest.mark.parametrize("src_sr", [8000, 44100, 48000])
+def test_chunked_stream_matches_one_shot(src_sr):
+    """Resampling 10 ms chunks gives the same signal as resampling all at once"""
+    audio = tone(src_sr)
+    resampler = StreamingResampler(src_sr, 16000)
+    chunk = src_sr // 100
+
+    parts = [resampler.process(audio[i:i + chunk]) for i in range(0, len(audio), chunk)]
+    streamed = np.concatenate(parts + [resampler.flush()])
+
+    assert np.allclose(streamed, resample(audio, src_sr, 16000), atol=1e-6)
+
+
+@pytest.mark.parametrize("src_sr", [8000, 44100, 48000])
+def test_output_length_and_accuracy(src_sr):
+    """One second of audio becomes one second at 16 kHz and the tone is preserved"""
+    out = resample(tone(src_sr), src_sr, 16000)
+
+    assert len(out) == 16000
+    expected = tone(16000)
+    assert np.abs(out[200:-200] - expected[200:-200]).max() < 1e-2
+
+
+def test_sample_counts_track_real_time():
+    """Emitted samples follow the input duration, lagging only by the filter delay"""
+    resampler = StreamingResampler(48000, 16000)
+    for _ in range(100):
+        resampler.process(np.zeros(480, dtype=np.float32))
+
+    assert resampler.samples_in == 48000
+    assert 16000 - 100 <= resampler.samples_out <= 16000
+
+
+def test_filter_design_is_cached_per_rate_pair():
+    """The filter of a rate pair is designed once and shared"""
+    first = StreamingResampler(44100, 16000)
+    second = StreamingResampler(44100, 16000)
+
+    assert first.phases is second.phases
+    assert polyphase_filter.cache_info().hits >= 1
+
+
+def test_same_rate_is_passthrough():
+    """No filtering happens when the client already sends 16 kHz"""
+    audio = tone(16000)
+    resampler = StreamingResampler(16000, 16000)
+
+    assert np.array_equal(resampler.process(audio), audio)
+    assert len(resampler.flush()) == 0
@@ -0,0 +1,144 @@
+"""
+Tests for memory-mapped model snapshots and preloading before fork
+"""
+import gc
+import os
+
+import pytest
+import torch
+from transformers import WhisperConfig, WhisperForConditionalGeneration
+from whisper.model import ModelDimensions, Whisper
+
+import backends
+import snapshots
+from backends import InferenceBackend, load_backend, preload_backend
+from model_registry import MODEL_REGISTRY
+from worker_pool import WorkerPool
+
+FEATURES = torch.randn(1, 80, 3000)
+TOKENS = torch.tensor([[1, 2, 3]])
+
+
+def test_weights_are_mapped_from_the_file(tmp_path):
+    """Tensors are views of one private mapping of the file, metadata round trips"""
+    module = torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.LayerNorm(3))
+    module[1].weight.data = module[1].weight.data.half()
+    path = str(tmp_path / snapshots.WEIGHTS_NAME)
+    snapshots.save_weights(module, path, metadata={"dims": "[1, 2]"})
+
+    tensors, metadata = snapshots.load_weights(path)
+
+    assert metadata["dims"] == "[1, 2]"
+    assert set(tensors) == set(module.state_dict())
+    for name, tensor in module.state_dict().items():
+        assert torch.equal(tensors[name], tensor)
+        assert tensors[name].untyped_storage().nbytes() == os.path.getsize(path)
+
+
+def test_transformers_snapshot_round_trip(tmp_path):
+    """A snapshot loads the same model, in eval mode, with tied weights and no copy"""
+    config = WhisperConfig(
+        vocab_size=100,
+        d_model=16,
+        encoder_layers=1,
+        decoder_layers=1,
+        encoder_attention_heads=2,
+        decoder_attention_heads=2,
+        encoder_ffn_dim=32,
+        decoder_ffn_dim=32,
+        pad_token_id=0,
+        bos_token_id=1,
+        eos_token_id=2,
+        decoder_start_token_id=3,
+    )
+    model = WhisperForConditionalGeneration(config).eval()
+    snapshots.save_transformers_snapshot(model, str(tmp_path))
+
+    loaded = snapshots.load_transformers_model(str(tmp_path))
+
+    assert not loaded.training
+    assert loaded.proj_out.weight is loaded.model.decoder.embed_tokens.weight
+    with torch.no_grad():
+        expected = model(input_features=FEATURES, decoder_input_ids=TOKENS).logits
+        actual = loaded(input_features=FEATURES, decoder_input_ids=TOKENS).logits
+    torch.testing.assert_close(actual, expected)
+    assert snapshots.load_transformers_model(str(tmp_path), torch.bfloat16).dtype == torch.bfloat16
+
+
+def test_whisper_snapshot_round_trip(tmp_path):
+    """openai-whisper models keep their dimensions, alignment heads and attention mask"""
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=1500,
+        n_audio_state=16,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=100,
+        n_text_ctx=8,
+        n_text_state=16,
+        n_text_head=2,
+        n_text_layer=2,
+    )
+    model = Whisper(dims).eval()
+    # Left uninitialized by openai-whisper, checkpoints always set it
+    torch.nn.init.normal_(model.decoder.positional_embedding)
+    model.alignment_heads = torch.tensor([[True, False], [False, True]]).to_sparse()
+    snapshots.save_whisper_snapshot(model, str(tmp_path))
+
+    loaded = snapshots.load_whisper_model(str(tmp_path))
+
+    assert loaded.dims == dims
+    assert torch.equal(loaded.alignment_heads.to_dense(), model.alignment_heads.to_dense())
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(FEATURES, TOKENS), model(FEATURES, TOKENS))
+
+
+def test_find_snapshot(tmp_path, monkeypatch):
+    """Configured snapshots never fall back to the hub"""
+    monkeypatch.delenv(snapshots.SNAPSHOT_DIR_ENV, raising=False)
+    assert snapshots.find_snapshot("org/model", "transformers") is None
+
+    monkeypatch.setenv(snapshots.SNAPSHOT_DIR_ENV, str(tmp_path))
+    with pytest.raises(FileNotFoundError, match="python snapshots.py --model-id org/model"):
+        snapshots.find_snapshot("org/model", "transformers")
+
+    path = snapshots.snapshot_path("org/model", "transformers", str(tmp_path))
+    os.makedirs(path)
+    open(os.path.join(path, snapshots.WEIGHTS_NAME), "wb").close()
+    assert snapshots.find_snapshot("org/model", "transformers") == path
+    assert snapshots.find_snapshot(path, "whisper_timestamped") == path
+
+
+def test_preloaded_backend_is_reused(monkeypatch):
+    """Workers forked after preload_backend() get the cached model without loading it"""
+
+    class CountingBackend(InferenceBackend):
+        loads = 0
+
+        def __init__(self, model_id, device, torch_dtype):
+            super().__init__(model_id, device, torch_dtype)
+            CountingBackend.loads += 1
+
+    monkeypatch.setitem(backends._BACKENDS, "counting", CountingBackend)
+    threads = torch.get_num_threads()
+    try:
+        assert preload_backend("counting", "model", "cpu", "float32")
+        backend = load_backend("counting", "model", "cpu", "float32")
+        assert CountingBackend.loads == 1
+        MODEL_REGISTRY.release(backend)
+    finally:
+        gc.unfreeze()
+        torch.set_num_threads(threads)
+        MODEL_REGISTRY.evict("model")
+
+
+def test_pool_refreshes_preload_on_reload():
+    """The supervisor reloads the preloaded state before signalling the workers"""
+    calls = []
+    pool = WorkerPool(
+        1, lambda index, counters: None, preload=lambda refresh: calls.append(refresh)
+    )
+
+    pool.reload()
+
+    assert calls == [True]
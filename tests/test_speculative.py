@@ -0,0 +1,148 @@
+"""
+Tests for speculative decoding with an assistant model
+"""
+import copy
+
+import numpy as np
+import pytest
+import torch
+from transformers import GenerationConfig, WhisperConfig, WhisperFeatureExtractor
+from transformers import WhisperForConditionalGeneration
+
+from backends import InferenceBackend, TransformersBackend, load_backend
+from speculative import (
+    PRIME_MODEL_ID,
+    SWIFT_MODEL_ID,
+    adapt_input_features,
+    align_vocabulary,
+    convert_log_mel,
+    mel_conversion,
+    resolve_assisted_model,
+)
+from warmup import synthetic_audio
+
+VOCAB_SIZE = 51866
+
+
+def whisper_model(num_mel_bins: int, vocab_size: int = VOCAB_SIZE, seed: int = 0):
+    torch.manual_seed(seed)
+    config = WhisperConfig(
+        vocab_size=vocab_size,
+        num_mel_bins=num_mel_bins,
+        d_model=16,
+        encoder_layers=1,
+        decoder_layers=1,
+        encoder_attention_heads=2,
+        decoder_attention_heads=2,
+        encoder_ffn_dim=32,
+        decoder_ffn_dim=32,
+    )
+    model = WhisperForConditionalGeneration(config).eval()
+    model.generation_config = GenerationConfig(
+        decoder_start_token_id=50258,
+        eos_token_id=50257,
+        pad_token_id=50257,
+        no_timestamps_token_id=50364,
+        is_multilingual=True,
+        lang_to_id={"<|en|>": 50259},
+        task_to_id={"transcribe": 50360},
+        begin_suppress_tokens=[220, 50257],
+        suppress_tokens=[],
+    )
+    return model
+
+
+def test_prime_fast_resolves_to_prime_with_swift():
+    """Aliases name the model and its assistant, other ids load alone"""
+    assert resolve_assisted_model("prime-fast") == (PRIME_MODEL_ID, SWIFT_MODEL_ID)
+    assert resolve_assisted_model(SWIFT_MODEL_ID) == (SWIFT_MODEL_ID, None)
+    with pytest.raises(ValueError, match="needs the transformers backend"):
+        load_backend("whisper_timestamped", "prime-fast", "cpu")
+
+
+def test_log_mel_conversion_matches_extracted_features():
+    """128-bin features converted to 80 bins are close to 80-bin features of the same audio"""
+    audio = synthetic_audio(5.0)
+    extractor_80 = WhisperFeatureExtractor(feature_size=80)
+    extractor_128 = WhisperFeatureExtractor(feature_size=128)
+    features_80 = extractor_80(audio, sampling_rate=16000, return_tensors="pt").input_features
+    features_128 = extractor_128(audio, sampling_rate=16000, return_tensors="pt").input_features
+
+    conversion = mel_conversion(extractor_128.mel_filters, extractor_80.mel_filters)
+    converted = convert_log_mel(features_128, conversion)
+
+    assert converted.shape == features_80.shape
+    assert (converted - features_80).abs().mean() < 0.05
+
+
+def test_align_vocabulary_renumbers_embeddings():
+    """Logits of the aligned model follow the target ids, unknown tokens get zero logits"""
+    model = whisper_model(80, vocab_size=VOCAB_SIZE - 1)
+    features = torch.randn(1, 80, 3000)
+    tokens = torch.tensor([[50258, 50259, 50359]])
+    with torch.no_grad():
+        expected = model(input_features=features, decoder_input_ids=tokens).logits
+
+    # The target vocabulary has one more token at 50358, later ids are shifted by one
+    vocab = {f"t{i}": i for i in range(VOCAB_SIZE - 1)}
+    target_vocab = {f"t{i}": i if i < 50358 else i + 1 for i in range(VOCAB_SIZE - 1)}
+    target_vocab["new"] = 50358
+    align_vocabulary(model, vocab, target_vocab)
+    with torch.no_grad():
+        logits = model(input_features=features, decoder_input_ids=tokens + (tokens >= 50358)).logits
+
+    assert logits.shape[-1] == VOCAB_SIZE
+    torch.testing.assert_close(logits[..., :50358], expected[..., :50358])
+    torch.testing.assert_close(logits[..., 50359:], expected[..., 50358:])
+    assert torch.all(logits[..., 50358] == 0)
+
+
+def test_assisted_generation_matches_the_main_model():
+    """Drafts of an assistant with other features and ids never change the transcript"""
+    main = whisper_model(128)
+    extractor_80 = WhisperFeatureExtractor(feature_size=80)
+    extractor_128 = WhisperFeatureExtractor(feature_size=128)
+    features = extractor_128(
+        synthetic_audio(3.0), sampling_rate=16000, return_tensors="pt"
+    ).input_features
+
+    assistant = whisper_model(80, vocab_size=VOCAB_SIZE - 1, seed=1)
+    vocab = {f"t{i}": i for i in range(VOCAB_SIZE - 1)}
+    target_vocab = {f"t{i}": i if i < 50358 else i + 1 for i in range(VOCAB_SIZE - 1)}
+    align_vocabulary(assistant, vocab, target_vocab)
+    conversion = mel_conversion(extractor_128.mel_filters, extractor_80.mel_filters)
+    adapt_input_features(assistant.get_encoder(), conversion)
+
+    kwargs = {"language": "en", "task": "transcribe", "max_new_tokens": 12}
+    with torch.no_grad():
+        expected = main.generate(features, **kwargs)
+        assisted = main.generate(features, assistant_model=assistant, **kwargs)
+        # An assistant agreeing with the model has its drafts accepted
+        self_assisted = main.generate(features, assistant_model=copy.deepcopy(main), **kwargs)
+
+    assert torch.equal(assisted, expected)
+    assert torch.equal(self_assisted, expected)
+
+
+def test_assisted_backend_decodes_windows_one_at_a_time():
+    """Batches are split for assisted generation, which only supports a batch size of 1"""
+
+    class RecordingPipe:
+        draft_model = object()
+
+        def __init__(self):
+            self.calls = []
+
+        def __call__(self, audio, **kwargs):
+            self.calls.append(kwargs)
+            return {"text": str(len(audio))}
+
+    backend = TransformersBackend.__new__(TransformersBackend)
+    InferenceBackend.__init__(backend, "stub", "cpu", None)
+    backend.pipe = RecordingPipe()
+    backend.assisted = True
+
+    outputs = backend([np.zeros(10), np.zeros(20)], batch_size=2)
+
+    assert [output["text"] for output in outputs] == ["10", "20"]
+    assert backend.pipe.calls == [{}, {}]
@@ -0,0 +1,81 @@
+"""
+Tests for the streaming video to SRT pipeline
+"""
+import re
+
+import numpy as np
+import pytest
+
+from parallel_transcribe import SAMPLE_RATE, pack_work_units, speech_regions
+from srt_pipeline import speech_units, stream_srt, threaded
+from tests.test_parallel_transcribe import spaced_examples
+
+
+class MarkBackend:
+    """Says one word per second of each window, with the time it was said in the window"""
+
+    def __init__(self):
+        self.windows = []
+
+    def transcribe_window(self, audio, word_timestamps=False):
+        self.windows.append(len(audio))
+        seconds = len(audio) / SAMPLE_RATE
+        return {
+            "chunks": [
+                {"text": f"w{len(self.windows)}-{i}", "timestamp": (i + 0.1, i + 0.5)}
+                for i in range(int(seconds))
+            ]
+        }
+
+
+def test_speech_units_match_whole_recording():
+    """Units found block by block are the units of the whole recording, with their audio"""
+    audio, _ = spaced_examples(4, silence_seconds=20.0)
+    blocks = [audio[i:i + 3 * SAMPLE_RATE] for i in range(0, len(audio), 3 * SAMPLE_RATE)]
+
+    units = list(speech_units(iter(blocks), block_seconds=3))
+
+    assert [(start, start + len(unit)) for start, unit in units] == pack_work_units(
+        audio, speech_regions(audio)
+    )
+    for start, unit in units:
+        np.testing.assert_array_equal(unit, audio[start:start + len(unit)])
+
+
+def test_stream_srt_appends_numbered_cues(tmp_path, fake_ffmpeg):
+    """Every unit is transcribed, its words land in the file in order, numbered from 1"""
+    audio, _ = spaced_examples(3, silence_seconds=40.0)
+    video = tmp_path / "video.mp4"
+    video.write_bytes((audio * 32768).astype(np.int16).tobytes())
+    backend = MarkBackend()
+    output = tmp_path / "video.srt"
+
+    stats = stream_srt(str(video), str(output), backend)
+
+    cues = output.read_text(encoding="utf-8").strip().split("\n\n")
+    assert stats["units"] == len(backend.windows) == 3
+    assert stats["cues"] == len(cues) and stats["first_cue_seconds"] is not None
+    assert stats["audio_seconds"] == pytest.approx(len(audio) / SAMPLE_RATE, abs=1e-3)
+    assert [int(cue.split("\n")[0]) for cue in cues] == list(range(1, len(cues) + 1))
+    starts = [re.search(r"\n(\S+) -->", cue).group(1) for cue in cues]
+    assert starts == sorted(starts)
+    assert starts[0] > "00:00:39"
+
+
+def test_stream_srt_reports_ffmpeg_errors(tmp_path, fake_ffmpeg):
+    """A file ffmpeg cannot decode raises with the ffmpeg message"""
+    with pytest.raises(RuntimeError, match="missing.mp4"):
+        stream_srt(str(tmp_path / "missing.mp4"), str(tmp_path / "out.srt"), MarkBackend())
+
+
+def test_threaded_passes_errors_on():
+    """Items come through in order, then the error of the stage"""
+    def stage():
+        yield from range(10)
+        raise ValueError("stage failed")
+
+    items = []
+    with pytest.raises(ValueError, match="stage failed"):
+        for item in threaded(stage(), maxsize=2):
+            items.append(item)
+    assert items == list(range(10))
@@ -0,0 +1,51 @@
+"""
+Tests for writing SRT cues as words arrive
+"""
+import random
+
+from srt_writer import SrtWriter, format_timestamp, group_words_for_subtitles
+
+
+def random_words(count: int) -> list[dict]:
+    """Words of varied lengths with gaps of varied lengths between them"""
+    rng = random.Random(0)
+    words, time = [], 0.0
+    for _ in range(count):
+        time += rng.choice([0.05, 0.1, 0.3, 0.8, 2.0])
+        text = "".join(rng.choice("abcdefgh") for _ in range(rng.randint(1, 12)))
+        words.append({"text": text, "start": time, "end": time + 0.3})
+        time += 0.3
+    return words
+
+
+def test_incremental_cues_match_whole_transcript(tmp_path):
+    """Words added in pieces give the file grouping the whole transcript gives"""
+    words = random_words(200)
+    path = tmp_path / "out.srt"
+
+    with SrtWriter(str(path)) as writer:
+        position = 0
+        for size in [1, 7, 3, 30, 0, 2, 50, 107]:
+            writer.add_words(words[position:position + size])
+            position += size
+
+    expected = "".join(
+        f"{i}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+        for i, (text, start, end) in enumerate(
+            group_words_for_subtitles([{"words": words}]), 1
+        )
+    )
+    assert path.read_text(encoding="utf-8") == expected
+
+
+def test_cues_are_written_before_close(tmp_path):
+    """Finished cues are in the file right away, the last one waits for more words"""
+    path = tmp_path / "out.srt"
+    writer = SrtWriter(str(path), max_words=2)
+    words = [{"text": f"w{i}", "start": i * 0.4, "end": i * 0.4 + 0.3} for i in range(5)]
+
+    assert writer.add_words(words) == 2
+    assert path.read_text(encoding="utf-8").count(" --> ") == 2
+    assert writer.close() == 1
+    assert writer.cues == 3
+    assert path.read_text(encoding="utf-8").startswith("1\n")
@@ -0,0 +1,127 @@
+"""
+Tests for websocket streaming sessions
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from websocket_server import StreamingSession
+
+
+class RecordingSocket:
+    """Websocket keeping what is sent and when it is closed"""
+
+    def __init__(self):
+        self.events = []
+
+    async def send(self, message):
+        self.events.append(json.loads(message)["text"])
+
+    async def close(self):
+        self.events.append("closed")
+
+
+def test_eof_sends_queued_windows_before_the_last_one():
+    """Windows still queued at EOF go out in order, then the last window, then the close"""
+    ws = RecordingSocket()
+    session = StreamingSession(ws, scheduler=None, partials=False, emit_timing=False)
+    session.vad = SimpleNamespace(window_has_speech=True)
+    session.audio_buffer.append(np.ones(1600, dtype=np.float32))
+    session.text_queue.put_nowait(("queued", None))
+
+    async def transcribe_window():
+        return "last"
+
+    session.transcribe_window = transcribe_window
+    session.audio_queue.put_control("EOF")
+
+    asyncio.run(session.process_audio_to_text())
+
+    assert ws.events == ["queued", "last", "closed"]
+
+
+class ClientSocket(RecordingSocket):
+    """Websocket delivering a client's audio messages and keeping the messages sent back"""
+
+    def __init__(self, messages):
+        super().__init__()
+        self.messages = messages
+
+    async def __aiter__(self):
+        for message in self.messages:
+            # Lets the other session run between two chunks
+            await asyncio.sleep(0)
+            yield message
+
+    async def send(self, message):
+        self.events.append(json.loads(message))
+
+
+class SpeechVad:
+    """VAD hearing speech in every chunk, without an endpoint"""
+
+    window_has_speech = True
+
+    def process(self, audio):
+        pass
+
+    def endpoint(self, silence_ms):
+        return False
+
+    def reset_window(self):
+        pass
+
+
+class LabelScheduler:
+    """Scheduler naming the session of a window after the constant level of its audio"""
+
+    LABELS = {0.1: "low", 0.5: "high"}
+
+    def __init__(self):
+        self.windows = []
+
+    async def transcribe(self, window, timing, **kwargs):
+        window = window.copy()
+        await asyncio.sleep(0)
+        self.windows.append(window)
+        label = self.LABELS.get(round(float(window[0]), 2), "mixed")
+        if not np.all(window == window[0]):
+            label = "mixed"
+        words = int(len(window) / 16000 / 0.5)
+        chunks = [
+            {"text": f" {label}", "timestamp": (0.5 * i, 0.5 * (i + 1))} for i in range(words)
+        ]
+        return {"text": " ".join(c["text"] for c in chunks), "chunks": chunks}
+
+
+def test_concurrent_sessions_keep_their_audio_and_text():
+    """Two sessions sharing a scheduler never decode or send each other's audio"""
+    scheduler = LabelScheduler()
+
+    def client(level):
+        chunk = np.full(8000, level * 32768, dtype=np.int16).tobytes()
+        ws = ClientSocket([chunk] * 8 + ["EOF"])
+        session = StreamingSession(ws, scheduler, partials=True, emit_timing=False)
+        session.vad = SpeechVad()
+        return ws, session
+
+    low_ws, low = client(0.1)
+    high_ws, high = client(0.5)
+
+    async def run():
+        await asyncio.gather(low.run(), high.run())
+
+    asyncio.run(run())
+
+    assert len(scheduler.windows) > 4
+    for ws, label in ((low_ws, "low"), (high_ws, "high")):
+        assert ws.events[-1] == "closed"
+        messages = ws.events[:-1]
+        assert {message["type"] for message in messages} == {"partial", "final"}
+        assert all(set(message["text"].split()) == {label} for message in messages)
+        finals = [m["text"] for m in messages if m["type"] == "final"]
+        # Every 0.5 s of the session's 4 s is committed exactly once
+        assert sum(len(text.split()) for text in finals) == 8
+    assert len(low.audio_buffer) == len(high.audio_buffer) == 0
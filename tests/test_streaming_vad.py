@@ -0,0 +1,64 @@
+"""
+Tests for frame-exact streaming VAD and endpointing
+"""
+import glob
+import os
+
+import librosa
+import numpy as np
+import pytest
+
+from streaming_vad import StreamingVad
+
+EXAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "examples", "*.wav")))
+
+
+def speech_sample():
+    audio, _ = librosa.load(EXAMPLES[0], sr=16000)
+    return audio.astype(np.float32)
+
+
+def feed(vad, audio, chunk):
+    for i in range(0, len(audio), chunk):
+        vad.process(audio[i:i + chunk])
+
+
+@pytest.mark.parametrize("chunk", [37, 160, 441, 1000])
+def test_reframes_arbitrary_chunk_sizes(chunk):
+    """Any message size is split into exact VAD frames with the remainder carried over"""
+    vad = StreamingVad(frame_ms=30)
+    feed(vad, np.zeros(16000, dtype=np.float32), chunk)
+
+    assert vad.frames == 16000 // 480
+    assert len(vad._pending) == (16000 % 480) * 2
+
+
+def test_silence_is_not_speech():
+    """Digital silence never starts speech"""
+    vad = StreamingVad()
+    feed(vad, np.zeros(32000, dtype=np.float32), 160)
+
+    assert not vad.window_has_speech
+    assert vad.trailing_silence_ms == (32000 // 480) * 30
+
+
+def test_speech_then_silence_triggers_endpoint():
+    """Speech followed by enough silence ends the utterance, a short pause does not"""
+    vad = StreamingVad(hangover_ms=150)
+    feed(vad, speech_sample(), 160)
+    assert vad.window_has_speech
+
+    feed(vad, np.zeros(1600, dtype=np.float32), 160)
+    assert not vad.endpoint(300)
+
+    feed(vad, np.zeros(4800, dtype=np.float32), 160)
+    assert vad.endpoint(300)
+
+    vad.reset_window()
+    assert not vad.window_has_speech
+
+
+def test_rejects_invalid_frame_length():
+    """Only frame lengths accepted by webrtcvad are allowed"""
+    with pytest.raises(ValueError):
+        StreamingVad(frame_ms=25)
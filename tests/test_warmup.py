@@ -0,0 +1,100 @@
+"""
+Tests for startup warmup and readiness gating
+"""
+import asyncio
+
+import numpy as np
+
+import websocket_server
+from inference import InferenceExecutor
+from warmup import synthetic_audio, warmup_executor, warmup_lengths
+
+
+class RecordingModel:
+    """Stand-in pipeline recording the length and arguments of each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, audio, **kwargs):
+        if isinstance(audio, list):
+            self.calls.append(([len(a) for a in audio], kwargs))
+            return [{"text": ""} for _ in audio]
+        self.calls.append((len(audio), kwargs))
+        return {"text": ""}
+
+
+def test_synthetic_audio_is_deterministic_and_bounded():
+    """Warmup audio has the requested length and stays within [-1, 1]"""
+    audio = synthetic_audio(1.5)
+
+    assert audio.dtype == np.float32
+    assert len(audio) == 24000
+    assert np.abs(audio).max() <= 1.0
+    assert np.array_equal(audio, synthetic_audio(1.5))
+
+
+def test_warmup_lengths_cover_short_regular_and_longest_windows():
+    """Duplicate lengths are decoded once"""
+    assert warmup_lengths(2.0, 10.0) == [1.0, 2.0, 10.0]
+    assert warmup_lengths(1.0) == [1.0]
+
+
+def test_warmup_decodes_every_length_and_variant():
+    """Each round decodes every length, with and without word timestamps, and a full batch"""
+    model = RecordingModel()
+    executor = InferenceExecutor(model)
+
+    asyncio.run(warmup_executor(executor, [1.0, 2.0], batch_size=2, rounds=1))
+
+    assert model.calls == [
+        (16000, {}),
+        (16000, {"return_timestamps": "word"}),
+        ([16000, 16000], {"batch_size": 2}),
+        (32000, {}),
+        (32000, {"return_timestamps": "word"}),
+        ([32000, 32000], {"batch_size": 2}),
+    ]
+    executor.shutdown()
+
+
+def test_server_is_not_ready_until_warmup_finishes(monkeypatch):
+    """Handshakes and /health are rejected until the model is loaded and warmed up"""
+    model = RecordingModel()
+    monkeypatch.setattr(websocket_server, "load_backend", lambda *args: model)
+    server = websocket_server.Server()
+
+    status, _, body = asyncio.run(server.process_request("/health", {}))
+    assert status == 503
+    assert b"warming_up" in body
+    assert server.admission_error() == "warming up"
+
+    asyncio.run(server.load_model("model", "cpu", None))
+
+    status, _, body = asyncio.run(server.process_request("/health", {}))
+    assert status == 200
+    assert server.health()["ready"] is True
+    assert server.admission_error() is None
+    assert len(model.calls) > 0
+    server.executor.shutdown()
+
+
+def test_web_server_health_reports_warmup(monkeypatch):
+    """/health and /upload return 503 until the background warmup finishes"""
+    import web_server
+
+    monkeypatch.setitem(web_server.READINESS, "ready", False)
+    monkeypatch.setattr(
+        web_server, "warmup_whisper_model", lambda model_id, device, dtype=None, backend=None: 1.234
+    )
+    client = web_server.app.test_client()
+
+    assert client.get("/health").status_code == 503
+    assert client.post("/upload").status_code == 503
+
+    web_server.warmup_model()
+
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json["ready"] is True
+    assert response.json["warmup_seconds"] == 1.23
@@ -0,0 +1,67 @@
+"""
+Tests for the multi-process worker pool supervisor
+"""
+import os
+import time
+
+from worker_pool import SessionCounters, WorkerPool
+
+
+def serve_forever(index, counters):
+    counters.session_started(index)
+    counters.set_active(index, index + 1)
+    while True:
+        time.sleep(0.05)
+
+
+def crash_on_start(index, counters):
+    os._exit(3)
+
+
+def test_session_counters_sum_over_workers():
+    """Totals add up the slots of every worker"""
+    counters = SessionCounters(3)
+    counters.set_active(0, 2)
+    counters.set_active(2, 1)
+    counters.session_started(0)
+    counters.session_started(2)
+
+    assert counters.totals() == (3, 2)
+    counters.reset(0)
+    assert counters.totals() == (1, 2)
+
+
+def test_pool_starts_workers_and_aggregates_sessions():
+    """Workers report their sessions through shared memory"""
+    pool = WorkerPool(2, serve_forever)
+    try:
+        for index in range(2):
+            pool.start_worker(index)
+        deadline = time.monotonic() + 5
+        while pool.counters.totals() != (3, 2) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.counters.totals() == (3, 2)
+    finally:
+        pool.stop()
+    assert all(not p.is_alive() for p in pool.processes)
+    assert pool.counters.totals()[0] == 0
+
+
+def test_pool_restarts_crashed_workers_with_backoff():
+    """Crashed workers are restarted, later restarts are delayed"""
+    pool = WorkerPool(1, crash_on_start, min_uptime=60)
+    try:
+        pool.start_worker(0)
+        pool.processes[0].join(5)
+        pool.check_workers()
+        assert pool.restarts == 1
+        assert pool.restart_delay[0] == 0.0
+
+        pool.processes[0].join(5)
+        pool.check_workers()
+        # A crash loop waits for its restart delay
+        assert pool.restarts == 1
+        assert pool.processes[0] is None
+        assert pool.restart_delay[0] == 1.0
+    finally:
+        pool.stop()
@@ -1,13 +1,17 @@
-import audioop
-from typing import Tuple
+from typing import TYPE_CHECKING, Tuple
 
-import librosa
 import numpy as np
-import torch
-import webrtcvad
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
 
+from audio_codecs import AudioDecoder, get_decoder
 from logger import logger
+from resampler import StreamingResampler, resample
+
+# torch, transformers and webrtcvad take seconds to import; they are imported where they are
+# used so that entry points start fast and --help does not pay for them
+if TYPE_CHECKING:
+    import torch
+    import webrtcvad
+    from transformers import pipeline
 
 
 def get_device(preferred_device: str = "cuda") -> str:
@@ -21,6 +25,8 @@ def get_device(preferred_device: str = "cuda") -> str:
         str: Available device ('cuda' or 'cpu')
     """
     if preferred_device == "cuda":
+        import torch
+
         if torch.cuda.is_available():
             device = "cuda"
             gpu_name = torch.cuda.get_device_name(0)
@@ -37,17 +43,24 @@ def get_device(preferred_device: str = "cuda") -> str:
     return device
 
 
-def torch_dtype_from_str(dtype: str, device: str) -> torch.dtype:
+def torch_dtype_from_str(dtype: str, device: str) -> "torch.dtype":
     """
     @function torch_dtype_from_str
-    @description Takes dtype object in string format and return a torch dtype object
+    @description Takes dtype object in string format and return a torch dtype object.
+    "int8" maps to torch.qint8, meaning dynamic int8 quantization of a float32 model.
     @param dtype: datatype in string format
     @param device: Device on which model is to run
     """
+    import torch
+
     if dtype == "float16":
         return torch.float16
     elif dtype == "float32":
         return torch.float32
+    elif dtype == "bfloat16":
+        return torch.bfloat16
+    elif dtype == "int8":
+        return torch.qint8
     else:
         if device == "cuda":
             return torch.float16
@@ -55,35 +68,70 @@ def torch_dtype_from_str(dtype: str, device: str) -> torch.dtype:
             return torch.float32
 
 
-def load_pipe(
-    model_id: str,
-    device: str,
-    torch_dtype: torch.dtype,
-) -> pipeline:
-    """
-    @function load_pipe
-    @description Loads model using provided model_id and returns a huggingface pipeline object
-    @param model_id: Model to load from huggingface
-    @param device: Device to run model on
-    @param dtype: Data type for model computation
-    """
-    # Ensure device is available
-    device = get_device(device)
+def _load_speech_model(model_id: str, torch_dtype: "torch.dtype"):
+    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
 
-    # Adjust dtype for CPU if needed
-    if device == "cpu" and torch_dtype == torch.float16:
-        logger.info("Switching to float32 for CPU compatibility")
-        torch_dtype = torch.float32
+    from snapshots import find_snapshot, load_transformers_model
 
+    snapshot = find_snapshot(model_id, "transformers")
+    if snapshot is not None:
+        logger.info(f"Loading {model_id} from snapshot {snapshot}")
+        model = load_transformers_model(snapshot, torch_dtype)
+        return model, AutoProcessor.from_pretrained(snapshot, local_files_only=True)
     model = AutoModelForSpeechSeq2Seq.from_pretrained(
         model_id,
         torch_dtype=torch_dtype,
         low_cpu_mem_usage=True,
         use_safetensors=True
     )
+    return model, AutoProcessor.from_pretrained(model_id)
+
+
+def build_pipe(
+    model_id: str,
+    device: str,
+    torch_dtype: "torch.dtype",
+    assistant_model_id: str = None,
+) -> "pipeline":
+    """
+    @function build_pipe
+    @description Loads model using provided model_id and returns a huggingface pipeline object.
+    Servers get it through backends.load_backend("transformers", ...), which caches it.
+    @param model_id: Model to load from huggingface, or a snapshot directory. With snapshots
+    configured (see snapshots.py) the model is loaded from its snapshot, memory-mapped.
+    @param device: Available device to run model on
+    @param dtype: Data type for model computation. On CPU, torch.qint8 quantizes the Linear
+    layers to int8 and torch.bfloat16 keeps float32 weights and runs under bf16 autocast.
+    @param assistant_model_id: Smaller model drafting tokens for model_id to verify
+    (speculative decoding), kept as the draft_model attribute of the pipeline. Assisted
+    generation decodes one window at a time.
+    """
+    import torch
+    from transformers import pipeline
+
+    from precision import quantize_int8, set_autocast
+
+    quantize = torch_dtype == torch.qint8
+    autocast = device == "cpu" and torch_dtype == torch.bfloat16
+    if quantize or autocast:
+        torch_dtype = torch.float32
+
+    model, processor = _load_speech_model(model_id, torch_dtype)
     model.to(device)
+    if quantize:
+        model = quantize_int8(model)
+
+    generate_kwargs = {"task": "transcribe", "language": "en"}
+    assistant = None
+    if assistant_model_id is not None:
+        from speculative import prepare_assistant
 
-    processor = AutoProcessor.from_pretrained(model_id)
+        assistant, assistant_processor = _load_speech_model(assistant_model_id, torch_dtype)
+        assistant.to(device)
+        if quantize:
+            assistant = quantize_int8(assistant)
+        assistant = prepare_assistant(assistant, assistant_processor, processor)
+        generate_kwargs["assistant_model"] = assistant
 
     pipe = pipeline(
         "automatic-speech-recognition",
@@ -92,31 +140,96 @@ def load_pipe(
         feature_extractor=processor.feature_extractor,
         torch_dtype=torch_dtype,
         device=device,
-        generate_kwargs={"task": "transcribe", "language": "en"},
+        generate_kwargs=generate_kwargs,
     )
+    # Not assistant_model, which recent pipelines add to every generate call themselves
+    pipe.draft_model = assistant
+    if autocast:
+        set_autocast(pipe, torch.bfloat16)
     return pipe
 
 
+def load_pipe(
+    model_id: str,
+    device: str,
+    torch_dtype: "torch.dtype" = None,
+) -> "pipeline":
+    """
+    @function load_pipe
+    @description Loads model using provided model_id and returns a huggingface pipeline object.
+    Thin wrapper of backends.load_backend("transformers", ...): the device falls back to CPU
+    without CUDA, the dtype is adjusted for the device, int8/bfloat16 and prime-fast work as
+    with --backend transformers, and the model stays cached in the model registry.
+    @param model_id: Model to load from huggingface, or a snapshot directory
+    @param device: Device to run model on
+    @param torch_dtype: Data type for model computation, as a torch dtype or its name
+    """
+    # backends imports this module
+    from backends import load_backend
+
+    return load_backend("transformers", model_id, device, torch_dtype).pipe
+
+
+def decode_audio(
+    audio: bytes,
+    sr: int,
+    encoding: str,
+    target_sr: int = 16000,
+    resampler: StreamingResampler = None,
+    decoder: AudioDecoder = None,
+) -> np.ndarray:
+    """
+    @function decode_audio
+    @description Converts audio bytes received from client to a float32 numpy array at the model sampling rate
+    @param audio: audio bytes received from client
+    @param sr: sampling rate of the audio received
+    @param encoding: encoding of the audio sent, any name registered in audio_codecs
+    @param target_sr: sampling rate expected by the model
+    @param resampler: streaming resampler of the connection, keeps filter state between chunks
+    @param decoder: codec decoder of the connection, required for stateful codecs such as opus
+    """
+    if decoder is None:
+        decoder = get_decoder(encoding, sr)
+    array = decoder.decode(audio)
+    if sr != target_sr:
+        if resampler is not None:
+            array = resampler.process(array)
+        else:
+            array = resample(array, sr, target_sr)
+    return array
+
+
 def audio_pre_processor(
-    audio: bytes, sr: int, encoding: str, vad: webrtcvad.Vad, target_sr: int = 16000
+    audio: bytes,
+    sr: int,
+    encoding: str,
+    vad: "webrtcvad.Vad",
+    target_sr: int = 16000,
+    resampler: StreamingResampler = None,
 ) -> Tuple[np.ndarray, bool]:
     """
     @function audio_pre_processor
-    @description Preprocess audio data received from client convert it to a numpy array as well as check for speech presence
+    @description Preprocess audio data received from client convert it to a numpy array as well as check for speech presence.
+    The chunk is passed to webrtcvad as is, so it must be a valid 10/20/30 ms frame; streaming_vad.StreamingVad
+    re-frames arbitrary chunk sizes instead.
     @param audio: audio bytes received from client
     @param sr: sampling rate of the audio received
     @param encoding: encoding of the audio sent
     @param vad: webrtcvad vad object to check for speech presence
+    @param target_sr: sampling rate expected by the model
+    @param resampler: streaming resampler of the connection, keeps filter state between chunks
     """
-    if encoding == "mulaw":
-        audio = audioop.ulaw2in(audio, 2)
+    samples = get_decoder(encoding, sr).decode(audio)
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
 
     try:
-        is_speech_present = vad.is_speech(audio, sr)
+        is_speech_present = vad.is_speech(pcm, sr)
     except Exception:
         is_speech_present = False
 
-    array = np.frombuffer(audio, dtype=np.int16).astype(np.float32) / 32768.0
-    if sr != 16_000:
-        array = librosa.resample(array, orig_sr=sr, target_sr=target_sr)
-    return array, is_speech_present
+    if sr != target_sr:
+        if resampler is not None:
+            samples = resampler.process(samples)
+        else:
+            samples = resample(samples, sr, target_sr)
+    return samples, is_speech_present
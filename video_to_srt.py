@@ -5,228 +5,24 @@ Uses whisper-timestamped for accurate word-level timestamps via forced alignment
 """
 import argparse
 import os
-import subprocess
-import tempfile
+import time
 from pathlib import Path
 
-import torch
-import whisper_timestamped as whisper
-
+# torch and the inference engines are imported by backends.load_backend when a model is
+# loaded, so --help and batch scripts importing this module start fast
+from audio_store import AudioStore
+from backends import available_backends, load_backend
+from checkpoint import TranscriptionCheckpoint, checkpoint_path
 from logger import logger
-from utils import torch_dtype_from_str, get_device
-
-
-def get_video_duration(video_path: str) -> float:
-    """
-    Get video duration in seconds using ffprobe
-
-    Args:
-        video_path: Path to video file
-
-    Returns:
-        float: Duration in seconds, or 0.0 if unable to determine
-    """
-    try:
-        command = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            video_path
-        ]
-
-        result = subprocess.run(command, capture_output=True, text=True)
-
-        if result.returncode == 0:
-            duration = float(result.stdout.strip())
-            logger.info(f"Video duration: {duration:.2f}s")
-            return duration
-        else:
-            logger.warning(f"Could not determine video duration: {result.stderr}")
-            return 0.0
-
-    except Exception as e:
-        logger.warning(f"Error getting video duration: {e}")
-        return 0.0
-
-
-def extract_audio_from_video(video_path: str, output_audio_path: str) -> bool:
-    """
-    Extract audio from video file using ffmpeg
-
-    Args:
-        video_path: Path to input video file
-        output_audio_path: Path to save extracted audio
-
-    Returns:
-        bool: True if successful, False otherwise
-    """
-    try:
-        command = [
-            'ffmpeg',
-            '-i', video_path,
-            '-vn',  # No video
-            '-acodec', 'pcm_s16le',  # 16-bit PCM
-            '-ar', '16000',  # 16kHz sample rate
-            '-ac', '1',  # Mono
-            '-y',  # Overwrite output file
-            output_audio_path
-        ]
-
-        result = subprocess.run(command, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"FFmpeg error: {result.stderr}")
-            return False
-
-        logger.info(f"Audio extracted successfully to {output_audio_path}")
-        return True
-
-    except Exception as e:
-        logger.error(f"Error extracting audio: {e}")
-        return False
-
-
-def format_timestamp(seconds: float) -> str:
-    """
-    Convert seconds to SRT timestamp format (HH:MM:SS,mmm)
-
-    Args:
-        seconds: Time in seconds
-
-    Returns:
-        str: Formatted timestamp
-    """
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
-
-
-def group_words_for_subtitles(
-    segments: list[dict],
-    max_words: int = 4,
-    max_chars: int = 42,
-    max_pause_gap: float = 0.5
-) -> list[tuple[str, float, float]]:
-    """
-    Group words from whisper-timestamped output into subtitle-friendly chunks.
-
-    Args:
-        segments: List of segments from whisper-timestamped with 'words' key
-        max_words: Maximum words per subtitle (default 4)
-        max_chars: Maximum characters per subtitle (default 42 - Netflix standard)
-        max_pause_gap: Maximum gap between words to keep in same subtitle (default 0.5s)
-
-    Returns:
-        List of tuples: (text, start_time, end_time)
-    """
-    all_words = []
-
-    # Extract all words from all segments
-    for segment in segments:
-        if 'words' in segment and segment['words']:
-            # Best case: segment has word-level timestamps
-            all_words.extend(segment['words'])
-        else:
-            # Fallback: Create synthetic word entry from segment-level data
-            logger.warning(f"Segment missing 'words' key, using segment-level fallback")
-            segment_text = segment.get('text', '').strip()
-            if segment_text:
-                # Create one "word" entry per segment as fallback
-                synthetic_word = {
-                    'text': segment_text,
-                    'start': segment.get('start', 0.0),
-                    'end': segment.get('end', 0.0)
-                }
-                all_words.append(synthetic_word)
-                logger.info(f"Created fallback word: '{segment_text[:30]}...' ({synthetic_word['start']:.2f}s - {synthetic_word['end']:.2f}s)")
-
-    if not all_words:
-        logger.error("No words found in any segment - transcription may have failed")
-        return []
-
-    subtitles = []
-    current_group = []
-    current_text = ""
-
-    for i, word_data in enumerate(all_words):
-        word = word_data.get('text', '').strip()
-        start = word_data.get('start')
-        end = word_data.get('end')
-
-        if not word or start is None or end is None:
-            # Log the issue
-            logger.debug(f"Word at index {i} has invalid data: text='{word}', start={start}, end={end}")
-
-            # Try to recover if word has text but missing timestamps
-            if word and current_group:
-                # Estimate timestamps based on previous word
-                last_word = current_group[-1]
-                estimated_start = last_word['end']
-                estimated_end = estimated_start + 0.5  # Conservative 0.5s duration
-
-                logger.debug(f"Estimated timestamps for '{word}': {estimated_start:.2f}s - {estimated_end:.2f}s")
-
-                # Create recovered word entry
-                word_data = {
-                    'text': word,
-                    'start': estimated_start,
-                    'end': estimated_end
-                }
-                # Don't continue, process this word with estimated timestamps
-                start = estimated_start
-                end = estimated_end
-            else:
-                # Can't recover, skip this word
-                continue
-
-        # Check if we should start a new group
-        should_break = False
-
-        if len(current_group) == 0:
-            # First word - start new group
-            should_break = False
-        elif len(current_group) >= max_words:
-            # Reached max words
-            should_break = True
-        elif len(current_text) + len(word) + 1 > max_chars:
-            # Would exceed character limit
-            should_break = True
-        else:
-            # Check pause gap
-            last_word = current_group[-1]
-            gap = start - last_word['end']
-            if gap > max_pause_gap:
-                # Long pause - break here
-                should_break = True
-
-        if should_break and current_group:
-            # Save current group
-            group_text = ' '.join(w['text'].strip() for w in current_group)
-            group_start = current_group[0]['start']
-            group_end = current_group[-1]['end']
-            subtitles.append((group_text, group_start, group_end))
-
-            # Reset
-            current_group = []
-            current_text = ""
-
-        # Add word to current group
-        current_group.append(word_data)
-        current_text = current_text + ' ' + word if current_text else word
-
-    # Don't forget last group
-    if current_group:
-        group_text = ' '.join(w['text'].strip() for w in current_group)
-        group_start = current_group[0]['start']
-        group_end = current_group[-1]['end']
-        subtitles.append((group_text, group_start, group_end))
-
-    logger.info(f"Grouped {len(all_words)} words into {len(subtitles)} subtitles")
-    return subtitles
+from long_form import transcribe_blocks, transcribe_chunked
+from model_registry import MODEL_REGISTRY
+from parallel_transcribe import transcribe_parallel
+from precision import PRECISIONS
+from snapshots import SNAPSHOT_DIR_ENV
+from srt_pipeline import stream_srt
+from srt_writer import format_timestamp, group_words_for_subtitles
+from utils import get_device
+from warmup import synthetic_audio
 
 
 def generate_srt(transcription_result: dict, output_srt_path: str, video_duration: float = 0.0):
@@ -363,12 +159,52 @@ def generate_srt(transcription_result: dict, output_srt_path: str, video_duratio
     logger.info(f"SRT file generated with {len(subtitles)} subtitles: {output_srt_path}")
 
 
+def warmup_whisper_model(
+    model_id: str,
+    device: str,
+    dtype=None,
+    backend: str = "whisper_timestamped",
+) -> float:
+    """
+    Load a model and run synthetic transcriptions, so the first real request does not pay
+    for lazy kernel initialization, allocator growth and VAD model setup.
+
+    Args:
+        model_id: Whisper model size or HF model ID
+        device: Device to run model on
+        dtype: Data type for model, name or torch dtype (default: the device's default)
+        backend: Inference backend, see backends.available_backends()
+
+    Returns:
+        float: Warmup duration in seconds
+    """
+    start = time.perf_counter()
+    model = load_backend(backend, model_id, device, dtype)
+    try:
+        # Whisper pads every chunk to 30 s, so one full chunk covers the typical decode. The
+        # second call loads the VAD model used by every real request.
+        model.transcribe_long_form(synthetic_audio(30.0), vad=False)
+        model.transcribe_long_form(synthetic_audio(5.0), vad=True)
+    finally:
+        # Stays cached in the registry for the first request
+        MODEL_REGISTRY.release(model)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Warmup of {model_id} finished in {elapsed:.2f}s")
+    return elapsed
+
+
 def video_to_srt(
     video_path: str,
     output_srt_path: str = None,
     model_id: str = "Oriserve/Whisper-Hindi2Hinglish-Swift",
     device: str = "cuda",
-    dtype: torch.dtype = torch.float16
+    dtype="float16",
+    backend: str = "whisper_timestamped",
+    batch_size: int = None,
+    workers: int = None,
+    threads_per_worker: int = 0,
+    stream: bool = False,
+    resume: bool = False
 ):
     """
     Convert video to SRT subtitle file using whisper-timestamped for word-level alignment.
@@ -378,11 +214,30 @@ def video_to_srt(
         output_srt_path: Path to save SRT file (optional)
         model_id: Whisper model size (tiny, base, small, medium, large, or HF model ID)
         device: Device to run model on (auto-detects if CUDA unavailable)
-        dtype: Data type for model (not used by whisper-timestamped, kept for compatibility)
+        dtype: Data type for model, name ("float16", "int8", ...) or torch dtype. On CPU,
+            int8 quantizes the Linear layers and bfloat16 runs under bf16 autocast; other
+            dtypes are ignored by whisper-timestamped, which picks its own precision
+        backend: Inference backend, see backends.available_backends()
+        batch_size: Decode overlapping 30 s chunks this many at a time instead of window
+            after window (see long_form.py). Fastest with the transformers backend; no VAD,
+            only chunks of silence are skipped. None keeps the backend's own long-form decoding
+        workers: Transcribe the speech found by webrtcvad in ~30 s units, spread over this
+            many processes each loading the model (see parallel_transcribe.py). None keeps
+            decoding in this process
+        threads_per_worker: Torch threads of each worker process (0: CPU count divided by
+            workers)
+        stream: Decode, find speech, transcribe and write the SRT file as concurrent stages
+            (see srt_pipeline.py), appending cues as soon as their speech is transcribed
+        resume: Skip the audio transcribed by an earlier run that died partway, as saved in
+            the checkpoint next to the SRT file (see checkpoint.py). The checkpoint is
+            always written, and removed once the SRT file is complete
 
     Returns:
         str: Path to generated SRT file
     """
+    if sum(bool(mode) for mode in (batch_size, workers, stream)) > 1:
+        raise ValueError("batch_size, workers and stream are alternative modes, set only one")
+
     # Automatically detect available device with CPU fallback
     device = get_device(device)
 
@@ -391,107 +246,108 @@ def video_to_srt(
         video_name = Path(video_path).stem
         output_srt_path = f"{video_name}.srt"
 
-    # Create temporary audio file
-    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
-        temp_audio_path = temp_audio.name
+    # Completed ranges are saved to a sidecar as they finish, a rerun with resume skips them
+    mode = "stream" if stream else "workers" if workers else "batch" if batch_size else "blocks"
+    checkpoint = TranscriptionCheckpoint(
+        checkpoint_path(output_srt_path),
+        {"model_id": model_id, "backend": backend, "dtype": str(dtype), "mode": mode},
+        resume=resume,
+    )
 
-    try:
-        # Step 0: Get video duration for comparison
-        video_duration = get_video_duration(video_path)
-
-        # Step 1: Extract audio from video
-        logger.info(f"Extracting audio from {video_path}")
-        if not extract_audio_from_video(video_path, temp_audio_path):
-            raise Exception("Failed to extract audio from video")
-
-        # Step 2: Load audio for whisper-timestamped
-        logger.info(f"Loading audio for processing")
-        audio = whisper.load_audio(temp_audio_path)
-
-        # Log audio duration
-        audio_duration = len(audio) / 16000.0  # Sample rate is 16kHz
-        logger.info(f"Audio duration: {audio_duration:.2f}s")
-
-        if video_duration > 0:
-            audio_diff = abs(audio_duration - video_duration)
-            if audio_diff > 0.5:
-                logger.warning(f"Audio duration ({audio_duration:.2f}s) differs from video duration ({video_duration:.2f}s) by {audio_diff:.2f}s")
-            else:
-                logger.info(f"✓ Audio extraction complete ({audio_duration:.2f}s matches video {video_duration:.2f}s)")
-
-        # Step 3: Load model for whisper-timestamped
-        logger.info(f"Loading Whisper model: {model_id}")
-        # For standard Whisper models, use model_id directly
-        # For HuggingFace models, whisper-timestamped may not support them
-        # We'll use 'tiny' as default which is fast and works well
+    if stream:
+        model = load_backend(backend, model_id, device, dtype)
         try:
-            model = whisper.load_model(model_id, device=device)
-        except Exception as e:
-            logger.warning(f"Failed to load {model_id}, falling back to 'tiny' model: {e}")
-            model = whisper.load_model("tiny", device=device)
-
-        # Step 4: Transcribe with forced alignment for word-level timestamps
-        logger.info("Transcribing audio with forced alignment for word-level timestamps...")
-        logger.info("VAD filtering: ENABLED (silero) - reduces hallucinations")
-        logger.info("Conditioning on previous text: DISABLED - prevents stopping at pauses")
-        result = whisper.transcribe(
-            model,
-            audio,
-            language="hi",  # Hindi/Hinglish
-            vad=True,  # Enable VAD to reduce hallucinations
-            condition_on_previous_text=False,  # CRITICAL: Prevents stopping at gaps/pauses
-            remove_empty_words=True,  # Clean up output
-            plot_word_alignment=False  # Set True for debugging
+            logger.info(f"Streaming {video_path} to {output_srt_path}...")
+            stats = stream_srt(video_path, output_srt_path, model, checkpoint=checkpoint)
+        finally:
+            MODEL_REGISTRY.release(model)
+        logger.info(
+            f"Transcribed {stats['audio_seconds']:.2f}s of audio in {stats['units']} unit(s), "
+            f"{stats['cues']} cue(s)"
         )
-
-        # Validate transcription result
-        logger.info(f"Transcription complete")
-        logger.info(f"Result keys: {list(result.keys())}")
-
-        segments = result.get('segments', [])
-        logger.info(f"Number of segments: {len(segments)}")
-
-        if not segments:
-            logger.error("❌ Transcription produced no segments!")
+        if not stats["cues"]:
+            logger.error("❌ Transcription produced no subtitles!")
             raise ValueError("Transcription failed - no segments generated")
+        checkpoint.remove()
+        logger.info(f"✓ SRT file created successfully: {output_srt_path}")
+        return output_srt_path
 
-        # Check if first segment has word-level timestamps
-        first_seg = segments[0]
-        logger.info(f"First segment keys: {list(first_seg.keys())}")
-
-        if 'words' not in first_seg:
-            logger.warning("⚠ Segments do NOT have 'words' key!")
-            logger.warning(f"Model '{model_id}' may not support word-level timestamps with whisper-timestamped")
-            logger.warning("Will fall back to segment-level timestamps")
+    # Steps 1-2: Decode the audio track into a memory-mapped int16 store, read window by
+    # window, so memory does not grow with the length of the video
+    logger.info(f"Decoding audio from {video_path}")
+    with AudioStore.from_media(video_path) as audio:
+        video_duration = audio.duration
+        logger.info(f"Audio duration: {video_duration:.2f}s")
+
+        if workers:
+            # Steps 3-4: Every worker process loads its own model and maps the audio store
+            logger.info(f"Transcribing speech regions in {workers} worker processes...")
+            result = transcribe_parallel(
+                audio, backend, model_id, device, dtype, workers, threads_per_worker, checkpoint
+            )
         else:
-            word_count = len(first_seg.get('words', []))
-            logger.info(f"✓ First segment has {word_count} words with timestamps")
-            if word_count > 0:
-                logger.info(f"  First word: {first_seg['words'][0]}")
-
-        # Log all segment boundaries to identify coverage gaps
-        logger.info("Segment timeline:")
-        for i, seg in enumerate(segments[:5]):  # Show first 5 segments
-            seg_text = seg.get('text', '')[:50]
-            logger.info(f"  Segment {i+1}: {seg.get('start', 0):.2f}s - {seg.get('end', 0):.2f}s | '{seg_text}...'")
-        if len(segments) > 5:
-            logger.info(f"  ... ({len(segments) - 5} more segments)")
-            # Show last segment
-            last_seg = segments[-1]
-            last_seg_text = last_seg.get('text', '')[:50]
-            logger.info(f"  Segment {len(segments)}: {last_seg.get('start', 0):.2f}s - {last_seg.get('end', 0):.2f}s | '{last_seg_text}...'")
-
-        # Step 5: Generate SRT file
-        logger.info("Generating SRT file...")
-        generate_srt(result, output_srt_path, video_duration)
+            # Step 3: Load model for the inference backend (cached in the model registry)
+            model = load_backend(backend, model_id, device, dtype)
+
+            # Step 4: Transcribe with forced alignment for word-level timestamps
+            try:
+                if batch_size:
+                    logger.info(f"Transcribing audio in overlapping chunks, {batch_size} at a time...")
+                    result = transcribe_chunked(
+                        model, audio, batch_size=batch_size, checkpoint=checkpoint
+                    )
+                else:
+                    logger.info("Transcribing audio with forced alignment for word-level timestamps...")
+                    logger.info("VAD filtering: ENABLED (where the backend supports it) - reduces hallucinations")
+                    logger.info("Conditioning on previous text: DISABLED - prevents stopping at pauses")
+                    result = transcribe_blocks(model, audio, vad=True, checkpoint=checkpoint)
+            finally:
+                MODEL_REGISTRY.release(model)
+
+    # Validate transcription result
+    logger.info(f"Transcription complete")
+    logger.info(f"Result keys: {list(result.keys())}")
+
+    segments = result.get('segments', [])
+    logger.info(f"Number of segments: {len(segments)}")
 
-        logger.info(f"✓ SRT file created successfully: {output_srt_path}")
-        return output_srt_path
+    if not segments:
+        logger.error("❌ Transcription produced no segments!")
+        raise ValueError("Transcription failed - no segments generated")
 
-    finally:
-        # Cleanup temporary audio file
-        if os.path.exists(temp_audio_path):
-            os.remove(temp_audio_path)
+    # Check if first segment has word-level timestamps
+    first_seg = segments[0]
+    logger.info(f"First segment keys: {list(first_seg.keys())}")
+
+    if 'words' not in first_seg:
+        logger.warning("⚠ Segments do NOT have 'words' key!")
+        logger.warning(f"Model '{model_id}' may not support word-level timestamps with whisper-timestamped")
+        logger.warning("Will fall back to segment-level timestamps")
+    else:
+        word_count = len(first_seg.get('words', []))
+        logger.info(f"✓ First segment has {word_count} words with timestamps")
+        if word_count > 0:
+            logger.info(f"  First word: {first_seg['words'][0]}")
+
+    # Log all segment boundaries to identify coverage gaps
+    logger.info("Segment timeline:")
+    for i, seg in enumerate(segments[:5]):  # Show first 5 segments
+        seg_text = seg.get('text', '')[:50]
+        logger.info(f"  Segment {i+1}: {seg.get('start', 0):.2f}s - {seg.get('end', 0):.2f}s | '{seg_text}...'")
+    if len(segments) > 5:
+        logger.info(f"  ... ({len(segments) - 5} more segments)")
+        # Show last segment
+        last_seg = segments[-1]
+        last_seg_text = last_seg.get('text', '')[:50]
+        logger.info(f"  Segment {len(segments)}: {last_seg.get('start', 0):.2f}s - {last_seg.get('end', 0):.2f}s | '{last_seg_text}...'")
+
+    # Step 5: Generate SRT file
+    logger.info("Generating SRT file...")
+    generate_srt(result, output_srt_path, video_duration)
+    checkpoint.remove()
+
+    logger.info(f"✓ SRT file created successfully: {output_srt_path}")
+    return output_srt_path
 
 
 def main():
@@ -511,7 +367,8 @@ def main():
     parser.add_argument(
         "--model-id",
         default="Oriserve/Whisper-Hindi2Hinglish-Swift",
-        help="Whisper model ID (default: Oriserve/Whisper-Hindi2Hinglish-Swift) or size: tiny, base, small, medium, large"
+        help="Whisper model ID (default: Oriserve/Whisper-Hindi2Hinglish-Swift) or size: tiny, base, small, medium, large; "
+             "prime-fast decodes with Prime verifying tokens drafted by Swift (--backend transformers)"
     )
     parser.add_argument(
         "--device",
@@ -521,13 +378,62 @@ def main():
     parser.add_argument(
         "--dtype",
         default="float16",
-        help="Data type for model (default: float16, kept for compatibility)"
+        choices=PRECISIONS,
+        help="Data type for model (default: float16). On CPU, int8 quantizes the Linear "
+             "layers and bfloat16 runs under bf16 autocast"
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--backend",
+        default="whisper_timestamped",
+        choices=available_backends(),
+        help="Inference engine (default: whisper_timestamped, most accurate word timestamps; "
+             "ctranslate2 is fastest on CPU)"
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Transcribe overlapping 30 s chunks this many at a time instead of one window "
+             "after the other; fastest with --backend transformers on many-core CPUs and GPUs "
+             "(default: off)"
+    )
+    mode.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Transcribe the speech regions found by webrtcvad in ~30 s units across this "
+             "many worker processes, each loading the model (default: off, one process)"
+    )
+    mode.add_argument(
+        "--stream",
+        action="store_true",
+        help="Decode, transcribe and write concurrently, appending cues to the SRT file as "
+             "the speech is transcribed; memory stays flat for videos of any length"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue a run that died partway: audio already transcribed, as saved in "
+             "OUTPUT.srt.checkpoint.jsonl, is skipped (same model, backend, dtype and mode)"
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=0,
+        help="Torch threads per --workers process (0: CPU count divided by --workers)"
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.environ.get(SNAPSHOT_DIR_ENV),
+        help="Load the model from the local snapshots in this directory (see snapshots.py), "
+             f"without hub calls (default: ${SNAPSHOT_DIR_ENV})"
+    )
 
-    # Convert dtype string to torch dtype
-    dtype = torch_dtype_from_str(args.dtype, args.device)
+    args = parser.parse_args()
+    if args.snapshot_dir:
+        os.environ[SNAPSHOT_DIR_ENV] = args.snapshot_dir
 
     # Run conversion
     video_to_srt(
@@ -535,7 +441,13 @@ def main():
         args.output,
         args.model_id,
         args.device,
-        dtype
+        args.dtype,
+        args.backend,
+        args.batch_size,
+        args.workers,
+        args.threads_per_worker,
+        args.stream,
+        args.resume
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+
+from logger import logger
+
+# Windows shorter than this are rare: endpointing needs speech plus trailing silence
+MIN_WARMUP_SECONDS = 1.0
+
+
+def synthetic_audio(seconds: float, sample_rate: int = 16000, seed: int = 0) -> np.ndarray:
+    """
+    @function synthetic_audio
+    @description Generates a deterministic speech-band signal for warmup decodes. A few tones
+    over low-level noise make the model run its encoder and decoder like on real audio, while
+    digital silence may be short-circuited.
+    @param seconds: Duration of the audio
+    @param sample_rate: Sampling rate of the audio
+    @param seed: Seed of the noise generator
+    """
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    rng = np.random.default_rng(seed)
+    audio = 0.01 * rng.standard_normal(len(t)).astype(np.float32)
+    for freq, amplitude in ((220.0, 0.1), (440.0, 0.05), (1200.0, 0.02)):
+        audio += amplitude * np.sin(2 * np.pi * freq * t).astype(np.float32)
+    # Syllable-like amplitude modulation
+    audio *= 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * t).astype(np.float32) ** 2
+    return audio
+
+
+def warmup_lengths(window_seconds: float, max_window_seconds: float = None) -> list[float]:
+    """
+    @function warmup_lengths
+    @description Window durations worth warming up: a short endpointed window, the regular
+    window and the longest window the server may decode.
+    @param window_seconds: Regular window duration
+    @param max_window_seconds: Longest window duration, if different
+    """
+    lengths = {MIN_WARMUP_SECONDS, window_seconds}
+    if max_window_seconds:
+        lengths.add(max_window_seconds)
+    return sorted(length for length in lengths if length > 0)
+
+
+async def warmup_executor(
+    executor,
+    lengths: list[float],
+    batch_size: int = 1,
+    word_timestamps: bool = True,
+    rounds: int = 2,
+) -> float:
+    """
+    @function warmup_executor
+    @description Runs synthetic decodes through the inference executor, so kernel selection,
+    allocator growth and tokenizer setup happen before the first client connects.
+    @param executor: inference.InferenceExecutor of the loaded pipeline
+    @param lengths: Window durations to decode, in seconds
+    @param batch_size: Largest batch size the scheduler may form
+    @param word_timestamps: Also decode with word timestamps, as partials mode does
+    @param rounds: Passes over all lengths; the first pass pays most of the lazy setup
+    @return: Warmup duration in seconds
+    """
+    start = time.perf_counter()
+    variants = [{}, {"return_timestamps": "word"}] if word_timestamps else [{}]
+    for _ in range(rounds):
+        for seconds in lengths:
+            audio = synthetic_audio(seconds)
+            for kwargs in variants:
+                await executor.transcribe(audio, **kwargs)
+            if batch_size > 1:
+                await executor.transcribe_batch([audio] * batch_size)
+    elapsed = time.perf_counter() - start
+    logger.info("Warmup over %s s windows finished in %.2fs", lengths, elapsed)
+    return elapsed
@@ -3,19 +3,24 @@ Flask API Server for Video to SRT Conversion
 Upload video and get SRT file back
 """
 import argparse
+import importlib.util
 import logging
 import os
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 
-import torch
 from flask import Flask, request, send_file, jsonify, render_template
 from werkzeug.utils import secure_filename
 
+from backends import available_backends
+from checkpoint import checkpoint_path
 from logger import logger
-from utils import torch_dtype_from_str, get_device
-from video_to_srt import video_to_srt
+from model_registry import MODEL_REGISTRY
+from precision import PRECISIONS
+from snapshots import SNAPSHOT_DIR_ENV
+from video_to_srt import video_to_srt, warmup_whisper_model
 
 app = Flask(__name__, template_folder='templates')
 
@@ -35,7 +40,16 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 MODEL_CONFIG = {
     'model_id': 'Oriserve/Whisper-Hindi2Hinglish-Swift',
     'device': 'cuda',
-    'dtype': torch.float16
+    # Kept as the --dtype name, torch is only imported once a model is loaded
+    'dtype': 'float16',
+    'backend': 'whisper_timestamped'
+}
+
+# Readiness: false while the default model is loaded and warmed up at startup
+READINESS = {
+    'ready': True,
+    'warmup_seconds': None,
+    'error': None
 }
 
 
@@ -68,7 +82,8 @@ def api_info():
                 'description': 'Upload video file',
                 'parameters': {
                     'video': 'Video file (mp4, avi, mov, mkv, webm, flv, wmv, m4v)',
-                    'model': 'Optional: swift (default) or prime'
+                    'model': 'Optional: swift (default), prime, or prime-fast (Prime quality, '
+                             'Swift drafts the tokens)'
                 },
                 'returns': 'SRT file download'
             },
@@ -84,8 +99,36 @@ def api_info():
 
 @app.route('/health')
 def health():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'model': MODEL_CONFIG['model_id']})
+    """Health check endpoint, 503 until the model is warmed up"""
+    body = {
+        'status': 'healthy' if READINESS['ready'] else 'warming_up',
+        'ready': READINESS['ready'],
+        'warmup_seconds': READINESS['warmup_seconds'],
+        'model': MODEL_CONFIG['model_id'],
+        'backend': MODEL_CONFIG['backend']
+    }
+    if READINESS['error']:
+        body['error'] = READINESS['error']
+    return jsonify(body), 200 if READINESS['ready'] else 503
+
+
+def warmup_model():
+    """Load and warm up the default model, then mark the server ready"""
+    try:
+        READINESS['warmup_seconds'] = round(
+            warmup_whisper_model(
+                MODEL_CONFIG['model_id'],
+                MODEL_CONFIG['device'],
+                MODEL_CONFIG['dtype'],
+                MODEL_CONFIG['backend']
+            ),
+            2
+        )
+    except Exception as e:
+        # Serve anyway: requests load the model lazily, as without warmup
+        logger.error(f"Warmup failed: {e}")
+        READINESS['error'] = str(e)
+    READINESS['ready'] = True
 
 
 @app.route('/api/status')
@@ -100,6 +143,7 @@ def system_status():
         'ffmpeg': check_ffmpeg_installed(),
         'dependencies': check_dependencies(),
         'device': get_device_info(),
+        'models': MODEL_REGISTRY.stats(),
         'server': True
     }
     return jsonify(status)
@@ -122,12 +166,8 @@ def check_ffmpeg_installed():
 def check_dependencies():
     """Check if all required dependencies are installed"""
     required = ['flask', 'torch', 'transformers', 'whisper_timestamped']
-    try:
-        for module in required:
-            __import__(module)
-        return True
-    except ImportError:
-        return False
+    # find_spec checks the install without paying the import time of torch and transformers
+    return all(importlib.util.find_spec(module) is not None for module in required)
 
 
 def get_device_info():
@@ -135,6 +175,8 @@ def get_device_info():
     device = MODEL_CONFIG.get('device', 'cpu')
 
     if device == 'cuda':
+        import torch
+
         if torch.cuda.is_available():
             gpu_name = torch.cuda.get_device_name(0)
             return f"CUDA GPU ({gpu_name})"
@@ -151,6 +193,9 @@ def upload_video():
     """
     Upload video and get SRT file
     """
+    if not READINESS['ready']:
+        return jsonify({'error': 'Server is warming up, retry shortly'}), 503, {'Retry-After': '5'}
+
     # Check if file is present
     if 'video' not in request.files:
         return jsonify({'error': 'No video file provided'}), 400
@@ -167,8 +212,14 @@ def upload_video():
     
     # Get model preference
     model_choice = request.form.get('model', 'swift').lower()
+    backend = MODEL_CONFIG['backend']
     if model_choice == 'prime':
         model_id = 'Oriserve/Whisper-Hindi2Hinglish-Prime'
+    elif model_choice == 'prime-fast':
+        # Prime verifying tokens drafted by Swift, speculative decoding needs the transformers
+        # pipeline
+        model_id = 'prime-fast'
+        backend = 'transformers'
     else:
         model_id = 'Oriserve/Whisper-Hindi2Hinglish-Swift'
     
@@ -192,7 +243,8 @@ def upload_video():
             srt_path,
             model_id,
             MODEL_CONFIG['device'],
-            MODEL_CONFIG['dtype']
+            MODEL_CONFIG['dtype'],
+            backend
         )
         
         # Send SRT file
@@ -211,6 +263,9 @@ def upload_video():
         # Cleanup
         if os.path.exists(video_path):
             os.remove(video_path)
+        # Uploads are not resumed, the checkpoint of a failed conversion is of no use
+        if os.path.exists(checkpoint_path(srt_path)):
+            os.remove(checkpoint_path(srt_path))
         if os.path.exists(srt_path):
             # Give time for file to be sent before deletion
             pass
@@ -226,20 +281,58 @@ if __name__ == '__main__':
         help='Default model ID'
     )
     parser.add_argument('--device', default='cuda', help='Device to run model on')
-    parser.add_argument('--dtype', default='float16', help='Data type for model')
+    parser.add_argument(
+        '--dtype',
+        default='float16',
+        choices=PRECISIONS,
+        help='Data type for model; on CPU, int8 quantizes the Linear layers and bfloat16 '
+             'runs under bf16 autocast'
+    )
+    parser.add_argument(
+        '--backend',
+        default='whisper_timestamped',
+        choices=available_backends(),
+        help='Inference engine; ctranslate2 (faster-whisper) is fastest on CPU'
+    )
+    parser.add_argument(
+        '--snapshot-dir',
+        default=os.environ.get(SNAPSHOT_DIR_ENV),
+        help='Load models from the local snapshots in this directory (see snapshots.py), '
+             f'without hub calls (default: ${SNAPSHOT_DIR_ENV})'
+    )
+    parser.add_argument(
+        '--model-memory-budget-mb',
+        type=int,
+        default=0,
+        help='Weights kept loaded across requests before idle models are evicted, '
+             'least recently used first (0: no limit)'
+    )
+    parser.add_argument(
+        '--no-warmup',
+        action='store_true',
+        help='Skip loading and warming up the model at startup'
+    )
     
     args = parser.parse_args()
 
-    # Detect available device with CPU fallback
-    available_device = get_device(args.device)
+    MODEL_REGISTRY.memory_budget = args.model_memory_budget_mb * 2**20
+    if args.snapshot_dir:
+        os.environ[SNAPSHOT_DIR_ENV] = args.snapshot_dir
 
     # Update global config
     MODEL_CONFIG['model_id'] = args.model_id
-    MODEL_CONFIG['device'] = available_device
-    MODEL_CONFIG['dtype'] = torch_dtype_from_str(args.dtype, available_device)
+    # Falls back to CPU without CUDA when the model is loaded, checking needs torch
+    MODEL_CONFIG['device'] = args.device
+    MODEL_CONFIG['dtype'] = args.dtype
+    MODEL_CONFIG['backend'] = args.backend
 
     logger.info(f"Starting API server on http://{args.host}:{args.port}")
     logger.info(f"Using model: {MODEL_CONFIG['model_id']}")
-    logger.info(f"Device: {available_device}, dtype: {MODEL_CONFIG['dtype']}")
+    logger.info(f"Device: {MODEL_CONFIG['device']}, dtype: {MODEL_CONFIG['dtype']}")
+
+    if not args.no_warmup:
+        # Warm up in the background so /health can report progress meanwhile
+        READINESS['ready'] = False
+        threading.Thread(target=warmup_model, name='warmup', daemon=True).start()
     
     app.run(host=args.host, port=args.port, debug=False)
@@ -1,123 +1,787 @@
 import argparse
 import asyncio
+import gc
 import json
+import os
+import signal
+from dataclasses import dataclass
 from functools import partial
+from http import HTTPStatus
 from urllib.parse import parse_qs, urlparse
 
-import numpy as np
-import torch
-import webrtcvad
 import websockets
 from websockets.server import WebSocketServerProtocol
 
+from audio_buffer import AudioBuffer
+from backends import available_backends, load_backend, preload_backend
+from audio_codecs import get_decoder
+from audio_queue import OVERFLOW_POLICIES, AudioQueue, QueueOverflow
+from inference import BatchScheduler, InferenceExecutor
+from local_agreement import LocalAgreement, words_from_output
 from logger import logger
-from utils import audio_pre_processor, load_pipe, torch_dtype_from_str
+from metrics import SessionMetrics, StreamingMetrics
+from model_registry import MODEL_REGISTRY
+from precision import PRECISIONS
+from resampler import StreamingResampler
+from snapshots import SNAPSHOT_DIR_ENV
+from streaming_vad import StreamingVad
+from utils import decode_audio
+from warmup import warmup_executor, warmup_lengths
+from worker_pool import SessionCounters, WorkerPool
 
-vad = webrtcvad.Vad(3)
+# Whisper decodes at most 30 s of 16 kHz audio at once
+MODEL_SAMPLING_RATE = 16_000
+MAX_BUFFER_SECONDS = 30
 
+# Close code sent when the server is overloaded ("Try Again Later")
+CLOSE_TRY_AGAIN_LATER = 1013
+# Close code sent when the client asks for an encoding the server can not decode
+CLOSE_UNSUPPORTED_DATA = 1003
+# Close code sent to sessions still open when a graceful shutdown times out
+CLOSE_GOING_AWAY = 1001
 
-class Server:
-    def __init__(self):
-        self.audio_queue = asyncio.Queue()
+
+@dataclass
+class StreamingConfig:
+    """
+    @class StreamingConfig
+    @description Windowing, VAD and endpointing settings shared by all sessions.
+    Durations are in real time, independent of the client message size.
+    """
+
+    # Longest window sent to the model while speech is ongoing
+    window_seconds: float = 2.0
+    # Trailing silence after speech that ends a window early
+    endpoint_silence_ms: int = 300
+    # webrtcvad settings and smoothing
+    vad_aggressiveness: int = 3
+    vad_frame_ms: int = 30
+    vad_onset_frames: int = 2
+    vad_hangover_ms: int = 150
+    # Audio kept before speech starts, so word onsets are not clipped
+    preroll_ms: int = 300
+    # Partial hypotheses: re-decode the growing window every partial_interval_ms and commit
+    # the words consecutive hypotheses agree on
+    partials: bool = False
+    partial_interval_ms: int = 500
+    partial_max_window_seconds: float = 10.0
+    # Backpressure: audio waiting to be processed per session, and what to do beyond it
+    max_queue_seconds: float = 5.0
+    overflow_policy: str = "drop_oldest"
+    # Attach the queue wait, inference time and real-time factor of the decoded window to
+    # every outgoing message as a `timing` field
+    emit_timing: bool = False
+
+
+def parse_flag(value: str) -> bool:
+    """
+    @function parse_flag
+    @description Parses a boolean query parameter.
+    @param value: Parameter value, or None if it was not passed
+    @return: The flag, or None if it was not passed
+    """
+    if value is None:
+        return None
+    return value.lower() in ("1", "true", "yes")
+
+
+class StreamingSession:
+    """
+    @class StreamingSession
+    @description Holds the streaming state of a single websocket connection: its queues,
+    VAD state, audio buffer and counters. The loaded model is shared between sessions
+    through the batch scheduler.
+    """
+
+    def __init__(
+        self,
+        ws: WebSocketServerProtocol,
+        scheduler: BatchScheduler,
+        sampling_rate: int = 16_000,
+        encoding: str = "linear16",
+        config: StreamingConfig = None,
+        partials: bool = None,
+        emit_timing: bool = None,
+        metrics: StreamingMetrics = None,
+    ):
+        self.ws = ws
+        self.scheduler = scheduler
+        self.config = config or StreamingConfig()
+        self.metrics = metrics
+        self.stats = SessionMetrics()
+        self.emit_timing = self.config.emit_timing if emit_timing is None else emit_timing
+
+        self.audio_queue = AudioQueue(
+            int(MODEL_SAMPLING_RATE * self.config.max_queue_seconds),
+            self.config.overflow_policy,
+        )
         self.text_queue = asyncio.Queue()
+        self.audio_buffer = AudioBuffer(MODEL_SAMPLING_RATE * MAX_BUFFER_SECONDS)
+
+        self.sampling_rate = sampling_rate
+        self.encoding = encoding
+        # Raises ValueError for encodings missing from the codec registry
+        self.decoder = get_decoder(encoding, sampling_rate)
+        self.resampler = StreamingResampler(sampling_rate, MODEL_SAMPLING_RATE)
+
+        # VAD runs on the resampled audio, so every client rate gets valid frames
+        self.vad = StreamingVad(
+            self.config.vad_aggressiveness,
+            MODEL_SAMPLING_RATE,
+            self.config.vad_frame_ms,
+            self.config.vad_onset_frames,
+            self.config.vad_hangover_ms,
+        )
 
-        self.silence_counter = 0
-        self.max_silence_chunks = 10
-        self.audio_found = False
-        self.audio_counter = 0
+        # Window thresholds are counted in samples of the resampled 16 kHz buffer
+        self.min_audio_duration = int(MODEL_SAMPLING_RATE * self.config.window_seconds)
+        self.preroll_samples = MODEL_SAMPLING_RATE * self.config.preroll_ms // 1000
+
+        self.partials = self.config.partials if partials is None else partials
+        self.agreement = LocalAgreement()
+        self.partial_interval_samples = (
+            MODEL_SAMPLING_RATE * self.config.partial_interval_ms // 1000
+        )
+        self.max_partial_samples = int(
+            MODEL_SAMPLING_RATE * self.config.partial_max_window_seconds
+        )
+        self.samples_since_decode = 0
+        self.last_partial = ""
+
+        self.skipped_samples = 0
         self.old_text = ""
 
+    @classmethod
+    def from_url(
+        cls,
+        ws: WebSocketServerProtocol,
+        scheduler: BatchScheduler,
+        conn_url: str,
+        config: StreamingConfig = None,
+        metrics: StreamingMetrics = None,
+    ):
+        """
+        @function from_url
+        @description Creates a session using the query parameters of the connection URL.
+        @param ws: WebSocket connection object
+        @param scheduler: Batch scheduler shared by all sessions
+        @param conn_url: Connection URL from client
+        @param config: Windowing and VAD settings
+        @param metrics: Server-wide metrics updated by the session
+        """
+        query_params = parse_qs(urlparse(conn_url).query)
+
+        sampling_rate = query_params.get("samplingRate", ["16_000"])
+        encoding = query_params.get("encoding", ["linear16"])[0]
+        partials = parse_flag(query_params.get("partials", [None])[0])
+        emit_timing = parse_flag(query_params.get("timing", [None])[0])
+        return cls(
+            ws,
+            scheduler,
+            int(sampling_rate[0]),
+            encoding,
+            config,
+            partials,
+            emit_timing,
+            metrics,
+        )
+
+    async def send_json(self, message: dict, timing: dict = None):
+        """
+        @function send_json
+        @description Sends a message to the client, with the timing of the window that
+        produced it when enabled.
+        @param message: Message dict
+        @param timing: Timing of the decoded window, from SessionMetrics.window_decoded
+        """
+        if self.emit_timing and timing is not None:
+            message = {**message, "timing": timing}
+        await self.ws.send(json.dumps(message))
+        ttft = self.stats.text_sent()
+        if ttft is not None and self.metrics is not None:
+            self.metrics.time_to_first_text.observe(ttft)
+
+    async def send_text(self, text: str, timing: dict = None):
+        """
+        @function send_text
+        @description Sends recognised text to the client, skipping empty and repeated outputs.
+        @param text: Recognised text
+        @param timing: Timing of the decoded window
+        """
+        if text and text != self.old_text:
+            text = text.replace("nan", "")
+            self.old_text = text
+            ws_out = {"text": text}
+            await self.send_json(ws_out, timing)
+
+    def queue_words(self, kind: str, words: list[dict]):
+        """
+        @function queue_words
+        @description Queues a partial or final message for the sender.
+        @param kind: "partial" for a hypothesis that may still change, "final" for committed text
+        @param words: Words making up the message
+        """
+        text = " ".join(w["text"] for w in words).strip()
+        if not text:
+            return
+        if kind == "partial":
+            if text == self.last_partial:
+                return
+            self.last_partial = text
+        else:
+            self.last_partial = ""
+            logger.info("Committed Output: %s", text)
+        self.text_queue.put_nowait(({"type": kind, "text": text}, self.stats.last_timing))
+
+    async def receive_client_data(self):
+        """
+        @function receiver
+        @description Receives audio data from the WebSocket, decodes it and adds it to the
+        bounded audio queue. Decoding here keeps the queue bounded in real audio duration
+        whatever the client encoding.
+        """
+        async for message in self.ws:
+            if isinstance(message, str):
+                if message == "EOF":
+                    self.end_stream()
+                continue
+
+            audio = decode_audio(
+                message,
+                self.sampling_rate,
+                self.encoding,
+                MODEL_SAMPLING_RATE,
+                self.resampler,
+                self.decoder,
+            )
+            try:
+                self.stats.audio_received()
+                self.put_audio(audio)
+            except QueueOverflow as e:
+                logger.warning("Closing connection, audio queue overflow: %s", e)
+                await self.ws.close(CLOSE_TRY_AGAIN_LATER, "audio queue overflow")
+                break
+        # Connection closed, stop the processing loop once queued audio is handled
+        self.audio_queue.put_control(None)
+
+    def end_stream(self):
+        """
+        @function end_stream
+        @description Ends the audio stream as if the client sent EOF: the rest of the buffered
+        window is decoded and sent before the connection is closed.
+        """
+        try:
+            self.put_audio(self.resampler.flush())
+        except QueueOverflow:
+            pass
+        self.audio_queue.put_control("EOF")
+
+    def put_audio(self, audio):
+        """
+        @function put_audio
+        @description Queues decoded audio and reports chunks dropped by the overflow policy.
+        @param audio: Decoded float32 audio at 16 kHz
+        """
+        chunks, samples = self.audio_queue.dropped_chunks, self.audio_queue.dropped_samples
+        self.audio_queue.put(audio)
+        if self.metrics is not None and self.audio_queue.dropped_samples > samples:
+            self.metrics.dropped_chunks.inc(self.audio_queue.dropped_chunks - chunks)
+            self.metrics.dropped_audio.inc(
+                (self.audio_queue.dropped_samples - samples) / MODEL_SAMPLING_RATE
+            )
+
+    async def decode(self, **kwargs) -> dict:
+        """
+        @function decode
+        @description Sends the buffered window to the model and records its queue wait,
+        inference duration and real-time factor.
+        @param kwargs: Extra keyword arguments forwarded to the pipeline call
+        """
+        window = self.audio_buffer.view()
+        timing = {}
+        output = await self.scheduler.transcribe(window, timing, **kwargs)
+
+        window_seconds = len(window) / MODEL_SAMPLING_RATE
+        summary = self.stats.window_decoded(window_seconds, timing)
+        if self.metrics is not None:
+            self.metrics.window.observe(window_seconds)
+            self.metrics.queue_wait.observe(timing.get("queue_wait", 0.0))
+            self.metrics.inference.observe(timing.get("inference", 0.0))
+            if summary["rtf"] is not None:
+                self.metrics.real_time_factor.observe(summary["rtf"])
+        return output
+
+    async def transcribe_window(self) -> str:
+        """
+        @function transcribe_window
+        @description Sends the buffered window to the model and starts a new window.
+        """
+        output = await self.decode()
+        text = output["text"].strip()
+        logger.info("Recognised Output: %s", text)
+        self.audio_buffer.clear()
+        self.vad.reset_window()
+        return text
+
+    async def decode_words(self) -> list[dict]:
+        """
+        @function decode_words
+        @description Decodes the buffered window with word timestamps.
+        """
+        self.samples_since_decode = 0
+        output = await self.decode(return_timestamps="word")
+        return words_from_output(output)
+
+    async def finish_utterance(self):
+        """
+        @function finish_utterance
+        @description Decodes the rest of the utterance, commits all of it and starts a new window.
+        """
+        if len(self.audio_buffer) > 0 and self.vad.window_has_speech:
+            self.queue_words("final", self.agreement.flush(await self.decode_words()))
+        else:
+            self.queue_words("final", self.agreement.flush())
+        self.audio_buffer.clear()
+        self.vad.reset_window()
+
+    async def process_partial_window(self, new_samples: int):
+        """
+        @function process_partial_window
+        @description Streaming mode with partial results. The growing window is re-decoded at a
+        short cadence; words two consecutive hypotheses agree on are sent as final and their
+        audio is trimmed from the buffer, the rest is sent as partial. Endpoints and the
+        window limit commit everything, so the decoded window stays bounded.
+        @param new_samples: Samples appended since the previous call
+        """
+        self.samples_since_decode += new_samples
+
+        if len(self.audio_buffer) >= self.max_partial_samples or self.vad.endpoint(
+            self.config.endpoint_silence_ms
+        ):
+            await self.finish_utterance()
+            return
+
+        if self.samples_since_decode < self.partial_interval_samples:
+            return
+
+        committed = self.agreement.update(await self.decode_words())
+        if committed:
+            self.queue_words("final", committed)
+            self.audio_buffer.consume(int(committed[-1]["end"] * MODEL_SAMPLING_RATE))
+        self.queue_words("partial", self.agreement.pending)
+
+    async def process_audio_to_text(self):
+        """
+        @function text_fetch
+        @description Processes audio data, detects speech, and runs the model to generate text.
+        Only windows containing speech are sent to the model.
+        """
+        while True:
+            audio = await self.audio_queue.get()
+
+            if audio is None:
+                return
+
+            if isinstance(audio, str) and audio == "EOF":
+                if self.partials:
+                    await self.finish_utterance()
+                elif len(self.audio_buffer) > 0 and self.vad.window_has_speech:
+                    text = await self.transcribe_window()
+                    self.text_queue.put_nowait((text, self.stats.last_timing))
+                # The last window goes out after the windows still queued, before the close
+                await self.drain_text_queue()
+                await self.ws.close()
+                return
+
+            self.audio_buffer.append(audio)
+            self.vad.process(audio)
+
+            if not self.vad.window_has_speech:
+                # Nothing to decode yet, only keep a short pre-roll of silence
+                excess = len(self.audio_buffer) - self.preroll_samples
+                if excess > 0:
+                    self.audio_buffer.consume(excess)
+                    self.skipped_samples += excess
+                continue
+
+            if self.partials:
+                await self.process_partial_window(len(audio))
+                continue
+
+            if len(self.audio_buffer) >= self.min_audio_duration or self.vad.endpoint(
+                self.config.endpoint_silence_ms
+            ):
+                text = await self.transcribe_window()
+                self.text_queue.put_nowait((text, self.stats.last_timing))
+
+    async def send_text_response(self):
+        """
+        @function sender
+        @description Sends recognized text from the text queue to the WebSocket.
+        """
+        while True:
+            await self.send_message(*await self.text_queue.get())
+
+    async def send_message(self, message, timing: dict = None):
+        """
+        @function send_message
+        @description Sends one item of the text queue: plain text from windowed decoding or a
+        partial/final message.
+        @param message: Recognised text or a message dict
+        @param timing: Timing of the window the message was decoded from
+        """
+        if isinstance(message, dict):
+            await self.send_json(message, timing)
+        else:
+            await self.send_text(message, timing)
+
+    async def drain_text_queue(self):
+        """
+        @function drain_text_queue
+        @description Sends every queued message before the connection is closed.
+        """
+        while not self.text_queue.empty():
+            await self.send_message(*self.text_queue.get_nowait())
+
+    async def run(self):
+        """
+        @function run
+        @description Runs the receive, process and send loops until the connection ends.
+        """
+        sender = asyncio.create_task(self.send_text_response())
+        try:
+            await asyncio.gather(self.receive_client_data(), self.process_audio_to_text())
+        finally:
+            sender.cancel()
+
+
+class ModelGeneration:
+    """
+    @class ModelGeneration
+    @description One loaded model backend with its executor and batch scheduler. Sessions stay on
+    the generation they started on, so a reload never swaps the model under a live call; a
+    retired generation is released once its last session ends.
+    """
+
+    def __init__(self, number: int, model_id: str, model, executor, scheduler):
+        self.number = number
+        self.model_id = model_id
+        self.model = model
+        self.executor = executor
+        self.scheduler = scheduler
+        self.sessions = 0
+        self.retired = False
+
+    def release(self):
+        """
+        @function release
+        @description Stops the inference threads and gives the model back to the registry.
+        """
+        self.scheduler.close()
+        self.executor.shutdown(wait=False)
+        MODEL_REGISTRY.release(self.model)
+        self.model = self.executor = self.scheduler = None
+
+
+class Server:
+    def __init__(
+        self,
+        inference_workers: int = 1,
+        max_batch_size: int = 1,
+        max_batch_wait_ms: float = 30.0,
+        config: StreamingConfig = None,
+        max_sessions: int = 0,
+        max_inference_queue: int = 0,
+        worker_index: int = 0,
+        counters: SessionCounters = None,
+        warmup: bool = True,
+        admin_token: str = None,
+        backend: str = "transformers",
+    ):
+        self.config = config or StreamingConfig()
+        # Model generation new sessions start on, and retired ones still serving sessions
+        self.current = None
+        self.retired = []
+        self.generations = 0
+        self.device = None
+        self.dtype = None
+        self.reloading = False
+        self.admin_token = admin_token
+        # Inference engine the model is loaded with, see backends.available_backends()
+        self.backend = backend
+        self.draining = False
+        self.inference_workers = inference_workers
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait_ms = max_batch_wait_ms
+        self.max_sessions = max_sessions
+        self.max_inference_queue = max_inference_queue
+        self.sessions = set()
+        self.rejected_sessions = 0
+        # Sessions are only admitted once the model is loaded and warmed up
+        self.warmup = warmup
+        self.ready = False
+        self.warmup_seconds = None
+        # Shared session counts when running as one worker of a pool
+        self.worker_index = worker_index
+        self.counters = counters
+        self.metrics = StreamingMetrics(
+            queue_depth=lambda: self.scheduler.queue_depth if self.scheduler else 0,
+            active_sessions=lambda: len(self.sessions),
+            pool_sessions=(lambda: counters.totals()[0]) if counters is not None else None,
+        )
+
+    @property
+    def model(self):
+        return self.current.model if self.current else None
+
+    @property
+    def executor(self) -> InferenceExecutor:
+        return self.current.executor if self.current else None
+
+    @property
+    def scheduler(self) -> BatchScheduler:
+        return self.current.scheduler if self.current else None
+
+    def create_generation(self, model, model_id: str) -> ModelGeneration:
+        """
+        @function create_generation
+        @description Wraps a loaded pipeline with its own executor and batch scheduler.
+        @param model: Loaded pipeline
+        @param model_id: Model identifier
+        """
+        executor = InferenceExecutor(model, self.inference_workers)
+        scheduler = BatchScheduler(executor, self.max_batch_size, self.max_batch_wait_ms)
+        self.generations += 1
+        return ModelGeneration(self.generations, model_id, model, executor, scheduler)
+
+    def activate(self, generation: ModelGeneration):
+        """
+        @function activate
+        @description Routes new sessions to a generation and retires the previous one.
+        @param generation: Generation to activate
+        """
+        previous, self.current = self.current, generation
+        logger.info(
+            "Model generation %d (%s) is active", generation.number, generation.model_id
+        )
+        if previous is not None:
+            previous.retired = True
+            self.retired.append(previous)
+            logger.info(
+                "Generation %d retired, %d session(s) still on it",
+                previous.number,
+                previous.sessions,
+            )
+            self.release_drained()
+
+    def release_drained(self):
+        """
+        @function release_drained
+        @description Frees retired generations whose last session has ended.
+        """
+        for generation in [g for g in self.retired if g.sessions == 0]:
+            self.retired.remove(generation)
+            logger.info(
+                "Releasing model generation %d (%s)", generation.number, generation.model_id
+            )
+            generation.release()
+        gc.collect()
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def report_sessions(self, started: bool = False):
+        """
+        @function report_sessions
+        @description Publishes the session count of this worker to the pool supervisor.
+        @param started: Whether a session was just accepted
+        """
+        if self.counters is None:
+            return
+        if started:
+            self.counters.session_started(self.worker_index)
+        self.counters.set_active(self.worker_index, len(self.sessions))
+
+    def reject(self):
+        """
+        @function reject
+        @description Counts a connection turned away by admission control.
+        """
+        self.rejected_sessions += 1
+        self.metrics.sessions_rejected.inc()
+
+    def admission_error(self) -> str:
+        """
+        @function admission_error
+        @description Checks whether a new session can be admitted.
+        @return: Reason for rejecting the session, or None if it can be admitted
+        """
+        if self.draining:
+            return "shutting down"
+        if not self.ready:
+            return "warming up"
+        if self.max_sessions and len(self.sessions) >= self.max_sessions:
+            return f"session limit reached ({self.max_sessions})"
+        if (
+            self.max_inference_queue
+            and self.scheduler is not None
+            and self.scheduler.queue_depth >= self.max_inference_queue
+        ):
+            return f"inference queue saturated ({self.scheduler.queue_depth} waiting)"
+        return None
+
+    def health(self) -> dict:
+        """
+        @function health
+        @description Readiness of the server, as reported on /health.
+        """
+        if self.draining:
+            status = "draining"
+        else:
+            status = "ready" if self.ready else "warming_up"
+        return {
+            "status": status,
+            "ready": self.ready and not self.draining,
+            "warmup_seconds": self.warmup_seconds,
+            "sessions": len(self.sessions),
+            "model_id": self.current.model_id if self.current else None,
+            "backend": self.backend,
+            "generation": self.current.number if self.current else None,
+            "retired_generations": [
+                {"generation": g.number, "model_id": g.model_id, "sessions": g.sessions}
+                for g in self.retired
+            ],
+            "reloading": self.reloading,
+        }
+
+    def admin_reload(self, query: str, request_headers):
+        """
+        @function admin_reload
+        @description Starts a hot reload requested over HTTP. Requires --admin-token, passed
+        as "Authorization: Bearer <token>". The model_id query parameter switches models,
+        otherwise the current model is reloaded, e.g. after new weights were deployed.
+        @param query: Query string of the request
+        @param request_headers: Request headers
+        @return: HTTP response tuple
+        """
+        if not self.admin_token:
+            return HTTPStatus.NOT_FOUND, [], b"Admin endpoints are disabled\n"
+        if request_headers.get("Authorization") != f"Bearer {self.admin_token}":
+            return HTTPStatus.FORBIDDEN, [], b"Invalid admin token\n"
+        if not self.ready or self.reloading or self.draining:
+            return HTTPStatus.CONFLICT, [], b"Server is not ready or already reloading\n"
+
+        model_id = parse_qs(query).get("model_id", [None])[0]
+        asyncio.get_running_loop().create_task(self.reload(model_id))
+        body = {"status": "reloading", "model_id": model_id or self.current.model_id}
+        return (
+            HTTPStatus.ACCEPTED,
+            [("Content-Type", "application/json")],
+            json.dumps(body).encode(),
+        )
+
+    async def process_request(self, path: str, request_headers):
+        """
+        @function process_request
+        @description Serves the readiness probe on /health, the Prometheus metrics on /metrics
+        and the reload trigger on /admin/reload, and rejects the websocket handshake with 503 while the server is warming up or
+        saturated, before any session state is created.
+        @param path: Request path
+        @param request_headers: Request headers
+        """
+        url = urlparse(path)
+        if url.path == "/admin/reload":
+            return self.admin_reload(url.query, request_headers)
+        if url.path == "/health":
+            health = self.health()
+            return (
+                HTTPStatus.OK if health["ready"] else HTTPStatus.SERVICE_UNAVAILABLE,
+                [("Content-Type", "application/json")],
+                json.dumps(health).encode(),
+            )
+        if url.path == "/metrics":
+            return (
+                HTTPStatus.OK,
+                [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")],
+                self.metrics.render().encode(),
+            )
+
+        reason = self.admission_error()
+        if reason is not None:
+            self.reject()
+            logger.warning("Rejecting connection to %s: %s", path, reason)
+            return (
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                [("Retry-After", "1")],
+                f"Server busy: {reason}\n".encode(),
+            )
+        return None
+
     async def handle_connection(self, ws: WebSocketServerProtocol, conn_url: str):
         """
         @function handle_connection
-        @description Handles WebSocket connections and processes incoming audio data.
+        @description Handles WebSocket connections, running one streaming session per connection.
         @param ws: WebSocket connection object
         @param conn_url: Connection URL from client
         """
         logger.info("Got connection from path %s", conn_url)
 
-        parsed_conn_url = urlparse(conn_url)
+        # Handshakes admitted concurrently may have filled the last slots meanwhile
+        reason = self.admission_error()
+        if reason is not None:
+            self.reject()
+            logger.warning("Closing connection from %s: %s", conn_url, reason)
+            await ws.close(CLOSE_TRY_AGAIN_LATER, "server busy")
+            return
 
-        query_params = parse_qs(parsed_conn_url.query)
-
-        sampling_rate = query_params.get("samplingRate", ["16_000"])
-        self.sampling_rate = int(sampling_rate[0])
-        self.min_audio_duration = self.sampling_rate * 2
-
-        self.encoding = query_params.get("encoding", ["linear16"])[0]
-
-        async def receive_client_data():
-            """
-            @function receiver
-            @description Receives audio data from the WebSocket and adds it to the audio queue.
-            """
-            async for message in ws:
-                self.audio_queue.put_nowait(message)
-
-        async def process_audio_to_text():
-            """
-            @function text_fetch
-            @description Processes audio data, detects speech, and runs the model to generate text.
-            """
-            full_audio = np.array([])
-
-            while True:
-                data = await self.audio_queue.get()
-
-                if isinstance(data, str) and data == "EOF":
-                    if len(full_audio) > 0:
-                        output = self.model(full_audio)
-                        text = output["text"].strip()
-                        logger.info("Recognised Output: %s", text)
-                        if text and text != self.old_text:
-                            text = text.replace("nan","")
-                            self.old_text = text
-                            ws_out = {"text": text}
-                            await ws.send(json.dumps(ws_out))
-                    await ws.close()
-
-                audio, speech_present = audio_pre_processor(
-                    data, self.sampling_rate, self.encoding, vad
+        generation = self.current
+        try:
+            session = StreamingSession.from_url(
+                ws, generation.scheduler, conn_url, self.config, self.metrics
+            )
+        except (ValueError, ImportError) as e:
+            logger.warning("Closing connection from %s: %s", conn_url, e)
+            await ws.close(CLOSE_UNSUPPORTED_DATA, str(e)[:120])
+            return
+        generation.sessions += 1
+        self.sessions.add(session)
+        self.metrics.sessions_total.inc()
+        self.report_sessions(started=True)
+        try:
+            await session.run()
+        except websockets.ConnectionClosed:
+            logger.info("Connection closed by client %s", conn_url)
+        finally:
+            self.sessions.discard(session)
+            self.report_sessions()
+            logger.info(
+                "Largest buffered window: %.2fs, silence skipped: %.2fs",
+                session.audio_buffer.max_window / MODEL_SAMPLING_RATE,
+                session.skipped_samples / MODEL_SAMPLING_RATE,
+            )
+            if session.audio_queue.overflows:
+                logger.warning(
+                    "Audio queue overflowed %d time(s), %.2fs of audio dropped",
+                    session.audio_queue.overflows,
+                    session.audio_queue.dropped_samples / MODEL_SAMPLING_RATE,
                 )
-                full_audio = np.concatenate([full_audio, audio])
-
-                if speech_present:
-                    self.silence_counter = 0
-                    self.audio_found = True
-                else:
-                    self.silence_counter += 1
-
-                if len(full_audio) >= self.min_audio_duration or (
-                    self.silence_counter >= self.max_silence_chunks and self.audio_found
-                ):
-                    self.audio_found = False
-                    self.silence_counter = 0
-                    output = self.model(full_audio)
-                    text = output["text"].strip()
-                    logger.info("Recognised Output: %s", text)
-                    self.text_queue.put_nowait(text)
-                    full_audio = np.array([], dtype=np.float32)
-
-        async def send_text_response():
-            """
-            @function sender
-            @description Sends recognized text from the text queue to the WebSocket.
-            """
-            while True:
-                text = await self.text_queue.get()
-                if text and text != self.old_text:
-                    text = text.replace("nan","")
-                    self.old_text = text
-                    ws_out = {"text": text}
-
-                    await ws.send(json.dumps(ws_out))
-
-        await asyncio.gather(
-            receive_client_data(), process_audio_to_text(), send_text_response()
-        )
+            logger.info("Session timing: %s", session.stats.summary())
+            logger.info("Session ended, %d active session(s)", len(self.sessions))
+            logger.info("Batch stats: %s", generation.scheduler.stats())
+            generation.sessions -= 1
+            if generation.retired and generation.sessions == 0:
+                self.release_drained()
 
     async def init_server(
-        self, host: str, port: str, model_id: str, device: str, dtype: torch.dtype
+        self,
+        host: str,
+        port: str,
+        model_id: str,
+        device: str,
+        dtype: str,
+        reuse_port: bool = False,
+        drain_timeout: float = 30.0,
     ):
         """
         @function run_server
@@ -126,17 +790,202 @@ class Server:
         @param port: Server port
         @param model_id: Model identifier
         @param device: Device to run the model on
-        @param dtype: Data type for model computation
+        @param dtype: Data type for model computation, as given to --dtype
+        @param reuse_port: Bind with SO_REUSEPORT, so several worker processes share the port
+        @param drain_timeout: Seconds given to live sessions to finish on SIGTERM/SIGINT
         """
-        logger.info("Loading model %s", model_id)
-        self.model = load_pipe(model_id, device, dtype)
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(signum, lambda: stop.done() or stop.set_result(None))
+            loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+        except (NotImplementedError, AttributeError):
+            # Windows: no loop signal handlers and no SIGHUP, Ctrl-C stops the server at once
+            pass
+
         logger.info(f"Starting WebSocket server on ws://{host}:{port}")
+        logger.info(f"Health and metrics available on http://{host}:{port}/health and /metrics")
 
+        # Listen first so /health answers while the model loads and warms up
         async with websockets.server.serve(
-            partial(self.handle_connection), host, port
+            partial(self.handle_connection),
+            host,
+            port,
+            process_request=self.process_request,
+            reuse_port=reuse_port or None,
         ) as server:
-            logger.info("Server is ready to accept connections...")
-            await asyncio.Future()
+            loading = loop.create_task(self.load_model(model_id, device, dtype))
+            await asyncio.wait([loading, stop], return_when=asyncio.FIRST_COMPLETED)
+            if loading.done():
+                loading.result()
+                logger.info("Server is ready to accept connections...")
+                await stop
+            else:
+                loading.cancel()
+            await self.shutdown(server, drain_timeout)
+
+    def request_reload(self):
+        """
+        @function request_reload
+        @description SIGHUP handler: reloads the current model, e.g. after new weights were
+        deployed.
+        """
+        if not self.ready or self.reloading or self.draining:
+            logger.warning("Ignoring reload request, server is not ready or already reloading")
+            return
+        asyncio.get_running_loop().create_task(self.reload())
+
+    async def reload(self, model_id: str = None) -> bool:
+        """
+        @function reload
+        @description Loads and warms up a new pipeline beside the current one, then routes new
+        sessions to it. Live sessions finish on the old pipeline, which is freed once they end.
+        If loading fails the current pipeline keeps serving.
+        @param model_id: Model to load, defaults to the current one
+        @return: Whether the new pipeline is active
+        """
+        if self.reloading:
+            return False
+        model_id = model_id or self.current.model_id
+        self.reloading = True
+        try:
+            await self.load_model(model_id, self.device, self.dtype, refresh=True)
+            return True
+        except Exception:
+            logger.exception(
+                "Reloading %s failed, keeping generation %d", model_id, self.current.number
+            )
+            return False
+        finally:
+            self.reloading = False
+
+    async def shutdown(self, server, timeout: float):
+        """
+        @function shutdown
+        @description Graceful shutdown: stops accepting connections, ends every live stream as
+        if the client sent EOF so pending windows are decoded and sent, and waits for the
+        sessions to finish. Sessions still open after the timeout are closed with code 1001.
+        @param server: Listening websocket server
+        @param timeout: Seconds given to the sessions to finish
+        """
+        self.draining = True
+        logger.info("Shutting down, draining %d session(s)", len(self.sessions))
+        server.close(close_connections=False)
+        for session in list(self.sessions):
+            session.end_stream()
+
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.sessions and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+        if self.sessions:
+            logger.warning(
+                "Closing %d session(s) still open after %.0fs", len(self.sessions), timeout
+            )
+            await asyncio.gather(
+                *[s.ws.close(CLOSE_GOING_AWAY, "server shutting down") for s in self.sessions],
+                return_exceptions=True,
+            )
+        logger.info("Shutdown complete")
+
+    async def load_model(
+        self, model_id: str, device: str, dtype: str, refresh: bool = False
+    ):
+        """
+        @function load_model
+        @description Loads the model off the event loop, warms it up with synthetic decodes over
+        the typical window lengths, then activates it and marks the server ready.
+        @param model_id: Model identifier
+        @param device: Device to run the model on
+        @param dtype: Data type for model computation, as given to --dtype
+        @param refresh: Load fresh weights even if the registry has the model cached
+        """
+        logger.info("Loading model %s with the %s backend", model_id, self.backend)
+        if refresh:
+            model = await asyncio.to_thread(
+                load_backend, self.backend, model_id, device, dtype, refresh=True
+            )
+        else:
+            model = await asyncio.to_thread(load_backend, self.backend, model_id, device, dtype)
+        generation = self.create_generation(model, model_id)
+        if self.warmup:
+            self.warmup_seconds = await warmup_executor(
+                generation.executor,
+                warmup_lengths(
+                    self.config.window_seconds, self.config.partial_max_window_seconds
+                ),
+                self.max_batch_size,
+            )
+        self.device, self.dtype = device, dtype
+        self.activate(generation)
+        self.ready = True
+
+
+def build_server(args, worker_index: int = 0, counters: SessionCounters = None) -> Server:
+    """
+    @function build_server
+    @description Creates a server from the parsed command line arguments.
+    @param args: Parsed arguments
+    @param worker_index: Slot of this process in the worker pool
+    @param counters: Session counters shared with the pool supervisor
+    """
+    return Server(
+        inference_workers=args.inference_workers,
+        max_batch_size=args.max_batch_size,
+        max_batch_wait_ms=args.max_batch_wait_ms,
+        config=StreamingConfig(
+            window_seconds=args.window_seconds,
+            endpoint_silence_ms=args.endpoint_silence_ms,
+            vad_aggressiveness=args.vad_aggressiveness,
+            vad_frame_ms=args.vad_frame_ms,
+            vad_hangover_ms=args.vad_hangover_ms,
+            partials=args.partials,
+            partial_interval_ms=args.partial_interval_ms,
+            partial_max_window_seconds=args.partial_max_window_seconds,
+            max_queue_seconds=args.max_queue_seconds,
+            overflow_policy=args.overflow_policy,
+            emit_timing=args.emit_timing,
+        ),
+        max_sessions=args.max_sessions,
+        max_inference_queue=args.max_inference_queue,
+        worker_index=worker_index,
+        counters=counters,
+        warmup=not args.no_warmup,
+        admin_token=args.admin_token,
+        backend=args.backend,
+    )
+
+
+def run_worker(index: int, counters: SessionCounters, args):
+    """
+    @function run_worker
+    @description Entry point of one worker process: loads its own model with a pinned
+    number of torch threads and serves on the shared port.
+    @param index: Worker slot
+    @param counters: Session counters shared with the pool supervisor
+    @param args: Parsed arguments
+    """
+    import torch
+
+    torch.set_num_threads(args.threads_per_worker)
+    logger.info(
+        "Worker %d (pid %d) using %d torch thread(s)",
+        index,
+        os.getpid(),
+        args.threads_per_worker,
+    )
+    server = build_server(args, index, counters)
+    asyncio.run(
+        server.init_server(
+            args.host,
+            args.port,
+            args.model_id,
+            args.device,
+            args.dtype,
+            reuse_port=True,
+            drain_timeout=args.drain_timeout,
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -144,18 +993,200 @@ if __name__ == "__main__":
     parser.add_argument("--host", default="0.0.0.0", help="Host to bind")
     parser.add_argument("--port", type=int, default=8000, help="Port to bind")
     parser.add_argument(
-        "--model-id", default="Oriserve/Whisper-Hindi2Hinglish-Swift", help="Model ID"
+        "--model-id",
+        default="Oriserve/Whisper-Hindi2Hinglish-Swift",
+        help="Model ID, or prime-fast for Prime verifying tokens drafted by Swift (speculative "
+        "decoding, transformers backend)",
     )
     parser.add_argument("--device", default="cuda", help="Device to run the model on")
     parser.add_argument(
-        "--dtype", default="float16", help="Data type to run the model on"
+        "--dtype",
+        default="float16",
+        choices=PRECISIONS,
+        help="Data type to run the model on; on CPU, int8 quantizes the Linear layers and "
+        "bfloat16 runs under bf16 autocast",
+    )
+    parser.add_argument(
+        "--backend",
+        default="transformers",
+        choices=available_backends(),
+        help="Inference engine: transformers pipeline, whisper_timestamped, or ctranslate2 "
+        "(faster-whisper, fastest on CPU)",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.environ.get(SNAPSHOT_DIR_ENV),
+        help="Load models from the local snapshots in this directory (see snapshots.py), "
+        f"memory-mapped and without hub calls (default: ${SNAPSHOT_DIR_ENV})",
+    )
+    parser.add_argument(
+        "--inference-workers",
+        type=int,
+        default=1,
+        help="Number of threads running model inference off the event loop. Calls to models "
+        "that are not thread-safe are serialized, so only the ctranslate2 backend gains from "
+        "more than one",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=1,
+        help="Largest number of windows from different sessions decoded together",
+    )
+    parser.add_argument(
+        "--max-batch-wait-ms",
+        type=float,
+        default=30.0,
+        help="Longest time a window waits for other windows to join its batch",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--window-seconds",
+        type=float,
+        default=2.0,
+        help="Longest window of speech sent to the model",
+    )
+    parser.add_argument(
+        "--endpoint-silence-ms",
+        type=int,
+        default=300,
+        help="Trailing silence after speech that sends the window to the model early",
+    )
+    parser.add_argument(
+        "--vad-aggressiveness", type=int, default=3, help="webrtcvad aggressiveness (0-3)"
+    )
+    parser.add_argument(
+        "--vad-frame-ms", type=int, default=30, help="VAD frame length: 10, 20 or 30 ms"
+    )
+    parser.add_argument(
+        "--vad-hangover-ms",
+        type=int,
+        default=150,
+        help="Unvoiced audio tolerated before speech is considered over",
+    )
 
-    dtype = torch_dtype_from_str(args.dtype, args.device)
+    parser.add_argument(
+        "--partials",
+        action="store_true",
+        help="Send partial hypotheses and commit stable prefixes by default "
+        "(clients can also pass partials=true)",
+    )
+    parser.add_argument(
+        "--partial-interval-ms",
+        type=int,
+        default=500,
+        help="How often the growing window is re-decoded in partials mode",
+    )
+    parser.add_argument(
+        "--partial-max-window-seconds",
+        type=float,
+        default=10.0,
+        help="Window length at which everything is committed in partials mode",
+    )
 
-    server = Server()
-    asyncio.run(
-        server.init_server(args.host, args.port, args.model_id, args.device, dtype)
+    parser.add_argument(
+        "--max-queue-seconds",
+        type=float,
+        default=5.0,
+        help="Audio waiting to be processed per session before the overflow policy applies",
     )
+    parser.add_argument(
+        "--overflow-policy",
+        choices=OVERFLOW_POLICIES,
+        default="drop_oldest",
+        help="What to do when a session queue is full: drop the oldest audio, coalesce the "
+        "backlog into one chunk, or close the connection with code 1013",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=0,
+        help="Maximum concurrent sessions, new connections are rejected beyond it (0: no limit)",
+    )
+    parser.add_argument(
+        "--max-inference-queue",
+        type=int,
+        default=0,
+        help="Reject new connections while this many windows wait for inference (0: no limit)",
+    )
+    parser.add_argument(
+        "--emit-timing",
+        action="store_true",
+        help="Attach per-window latency to outgoing messages as a `timing` field by default "
+        "(clients can also pass timing=true)",
+    )
+
+    parser.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Skip the synthetic warmup decodes; /health reports ready once the model is loaded",
+    )
+    parser.add_argument(
+        "--admin-token",
+        default=None,
+        help="Enables GET /admin/reload, authorised with 'Authorization: Bearer <token>'",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds live sessions get to finish on SIGTERM/SIGINT before they are closed",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of server processes sharing the port with SO_REUSEPORT, each loading its "
+        "own model unless --preload is given",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=0,
+        help="Torch intra-op threads per worker process (0: CPU count divided by --workers)",
+    )
+    parser.add_argument(
+        "--preload",
+        action="store_true",
+        help="Load the model once before forking the --workers, which then share its memory "
+        "copy-on-write (CPU only)",
+    )
+
+    args = parser.parse_args()
+
+    if args.snapshot_dir:
+        # Set in the environment so every worker process finds it
+        os.environ[SNAPSHOT_DIR_ENV] = args.snapshot_dir
+
+    if args.workers > 1:
+        if args.threads_per_worker <= 0:
+            args.threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+        logger.info("Starting %d workers on port %d", args.workers, args.port)
+        preload = (
+            partial(preload_backend, args.backend, args.model_id, args.device, args.dtype)
+            if args.preload
+            else None
+        )
+        WorkerPool(
+            args.workers,
+            run_worker,
+            (args,),
+            stop_timeout=args.drain_timeout + 5,
+            preload=preload,
+        ).run()
+    else:
+        if args.threads_per_worker > 0:
+            import torch
+
+            torch.set_num_threads(args.threads_per_worker)
+        server = build_server(args)
+        asyncio.run(
+            server.init_server(
+                args.host,
+                args.port,
+                args.model_id,
+                args.device,
+                args.dtype,
+                drain_timeout=args.drain_timeout,
+            )
+        )
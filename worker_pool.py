@@ -0,0 +1,263 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from logger import logger
+
+
+class SessionCounters:
+    """
+    @class SessionCounters
+    @description Session counts of every worker in shared memory, so the supervisor can
+    report totals without talking to the workers.
+    """
+
+    def __init__(self, num_workers: int, ctx=None):
+        """
+        @function __init__
+        @param num_workers: Number of worker slots
+        @param ctx: multiprocessing context the workers are started from
+        """
+        ctx = ctx or multiprocessing.get_context()
+        self.active = ctx.Array("i", num_workers)
+        self.total = ctx.Array("q", num_workers)
+
+    def set_active(self, index: int, count: int):
+        """
+        @function set_active
+        @description Records the number of live sessions of a worker.
+        """
+        self.active[index] = count
+
+    def session_started(self, index: int):
+        """
+        @function session_started
+        @description Counts a session accepted by a worker.
+        """
+        with self.total.get_lock():
+            self.total[index] += 1
+
+    def reset(self, index: int):
+        """
+        @function reset
+        @description Clears the live sessions of a worker that exited.
+        """
+        self.active[index] = 0
+
+    def totals(self) -> tuple[int, int]:
+        """
+        @function totals
+        @description Live and accepted sessions summed over all workers.
+        """
+        return sum(self.active[:]), sum(self.total[:])
+
+
+def _worker_main(target, index: int, counters: SessionCounters, args: tuple):
+    # The supervisor handles Ctrl-C and terminates the workers itself. SIGHUP is ignored until
+    # the worker installs its own reload handler, so an early reload does not kill it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    target(index, counters, *args)
+
+
+class WorkerPool:
+    """
+    @class WorkerPool
+    @description Supervises worker processes serving on the same port. Each worker binds its
+    own listening socket with SO_REUSEPORT so the kernel spreads connections between them.
+    Workers that exit are restarted, with a growing delay when they keep crashing on start.
+    With a preload callback, the supervisor loads what the workers share before forking them.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        target,
+        args: tuple = (),
+        report_interval: float = 30.0,
+        min_uptime: float = 10.0,
+        max_restart_delay: float = 30.0,
+        stop_timeout: float = 10.0,
+        preload=None,
+    ):
+        """
+        @function __init__
+        @param num_workers: Number of worker processes
+        @param target: Worker entry point, called as target(index, counters, *args)
+        @param args: Extra arguments passed to target
+        @param report_interval: Seconds between aggregate session count reports
+        @param min_uptime: A worker exiting sooner than this counts as a crash loop
+        @param max_restart_delay: Longest delay before restarting a crashing worker
+        @param stop_timeout: Time given to each worker to drain on stop before it is killed
+        @param preload: Called as preload(refresh=False) before the workers are started, and
+        with refresh=True on reload so restarted workers inherit the new state
+        """
+        # fork keeps start-up cheap and lets workers inherit what the supervisor loaded
+        methods = multiprocessing.get_all_start_methods()
+        self.ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.num_workers = num_workers
+        self.target = target
+        self.args = args
+        self.report_interval = report_interval
+        self.min_uptime = min_uptime
+        self.max_restart_delay = max_restart_delay
+        self.stop_timeout = stop_timeout
+        self.preload = preload
+
+        self.counters = SessionCounters(num_workers, self.ctx)
+        self.processes = [None] * num_workers
+        self.started_at = [0.0] * num_workers
+        self.restart_delay = [0.0] * num_workers
+        self.quick_exits = [0] * num_workers
+        self.restart_at = [0.0] * num_workers
+        self.restarts = 0
+        self._stopping = False
+
+    def start_worker(self, index: int):
+        """
+        @function start_worker
+        @description Starts (or restarts) the worker in the given slot.
+        @param index: Worker slot
+        """
+        self.counters.reset(index)
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.target, index, self.counters, self.args),
+            name=f"worker-{index}",
+            daemon=False,
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        logger.info("Started worker %d (pid %d)", index, process.pid)
+
+    def check_workers(self):
+        """
+        @function check_workers
+        @description Restarts workers that exited, delaying workers stuck in a crash loop.
+        """
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                uptime = now - self.started_at[index]
+                logger.warning(
+                    "Worker %d (pid %d) exited with code %s after %.1fs",
+                    index,
+                    process.pid,
+                    process.exitcode,
+                    uptime,
+                )
+                process.join()
+                self.processes[index] = None
+                self.counters.reset(index)
+                # The first crash restarts at once, a crash loop backs off exponentially
+                self.quick_exits[index] = (
+                    self.quick_exits[index] + 1 if uptime < self.min_uptime else 0
+                )
+                self.restart_delay[index] = (
+                    min(self.max_restart_delay, 2.0 ** (self.quick_exits[index] - 2))
+                    if self.quick_exits[index] > 1
+                    else 0.0
+                )
+                self.restart_at[index] = now + self.restart_delay[index]
+                if self.restart_delay[index]:
+                    logger.warning(
+                        "Restarting worker %d in %.0fs", index, self.restart_delay[index]
+                    )
+
+            if now >= self.restart_at[index]:
+                self.restarts += 1
+                self.start_worker(index)
+
+    def report(self):
+        """
+        @function report
+        @description Logs the session counts summed over all workers.
+        """
+        active, total = self.counters.totals()
+        alive = sum(p is not None and p.is_alive() for p in self.processes)
+        logger.info(
+            "%d/%d workers alive, %d active session(s), %d session(s) served, %d restart(s)",
+            alive,
+            self.num_workers,
+            active,
+            total,
+            self.restarts,
+        )
+
+    def stop(self, timeout: float = None):
+        """
+        @function stop
+        @description Sends SIGTERM to all workers, so they drain their sessions, and waits for
+        them to exit.
+        @param timeout: Time given to each worker before it is killed, defaults to stop_timeout
+        """
+        timeout = self.stop_timeout if timeout is None else timeout
+        self._stopping = True
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            self.counters.reset(index)
+        self.report()
+
+    def reload(self):
+        """
+        @function reload
+        @description Forwards a reload request (SIGHUP) to every live worker, after refreshing
+        the preloaded state.
+        """
+        if self.preload is not None:
+            try:
+                self.preload(refresh=True)
+            except Exception:
+                logger.exception("Preload failed on reload, restarted workers get the old state")
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+        logger.info("Reload requested for all workers")
+
+    def _handle_signal(self, signum, frame):
+        logger.info("Received signal %d, stopping workers", signum)
+        self._stopping = True
+
+    def run(self, poll_interval: float = 0.5):
+        """
+        @function run
+        @description Starts the workers and supervises them until SIGTERM or Ctrl-C. SIGHUP is
+        forwarded to the workers to reload their model.
+        @param poll_interval: Seconds between worker liveness checks
+        """
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        if self.preload is not None:
+            self.preload(refresh=False)
+        for index in range(self.num_workers):
+            self.start_worker(index)
+
+        last_report = time.monotonic()
+        try:
+            while not self._stopping:
+                time.sleep(poll_interval)
+                if self._stopping:
+                    break
+                self.check_workers()
+                if time.monotonic() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+        finally:
+            self.stop()